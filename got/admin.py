@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Asset, System, Ot, Task, Equipo, Ruta, HistoryHour, FailureReport, Location, Operation, Solicitud, Item,
-    Megger, Suministro
+    Megger, Suministro, RequestMetric, PdfJob, OutboundEmail, Notification
 )
 
 
@@ -58,10 +58,78 @@ admin.site.register(Megger)
 admin.site.register(Operation)
 admin.site.register(FailureReport)
 admin.site.register(Ruta)
-admin.site.register(Equipo)
 admin.site.register(System)
 admin.site.register(HistoryHour)
 admin.site.register(Solicitud)
 admin.site.register(Item)
 admin.site.register(Location)
 admin.site.register(Ot, OtAdmin)
+
+
+@admin.register(Equipo)
+class EquipoAdmin(admin.ModelAdmin):
+    # El horómetro es initial_hours más los reportes de horas (ver got/hours.py): se corrige
+    # editando initial_hours o los reportes
+    readonly_fields = ('horometro', 'prom_hours')
+
+
+@admin.register(RequestMetric)
+class RequestMetricAdmin(admin.ModelAdmin):
+    list_display = (
+        'created',
+        'url_name',
+        'status',
+        'queries',
+        'duplicate_queries',
+        'db_time',
+        'template_time',
+        'total_time',
+        'response_size'
+    )
+
+    list_filter = (
+        'url_name', 'status'
+    )
+
+
+@admin.register(PdfJob)
+class PdfJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'created',
+        'filename',
+        'kind',
+        'engine',
+        'state',
+        'requested_by',
+        'finished'
+    )
+    list_filter = ('state', 'kind', 'engine')
+    exclude = ('html', 'payload')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        'created',
+        'subject',
+        'state',
+        'attempts',
+        'next_attempt',
+        'sent'
+    )
+    list_filter = ('state',)
+    search_fields = ('subject',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        'created',
+        'recipient',
+        'kind',
+        'subject',
+        'due',
+        'queued'
+    )
+    list_filter = ('kind', 'frequency')
+    search_fields = ('recipient', 'subject')
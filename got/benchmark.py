@@ -0,0 +1,258 @@
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+from io import BytesIO
+
+import PyPDF2
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Count
+from django.template.loader import get_template
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image as PILImage, ImageDraw
+
+from .models import Asset, Image, Ot, PdfJob, System, Task
+from .pdf_reportlab import ot_payload
+from .pdfs import SOURCES, render_pdf, render_reportlab
+
+
+# Tolerancias por defecto frente a la línea base: las consultas son deterministas,
+# el tiempo y la memoria varían entre máquinas y corridas
+TOLERANCES = {'queries': 0.0, 'time_ms': 0.5, 'memory_kb': 0.5}
+# Diferencias absolutas por debajo de estas no cuentan como regresión (ruido en vistas rápidas)
+MIN_DELTAS = {'queries': 0, 'time_ms': 25, 'memory_kb': 64}
+
+
+def scenarios():
+    '''
+    Vistas pesadas a medir, resueltas contra los datos presentes: el activo con más
+    rutinas, su sistema principal y la OT con más actividades.
+    '''
+    asset = Asset.objects.annotate(n=Count('system__rutas')).order_by('-n', 'abbreviation').first()
+    if asset is None:
+        return []
+    system = System.objects.filter(asset=asset).annotate(n=Count('rutas')).order_by('-n', 'id').first()
+    ot = Ot.objects.annotate(n=Count('task')).order_by('-n', 'num_ot').first()
+
+    urls = [
+        ('asset-list', reverse('got:asset-list')),
+        ('asset-detail', reverse('got:asset-detail', args=[asset.pk])),
+        ('sys-detail', reverse('got:sys-detail', args=[system.pk])),
+        ('ruta-list', reverse('got:ruta-list')),
+        ('dashboard', reverse('got:dashboard')),
+        ('buceomtto', reverse('got:buceomtto')),
+        ('schedule', reverse('got:schedule', args=[asset.pk])),
+        ('horas-asset', reverse('got:horas-asset', args=[asset.pk])),
+        ('asset-pdf', reverse('got:generate_asset_pdf', args=[asset.pk])),
+        ('system-pdf', reverse('got:generate-system-pdf', args=[asset.pk, system.pk])),
+    ]
+    if ot:
+        urls.append(('ot-pdf', reverse('got:report', args=[ot.num_ot])))
+    return urls
+
+
+# Escenarios que sin preparación se atenderían desde la caché de PDFs
+PDF_SCENARIOS = {'asset-pdf', 'system-pdf', 'ot-pdf'}
+
+
+def clear_pdf_cache():
+    '''
+    Borra los PDFs generados (archivo y trabajo) para que la siguiente petición consulte,
+    renderice y genere el PDF. Marcarlos stale no basta: el hash del contenido los reutilizaría.
+    '''
+    for job in PdfJob.objects.only('file'):
+        if job.file:
+            job.file.delete(save=False)
+    PdfJob.objects.all().delete()
+
+
+class QueryCounter:
+    '''execute_wrapper que solo cuenta; no depende del log de consultas de DEBUG, que tiene tope.'''
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(client, url, repeat=5, prepare=None):
+    '''
+    Consultas, tiempo (mejor de repeat, ms) y pico de memoria (KB) de un GET, tras un
+    calentamiento. prepare se llama antes de cada GET, fuera de la medición.
+    '''
+    prepare = prepare or (lambda: None)
+    prepare()
+    response = client.get(url)
+    times = []
+    for _ in range(repeat):
+        prepare()
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            start = time.perf_counter()
+            response = client.get(url)
+            times.append((time.perf_counter() - start) * 1000)
+
+    prepare()
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'queries': queries.count,
+        'time_ms': round(min(times), 1),
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmark(repeat=5, username='syn_benchmark'):
+    '''
+    Mide todos los escenarios con el cliente de pruebas de Django. Borra los PDFs generados
+    (clear_pdf_cache). Retorna {escenario: medición}.
+    '''
+    user, _ = User.objects.get_or_create(username=username)
+    if not (user.is_staff and user.is_superuser):
+        user.is_staff = user.is_superuser = True
+        user.save()
+
+    # Sin correo real ni mediciones del middleware mezcladas con las del benchmark
+    with override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        GOT_METRICS_ENABLED=False,
+        GOT_PDF_ASYNC=False,
+        ALLOWED_HOSTS=['testserver'],
+    ):
+        # Un error 500 queda registrado como status en vez de abortar la corrida
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        # Los PDFs se miden generándose, no servidos desde la caché tras el calentamiento
+        return {
+            name: measure(client, url, repeat, clear_pdf_cache if name in PDF_SCENARIOS else None)
+            for name, url in scenarios()
+        }
+
+
+def compare(results, baseline, tolerances=None):
+    '''
+    Compara contra la línea base. Retorna la lista de regresiones (texto); una métrica
+    regresa si supera la base en más de su tolerancia relativa y de MIN_DELTAS.
+    '''
+    tolerances = {**TOLERANCES, **(tolerances or {})}
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['status'] != base['status']:
+            regressions.append(f"{name}: status {result['status']} (base {base['status']})")
+        for metric, tolerance in tolerances.items():
+            excess = result[metric] - base[metric]
+            if excess > base[metric] * tolerance and excess > MIN_DELTAS[metric]:
+                regressions.append(f'{name}: {metric} {result[metric]} (base {base[metric]}, tolerancia {tolerance:.0%})')
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path, results, fleet=None):
+    with open(path, 'w') as f:
+        json.dump({'fleet': fleet or {}, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def synthetic_photos(count, size=(4000, 3000), seed=0):
+    '''JPEG de prueba del tamaño de una foto de celular (12 MP): fondo degradado y figuras al azar.'''
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        image = PILImage.linear_gradient('L').resize(size).convert('RGB')
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            color = tuple(rng.randrange(256) for _ in range(3))
+            draw.ellipse([x, y, x + rng.randrange(size[0] // 30, size[0] // 4), y + rng.randrange(size[1] // 30, size[1] // 4)], fill=color)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def build_large_ot(tasks=100, images=2, photo_size=(4000, 3000), seed=0):
+    '''
+    OT con tasks actividades de texto largo e images fotos por actividad, guardadas en el
+    almacenamiento (todas distintas, como fotos reales), sobre el primer sistema y usuario
+    existentes. Retorna (OT, nombres de las imágenes) para que el llamador las borre.
+    '''
+    system = System.objects.select_related('asset').order_by('id').first()
+    user = User.objects.order_by('id').first()
+    ot = Ot.objects.create(
+        system=system, super=user, state='f', tipo_mtto='c',
+        description='OT de benchmark_pdf con muchas actividades e imágenes',
+    )
+    photos = iter(synthetic_photos(tasks * images, size=photo_size, seed=seed))
+    names = []
+    for number in range(tasks):
+        task = Task.objects.create(
+            ot=ot, responsible=user, description=f'Actividad {number + 1}: ' + 'revisión y ajuste del equipo. ' * 6,
+            procedimiento='Paso del procedimiento de mantenimiento.\n' * 4, hse='Uso de EPP y bloqueo de energías.',
+            news='Sin novedades.', start_date=date.today() - timedelta(days=number % 30), men_time=number % 5 + 1,
+            finished=True,
+        )
+        for _ in range(images):
+            image = Image.objects.create(task=task, image=ContentFile(next(photos), name='benchmark.jpg'))
+            names.append(image.image.name)
+    return ot, names
+
+
+def measure_render(render, repeat=3):
+    '''Tiempo (mejor de repeat, ms), pico de memoria (KB), páginas y tamaño (KB) de un render que retorna el PDF abierto.'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pdf = render()
+        times.append((time.perf_counter() - start) * 1000)
+        size = pdf.seek(0, os.SEEK_END)
+        pdf.seek(0)
+        pages = len(PyPDF2.PdfReader(pdf).pages)
+        pdf.close()
+
+    tracemalloc.start()
+    render().close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'time_ms': round(min(times), 1),
+        'memory_kb': round(peak / 1024, 1),
+        'pages': pages,
+        'size_kb': round(size / 1024, 1),
+    }
+
+
+def compare_pdf_engines(num_ot, repeat=3):
+    '''
+    Genera el reporte de una OT con los dos motores, desde las consultas hasta el PDF y sin
+    pasar por la caché de PdfJob. Retorna {motor: medición}.
+    '''
+    def html():
+        template, source = SOURCES['ot']
+        context, _, attachments = source(num_ot)
+        return render_pdf(get_template(template).render(context), attachments)
+
+    def reportlab():
+        payload, _, images = ot_payload(num_ot)
+        return render_reportlab('ot', payload, images)
+
+    return {'html': measure_render(html, repeat), 'reportlab': measure_render(reportlab, repeat)}
@@ -0,0 +1,119 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .models import Ruta, SystemCompliance
+
+
+FRAME_COLUMNS = [
+    'code', 'frecuency', 'control', 'ot_id', 'ot__state', 'system_id', 'system__location', 'system__asset_id',
+    'system__asset__area', 'due_date', 'schedule_status',
+]
+
+
+def load_fleet_frame(rutas=None, today=None):
+    '''
+    Carga en un DataFrame las rutinas (por defecto toda la flota) con su
+    programación ya calculada en SQL por Ruta.objects.with_schedule(). Una consulta.
+    '''
+    today = today or date.today()
+    rutas = Ruta.objects.all() if rutas is None else rutas
+    rows = rutas.with_schedule(today).order_by().values_list(*FRAME_COLUMNS)
+    frame = pd.DataFrame.from_records(list(rows), columns=FRAME_COLUMNS)
+    frame['due_date'] = pd.to_datetime(frame['due_date'])
+    frame.attrs['today'] = pd.Timestamp(today)
+    return frame
+
+
+def _on_time(frame):
+    return (frame['due_date'] > frame.attrs['today']).to_numpy()
+
+
+def _ind_mtto_weights(frame):
+    state = frame['ot__state'].to_numpy()
+    weights = np.select(
+        [frame['ot_id'].isna().to_numpy(), state == 'x', state == 'f'],
+        [0.4, 0.5, 1.0],
+        default=0.0,
+    ) * _on_time(frame)
+    return pd.Series(weights, index=frame.index)
+
+
+def asset_ind_mtto(frame):
+    '''
+    Asset.ind_mtto vectorizado: porcentaje por activo (float) donde cada rutina a
+    tiempo pesa 0.4 sin OT, 0.5 con OT en ejecución y 1 con OT finalizada.
+    '''
+    if frame.empty:
+        return pd.Series(dtype=float)
+    return (_ind_mtto_weights(frame).groupby(frame['system__asset_id']).mean() * 100).round(2)
+
+
+def system_maintenance_percentage(frame):
+    '''
+    System.maintenance_percentage vectorizado: 'c' suma 1, 'p' suma 0.5 y 'e' suma 1
+    si la rutina aún no vence.
+    '''
+    if frame.empty:
+        return pd.Series(dtype=float)
+    status = frame['schedule_status'].to_numpy()
+    values = np.select(
+        [status == 'c', status == 'p', (status == 'e') & _on_time(frame)],
+        [1.0, 0.5, 1.0],
+        default=0.0,
+    )
+    return (pd.Series(values, index=frame.index).groupby(frame['system_id']).mean() * 100).round(2)
+
+
+def ruta_status_matrix(frame, frequencies, location=None):
+    '''
+    Asset.check_ruta_status vectorizado para varias frecuencias a la vez. Retorna un
+    DataFrame (activo x frecuencia) con "Ok", "Requiere" o "---".
+    '''
+    if location:
+        frame = frame[frame['system__location'] == location]
+    frame = frame[frame['frecuency'].isin(frequencies)]
+
+    overdue = (frame['due_date'] < frame.attrs['today']).to_numpy()
+    matrix = pd.Series(overdue, index=frame.index).groupby(
+        [frame['system__asset_id'], frame['frecuency']]
+    ).any().unstack()
+    matrix = matrix.reindex(columns=list(frequencies))
+
+    return matrix.apply(lambda column: column.map({True: "Requiere", False: "Ok"})).fillna("---")
+
+
+def fleet_compliance(frame):
+    '''Indicador de cumplimiento de toda la flota, con la misma ponderación de ind_mtto.'''
+    if frame.empty:
+        return None
+    return round(float(_ind_mtto_weights(frame).mean() * 100), 2)
+
+
+def refresh_system_compliance(system_ids, today=None):
+    '''
+    Recalcula la tabla SystemCompliance (maintenance_percentage consolidado) para
+    los sistemas indicados. Dos consultas sin importar cuántos sistemas sean.
+    '''
+    system_ids = set(system_ids)
+    if not system_ids:
+        return []
+    frame = load_fleet_frame(Ruta.objects.filter(system_id__in=system_ids), today)
+    percentages = system_maintenance_percentage(frame)
+    totals = frame.groupby('system_id').size() if not frame.empty else pd.Series(dtype=int)
+
+    rollups = [
+        SystemCompliance(
+            system_id=system_id,
+            percentage=float(percentages.get(system_id, 0)),
+            total_rutas=int(totals.get(system_id, 0)),
+        )
+        for system_id in system_ids
+    ]
+    return SystemCompliance.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['system'],
+        update_fields=['percentage', 'total_rutas', 'updated'],
+    )
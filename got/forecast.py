@@ -0,0 +1,150 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from .models import Equipo, HistoryHour, Operation, Ruta
+
+
+HISTORY_DAYS = 182
+HORIZON_DAYS = 730
+SMOOTHING = 0.05
+
+
+def usage_matrix(codes, start, today):
+    '''
+    Horas reportadas por día (equipo x día, de start a today) en una consulta, y la
+    máscara de días conocidos: lo posterior al último reporte de cada equipo aún no
+    se ha reportado y no debe contar como cero uso.
+    '''
+    index = {code: i for i, code in enumerate(codes)}
+    days = (today - start).days + 1
+    usage = np.zeros((len(codes), days))
+    last = np.full(len(codes), -1)
+
+    rows = list(HistoryHour.objects.filter(
+        component__in=codes, report_date__range=(start, today)
+    ).values_list('component', 'report_date', 'hour').order_by())
+    if rows:
+        equipos = np.array([index[component] for component, _, _ in rows])
+        offsets = np.array([(report_date - start).days for _, report_date, _ in rows])
+        np.add.at(usage, (equipos, offsets), np.array([float(hour) for _, _, hour in rows]))
+        np.maximum.at(last, equipos, offsets)
+
+    known = np.arange(days)[None, :] <= last[:, None]
+    return usage, known
+
+
+def operation_mask(asset_ids, start, end):
+    '''Máscara (equipo x día, de start a end) de los días en que el activo del equipo está en operación.'''
+    days = (end - start).days + 1
+    mask = np.zeros((len(asset_ids), days), dtype=bool)
+    rows_by_asset = defaultdict(list)
+    for i, asset_id in enumerate(asset_ids):
+        rows_by_asset[asset_id].append(i)
+
+    operations = Operation.objects.filter(
+        asset__in=rows_by_asset.keys(), end__gte=start, start__lte=end
+    ).values_list('asset', 'start', 'end')
+    for asset_id, op_start, op_end in operations:
+        first, last = max((op_start - start).days, 0), min((op_end - start).days, days - 1)
+        mask[rows_by_asset[asset_id], first:last + 1] = True
+    return mask
+
+
+def usage_rates(usage, known, operating):
+    '''
+    Tasa diaria de uso con suavizado exponencial (pesos (1 - SMOOTHING)^antigüedad),
+    por separado para días en operación y días sin operación. Retorna
+    (tasa en operación, tasa sin operación, tasa global); NaN donde no hay datos.
+    '''
+    age = np.arange(usage.shape[1])[::-1]
+    weights = (1 - SMOOTHING) ** age * known
+
+    def weighted_mean(mask):
+        w = weights * mask
+        total = w.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (w * usage).sum(axis=1) / total
+
+    overall = weighted_mean(True)
+    on_operation, idle = weighted_mean(operating), weighted_mean(~operating)
+    # Sin días observados de un tipo, se usa la tasa global
+    on_operation = np.where(np.isnan(on_operation), overall, on_operation)
+    idle = np.where(np.isnan(idle), overall, idle)
+    return on_operation, idle, overall
+
+
+def days_until(remaining, future_rates):
+    '''
+    Primer día futuro (1..HORIZON_DAYS) en que el uso proyectado acumulado cubre las
+    horas restantes de cada rutina; 0 si no se alcanza dentro del horizonte.
+    '''
+    reached = np.cumsum(future_rates, axis=1) >= remaining[:, None]
+    return np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, 0)
+
+
+def forecast_usage(today=None, equipo_ids=None):
+    '''
+    Proyección por lote para toda la flota (o solo los equipos equipo_ids): ajusta la tasa
+    de uso de cada equipo con su historial reciente y el calendario de operaciones del
+    activo, y guarda Equipo.usage_rate y Ruta.forecast_date de las rutinas por horas.
+    Retorna (equipos, rutinas) actualizados.
+    '''
+    today = today or date.today()
+    start = today - timedelta(days=HISTORY_DAYS - 1)
+    end = today + timedelta(days=HORIZON_DAYS)
+
+    equipos = Equipo.objects.all() if equipo_ids is None else Equipo.objects.filter(code__in=equipo_ids)
+    equipos = list(equipos.select_related('system').only(
+        'code', 'horometro', 'prom_hours', 'usage_rate', 'system__asset'
+    ).order_by('code'))
+    if not equipos:
+        return [], []
+    codes = [equipo.code for equipo in equipos]
+    index = {code: i for i, code in enumerate(codes)}
+
+    usage, known = usage_matrix(codes, start, today)
+    operating = operation_mask([equipo.system.asset_id for equipo in equipos], start, end)
+    on_operation, idle, overall = usage_rates(usage, known, operating[:, :HISTORY_DAYS])
+
+    # Equipos sin reportes recientes: el promedio simple de prom_hours como respaldo
+    prom_hours = np.array([float(equipo.prom_hours or 0) for equipo in equipos])
+    fallback = np.where(prom_hours > 0, prom_hours, np.nan)
+    on_operation = np.where(np.isnan(on_operation), fallback, on_operation)
+    idle = np.where(np.isnan(idle), fallback, idle)
+    overall = np.where(np.isnan(overall), fallback, overall)
+
+    for equipo, rate in zip(equipos, overall):
+        equipo.usage_rate = None if np.isnan(rate) else Decimal(str(round(float(rate), 2)))
+    Equipo.objects.bulk_update(equipos, ['usage_rate'], batch_size=500)
+
+    rutas = Ruta.objects.filter(control='h', equipo__isnull=False)
+    if equipo_ids is not None:
+        rutas = rutas.filter(equipo__in=codes)
+    rutas = list(rutas.only(
+        'code', 'frecuency', 'ot', 'equipo', 'hours_since_intervention', 'next_due_date', 'forecast_date'
+    ))
+    if rutas:
+        rows = np.array([index[ruta.equipo_id] for ruta in rutas])
+        # Igual que Ruta.next_date: sin OT cuenta el horómetro, con OT las horas desde la intervención
+        used = [
+            ruta.hours_since_intervention if ruta.ot_id else equipos[index[ruta.equipo_id]].horometro or 0
+            for ruta in rutas
+        ]
+        remaining = np.array([float(ruta.frecuency - hours) for ruta, hours in zip(rutas, used)])
+        future_rates = np.where(operating[rows, HISTORY_DAYS:], on_operation[rows, None], idle[rows, None])
+        future_rates = np.nan_to_num(future_rates)
+        days = days_until(remaining, future_rates)
+
+        for ruta, left, ndays in zip(rutas, remaining, days):
+            if left <= 0:
+                ruta.forecast_date = ruta.next_due_date
+            else:
+                ruta.forecast_date = today + timedelta(days=int(ndays)) if ndays else None
+        Ruta.objects.bulk_update(rutas, ['forecast_date'], batch_size=500)
+
+    if equipo_ids is None:
+        Ruta.objects.exclude(control='h', equipo__isnull=False).exclude(forecast_date=None).update(forecast_date=None)
+    return equipos, rutas
@@ -0,0 +1,280 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+from itertools import groupby
+
+import pandas as pd
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+
+from .models import Equipo, HistoryHour, HourRollup, Ruta
+from .scheduling import refresh_schedule
+
+
+PROM_HOURS_WINDOW = 10
+
+
+def rolling_prom_hours(equipo_id):
+    '''Promedio de los últimos PROM_HOURS_WINDOW reportes del equipo (consulta acotada).'''
+    ultimos = HistoryHour.objects.filter(component_id=equipo_id).order_by('-report_date')[:PROM_HOURS_WINDOW]
+    promedio = ultimos.aggregate(promedio_horas=Avg('hour'))['promedio_horas']
+    return int(promedio or 0)
+
+
+def apply_hour_delta(equipo_id, delta):
+    '''
+    Suma delta al horómetro del equipo con un UPDATE sobre F('horometro') y actualiza
+    prom_hours con la ventana móvil. Solo escribe esos dos campos.
+    '''
+    Equipo.objects.filter(pk=equipo_id).update(
+        horometro=ExpressionWrapper(
+            Coalesce(F('horometro'), F('initial_hours'), output_field=DecimalField()) + delta,
+            output_field=DecimalField(),
+        ),
+        prom_hours=rolling_prom_hours(equipo_id),
+    )
+
+
+# Atributo de la conexión con los equipos cuyas rutinas esperan recálculo al confirmarse la transacción
+PENDING_REFRESH_ATTR = '_got_pending_schedule_refresh'
+
+
+def refresh_schedule_on_commit(equipo_ids):
+    '''
+    Recalcula la programación de las rutinas de estos equipos (y con ella cumplimiento,
+    proyección y PDFs) al confirmarse la transacción, una sola vez por equipo aunque en
+    ella se guarden muchos reportes de horas. Fuera de una transacción se hace de inmediato.
+    '''
+    connection = transaction.get_connection()
+    pending = getattr(connection, PENDING_REFRESH_ATTR, None)
+    if pending is None:
+        pending = set()
+        setattr(connection, PENDING_REFRESH_ATTR, pending)
+    pending.update(equipo_ids)
+
+    def refresh():
+        # El primer callback de la transacción recalcula todo lo acumulado; los demás no encuentran nada
+        ids = set(pending)
+        pending.clear()
+        if ids:
+            refresh_schedule(Ruta.objects.filter(equipo_id__in=ids))
+
+    transaction.on_commit(refresh)
+
+
+def expected_horometros(equipo_ids=None):
+    '''
+    Valores correctos de horometro y prom_hours recalculados desde HistoryHour.
+    Retorna {code: (horometro, prom_hours)}.
+    '''
+    equipos = Equipo.objects.all() if equipo_ids is None else Equipo.objects.filter(pk__in=equipo_ids)
+    totals = HistoryHour.objects.filter(component=OuterRef('pk')).order_by().values('component').annotate(
+        total=Sum('hour')
+    ).values('total')
+    horometros = dict(equipos.annotate(
+        expected=ExpressionWrapper(
+            Coalesce(Subquery(totals), Value(0), output_field=DecimalField()) + F('initial_hours'),
+            output_field=DecimalField(),
+        )
+    ).values_list('code', 'expected'))
+
+    # Ventana de los últimos reportes por equipo en un solo recorrido ordenado
+    promedios = {}
+    reportes = HistoryHour.objects.filter(component__in=horometros.keys()).order_by('component', '-report_date')
+    for code, rows in groupby(reportes.values_list('component', 'hour').iterator(), key=lambda row: row[0]):
+        ventana = [hour for _, hour in rows][:PROM_HOURS_WINDOW]
+        promedios[code] = int(sum(ventana) / len(ventana))
+
+    return {code: (total, promedios.get(code, 0)) for code, total in horometros.items()}
+
+
+def recalculate_horometros(equipo_ids=None):
+    '''Reconstruye horometro y prom_hours desde cero. Retorna los equipos corregidos.'''
+    expected = expected_horometros(equipo_ids)
+    equipos = list(Equipo.objects.filter(pk__in=expected.keys()).only('code', 'horometro', 'prom_hours'))
+    changed = []
+    for equipo in equipos:
+        horometro, prom_hours = expected[equipo.code]
+        if equipo.horometro != horometro or equipo.prom_hours != prom_hours:
+            equipo.horometro, equipo.prom_hours = horometro, prom_hours
+            changed.append(equipo)
+    Equipo.objects.bulk_update(changed, ['horometro', 'prom_hours'], batch_size=500)
+    return changed
+
+
+ROLLUP_PERIODS = {'w': TruncWeek, 'm': TruncMonth}
+
+
+def period_start(period, day):
+    '''Inicio del periodo que contiene day: lunes de la semana o primero del mes.'''
+    if period == 'w':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def apply_rollup_delta(equipo_id, report_date, delta, reports):
+    '''
+    Suma delta horas y reports registros a los acumulados semanal y mensual que
+    contienen report_date. Crea la fila si no existe y borra las que quedan sin reportes.
+    '''
+    for period in ROLLUP_PERIODS:
+        start = period_start(period, report_date)
+        HourRollup.objects.bulk_create(
+            [HourRollup(component_id=equipo_id, period=period, start=start)], ignore_conflicts=True
+        )
+        rollup = HourRollup.objects.filter(component_id=equipo_id, period=period, start=start)
+        rollup.update(total=F('total') + delta, reports=F('reports') + reports)
+        if reports < 0:
+            rollup.filter(reports__lte=0).delete()
+
+
+def rebuild_hour_rollups(equipo_ids=None, batch_size=1000):
+    '''Regenera los acumulados desde HistoryHour con una consulta agrupada por periodo.'''
+    history = HistoryHour.objects.all() if equipo_ids is None else HistoryHour.objects.filter(component__in=equipo_ids)
+    rollups = HourRollup.objects.all() if equipo_ids is None else HourRollup.objects.filter(component__in=equipo_ids)
+
+    with transaction.atomic():
+        rollups.delete()
+        for period, trunc in ROLLUP_PERIODS.items():
+            rows = history.annotate(start=trunc('report_date')).values('component', 'start').annotate(
+                total=Sum('hour'), reports=Count('id')
+            ).order_by()
+            HourRollup.objects.bulk_create(
+                [HourRollup(component_id=row['component'], period=period, start=row['start'],
+                            total=row['total'], reports=row['reports']) for row in rows.iterator()],
+                batch_size=batch_size,
+            )
+
+
+def hour_trend(equipos, period='m', periods=24, today=None):
+    '''
+    Horas por equipo y periodo (DataFrame equipo x inicio de periodo) para los últimos
+    periods periodos, leídas de HourRollup en vez de los registros diarios.
+    '''
+    today = today or date.today()
+    starts = [period_start(period, today)]
+    for _ in range(periods - 1):
+        starts.append(period_start(period, starts[-1] - timedelta(days=1)))
+    starts.reverse()
+
+    codes = [equipo.code for equipo in equipos]
+    rows = HourRollup.objects.filter(
+        component__in=codes, period=period, start__gte=starts[0]
+    ).values_list('component', 'start', 'total')
+
+    frame = pd.DataFrame.from_records(list(rows), columns=['component', 'start', 'total'])
+    trend = frame.pivot(index='component', columns='start', values='total')
+    trend = trend.reindex(index=codes, columns=starts).astype(object)
+    return trend.where(trend.notna(), 0)
+
+
+HOURS_GRID_WINDOWS = (30, 90, 365)
+
+
+def hours_grid(equipos, dates):
+    '''
+    Matriz equipo x fecha (DataFrame indexado por código de equipo, columnas en el orden
+    de dates) con las horas reportadas, a partir de una sola consulta agrupada.
+    Los días sin reporte quedan en 0.
+    '''
+    codes = [equipo.code for equipo in equipos]
+    totals = HistoryHour.objects.filter(
+        component__in=codes, report_date__range=(min(dates), max(dates))
+    ).values_list('component', 'report_date').annotate(total=Sum('hour')).order_by()
+
+    frame = pd.DataFrame.from_records(list(totals), columns=['component', 'report_date', 'total'])
+    grid = frame.pivot(index='component', columns='report_date', values='total')
+    grid = grid.reindex(index=codes, columns=dates).astype(object)
+    return grid.where(grid.notna(), 0)
+
+
+HOUR_COLUMNS = ['component', 'report_date', 'hour']
+
+
+def parse_hour_rows(content, fmt='csv'):
+    '''
+    Lee un lote de reportes de horas en CSV (con encabezado component,report_date,hour)
+    o JSON (lista de objetos, o {"rows": [...]}) y retorna una lista de diccionarios.
+    '''
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if fmt == 'json':
+        data = json.loads(content)
+        rows = data.get('rows', []) if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise ValueError('El JSON debe ser una lista de registros.')
+        return rows
+    reader = csv.DictReader(io.StringIO(content))
+    missing = set(HOUR_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f'faltan las columnas {", ".join(sorted(missing))}.')
+    return list(reader)
+
+
+def clean_hour_rows(rows):
+    '''
+    Valida los registros con las mismas reglas del formulario ReportHours (0 a 24 horas)
+    y que el equipo exista. Retorna (registros válidos, errores por fila). Si un equipo
+    y fecha se repiten en el lote, prevalece el último.
+    '''
+    codes = {str(row.get('component', '')).strip() for row in rows if isinstance(row, dict)}
+    equipos = set(Equipo.objects.filter(code__in=codes).values_list('code', flat=True))
+    fields = {name: HistoryHour._meta.get_field(name) for name in ('report_date', 'hour')}
+
+    cleaned, errors = {}, []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f'Fila {number}: formato inválido.')
+            continue
+        component = str(row.get('component', '')).strip()
+        if component not in equipos:
+            errors.append(f'Fila {number}: el equipo "{component}" no existe.')
+            continue
+        try:
+            report_date = fields['report_date'].clean(row.get('report_date'), None)
+            hour = fields['hour'].clean(row.get('hour'), None)
+        except ValidationError as e:
+            errors.append(f'Fila {number}: {" ".join(e.messages)}')
+            continue
+        if hour < 0 or hour > 24:
+            errors.append(f'Fila {number}: el valor de horas debe estar entre 0 y 24.')
+            continue
+        cleaned[(component, report_date)] = hour
+
+    return cleaned, errors
+
+
+def import_hours(rows, reporter=None, batch_size=500):
+    '''
+    Carga masiva de HistoryHour: upsert por (component, report_date) con bulk_create
+    y un solo recálculo de horómetro y programación por equipo afectado.
+    Retorna (número de registros guardados, errores por fila).
+    '''
+    cleaned, errors = clean_hour_rows(rows)
+    if not cleaned:
+        return 0, errors
+
+    reports = [
+        HistoryHour(component_id=component, report_date=report_date, hour=hour, reporter=reporter)
+        for (component, report_date), hour in cleaned.items()
+    ]
+    equipo_ids = {report.component_id for report in reports}
+
+    with transaction.atomic():
+        # bulk_create no dispara las señales de HistoryHour: el recálculo se hace una vez al final
+        HistoryHour.objects.bulk_create(
+            reports,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['component', 'report_date'],
+            update_fields=['hour', 'reporter'],
+        )
+        recalculate_horometros(equipo_ids)
+        rebuild_hour_rollups(equipo_ids)
+        refresh_schedule(Ruta.objects.filter(equipo_id__in=equipo_ids))
+
+    return len(reports), errors
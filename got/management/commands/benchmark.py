@@ -0,0 +1,62 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from got.benchmark import TOLERANCES, compare, load_baseline, run_benchmark, save_baseline
+from got.models import Asset
+from got.synthetic import SYNTHETIC_PREFIX, require_local_database
+
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'got', 'benchmarks', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide consultas, tiempo y memoria de las vistas pesadas con el cliente de pruebas y '
+        'compara contra la línea base; termina con error si hay regresiones. '
+        'Usar sobre una flota creada con seed_fleet. Se niega a correr contra un servidor de '
+        'base de datos remoto salvo que se use --force.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Archivo JSON de la línea base.')
+        parser.add_argument('--save', action='store_true', help='Guardar los resultados como nueva línea base.')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por vista (se reporta el mejor tiempo).')
+        for metric, tolerance in TOLERANCES.items():
+            parser.add_argument(
+                f'--tolerance-{metric.replace("_", "-")}', dest=metric, type=float, default=tolerance,
+                help=f'Tolerancia relativa para {metric} (por defecto {tolerance}).',
+            )
+        parser.add_argument('--force', action='store_true', help='Permitir la ejecución contra una base remota.')
+
+    def handle(self, *args, **options):
+        # Crea un superusuario, borra los PdfJob y recorre vistas que escriben en la base
+        require_local_database('benchmark', options['force'])
+        results = run_benchmark(repeat=options['repeat'])
+        if not results:
+            raise CommandError('No hay datos para medir. Ejecute primero seed_fleet.')
+
+        self.stdout.write(f'{"vista":<14}{"status":>7}{"consultas":>11}{"ms":>10}{"KB":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<14}{result["status"]:>7}{result["queries"]:>11}{result["time_ms"]:>10}{result["memory_kb"]:>10}'
+            )
+
+        if options['save']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            fleet = {'synthetic_assets': Asset.objects.filter(name__startswith=SYNTHETIC_PREFIX).count()}
+            save_baseline(options['baseline'], results, fleet)
+            self.stdout.write(self.style.SUCCESS(f'Línea base guardada en {options["baseline"]}.'))
+            return
+
+        if not os.path.exists(options['baseline']):
+            raise CommandError(f'No existe la línea base {options["baseline"]}. Use --save para crearla.')
+
+        tolerances = {metric: options[metric] for metric in TOLERANCES}
+        regressions = compare(results, load_baseline(options['baseline']), tolerances)
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} regresiones frente a la línea base.')
+        self.stdout.write(self.style.SUCCESS('Sin regresiones frente a la línea base.'))
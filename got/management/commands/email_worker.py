@@ -0,0 +1,50 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from got.notifications import queue_digests
+from got.outbox import send_pending
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía en segundo plano los correos encolados por las vistas (GOT_EMAIL_ASYNC), '
+        'una conexión SMTP por lote y con reintentos, y arma los resúmenes de notificaciones '
+        'que vencieron (GOT_NOTIFICATIONS). La cola es la tabla OutboundEmail; '
+        'pueden correr varios workers a la vez. Como servicio: python manage.py email_worker; '
+        'desde cron: python manage.py email_worker --once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Envía lo pendiente y termina.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Segundos de espera cuando la cola está vacía.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            queue_digests()
+            sent = send_pending()
+            self.stdout.write(self.style.SUCCESS(f'{sent} correos enviados.'))
+            return
+
+        self.stdout.write('Esperando correos por enviar (Ctrl+C para salir)...')
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    queue_digests()
+                    sent = send_pending(limit=100)
+                except Exception:
+                    # Un error de la base o del SMTP no detiene el worker: se reintenta en el siguiente ciclo
+                    logger.exception('email_worker: error en el ciclo de envío')
+                    sent = 0
+                if sent:
+                    logger.info('email_worker: %s correos enviados', sent)
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
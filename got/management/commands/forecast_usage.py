@@ -0,0 +1,23 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from got.forecast import forecast_usage
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Proyecta la tasa de uso de los equipos y la fecha de vencimiento de las rutinas por horas. Pensado para el cron diario.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        equipos, rutas = forecast_usage()
+        elapsed = time.monotonic() - started
+
+        logger.info('forecast_usage: %s equipos, %s rutinas en %.2fs', len(equipos), len(rutas), elapsed)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(equipos)} equipos y {len(rutas)} rutinas por horas proyectadas en {elapsed:.2f}s.'
+        ))
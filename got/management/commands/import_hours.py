@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from got.hours import import_hours, parse_hour_rows
+
+
+class Command(BaseCommand):
+    help = 'Importa un lote de reportes de horas (CSV o JSON) con un solo recálculo por equipo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV (component,report_date,hour) o JSON.')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Formato del archivo (por defecto según la extensión).')
+        parser.add_argument('--reporter', help='Usuario que queda como reportador.')
+
+    def handle(self, *args, **options):
+        path = options['archivo']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+
+        reporter = None
+        if options['reporter']:
+            try:
+                reporter = User.objects.get(username=options['reporter'])
+            except User.DoesNotExist:
+                raise CommandError(f'El usuario "{options["reporter"]}" no existe.')
+
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_hour_rows(f.read(), fmt)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f'No se pudo leer {path}: {e}')
+
+        saved, errors = import_hours(rows, reporter=reporter)
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(f'{saved} reportes guardados, {len(errors)} filas con errores.'))
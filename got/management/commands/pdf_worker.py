@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from got.pdfs import run_pending
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera en segundo plano los PDFs encolados por las vistas de reportes (GOT_PDF_ASYNC). '
+        'La cola es la tabla PdfJob, sin broker externo; pueden correr varios workers a la vez. '
+        'Como servicio: python manage.py pdf_worker; desde cron: python manage.py pdf_worker --once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Vacía la cola y termina.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            done = run_pending()
+            self.stdout.write(self.style.SUCCESS(f'{done} PDFs generados.'))
+            return
+
+        self.stdout.write('Esperando trabajos de PDF (Ctrl+C para salir)...')
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    done = run_pending(limit=10)
+                except Exception:
+                    # Un error de la base no detiene el worker: se reintenta en el siguiente ciclo
+                    logger.exception('pdf_worker: error al tomar trabajos')
+                    done = 0
+                if done:
+                    logger.info('pdf_worker: %s PDFs generados', done)
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
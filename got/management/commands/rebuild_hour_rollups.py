@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from got.hours import rebuild_hour_rollups
+from got.models import HourRollup
+
+
+class Command(BaseCommand):
+    help = 'Regenera los acumulados semanales y mensuales de horas (HourRollup) desde HistoryHour.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('equipos', nargs='*', help='Códigos de equipo a regenerar (por defecto todos).')
+
+    def handle(self, *args, **options):
+        equipo_ids = options['equipos'] or None
+        rebuild_hour_rollups(equipo_ids)
+        rollups = HourRollup.objects.all() if equipo_ids is None else HourRollup.objects.filter(component__in=equipo_ids)
+        self.stdout.write(self.style.SUCCESS(f'{rollups.count()} acumulados regenerados.'))
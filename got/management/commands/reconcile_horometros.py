@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from got.hours import expected_horometros, recalculate_horometros
+from got.models import Equipo, Ruta
+from got.scheduling import refresh_schedule
+
+
+class Command(BaseCommand):
+    help = 'Compara horometro y prom_hours de cada equipo contra HistoryHour y, con --fix, los reconstruye.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Reescribir los valores que no coinciden.')
+        parser.add_argument('equipos', nargs='*', help='Códigos de equipo a revisar (por defecto todos).')
+
+    def handle(self, *args, **options):
+        equipo_ids = options['equipos'] or None
+
+        if options['fix']:
+            changed = recalculate_horometros(equipo_ids)
+            refresh_schedule(Ruta.objects.filter(equipo__in=changed))
+            for equipo in changed:
+                self.stdout.write(f'{equipo.code}: horometro={equipo.horometro} prom_hours={equipo.prom_hours}')
+            self.stdout.write(self.style.SUCCESS(f'{len(changed)} equipos corregidos.'))
+            return
+
+        expected = expected_horometros(equipo_ids)
+        mismatches = 0
+        for equipo in Equipo.objects.filter(pk__in=expected.keys()).only('code', 'horometro', 'prom_hours'):
+            horometro, prom_hours = expected[equipo.code]
+            if equipo.horometro != horometro or equipo.prom_hours != prom_hours:
+                mismatches += 1
+                self.stdout.write(
+                    f'{equipo.code}: horometro {equipo.horometro} (esperado {horometro}), '
+                    f'prom_hours {equipo.prom_hours} (esperado {prom_hours})'
+                )
+
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'{mismatches} equipos con diferencias. Use --fix para corregirlos.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(expected)} equipos revisados, sin diferencias.'))
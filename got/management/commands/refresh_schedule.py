@@ -0,0 +1,59 @@
+import json
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from got.scheduling import rollover_schedule
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula next_due_date, hours_since_intervention y status de todas las rutinas '
+        'y lista las que pasaron a vencidas. Pensado para cron, p. ej.: '
+        '5 0 * * * cd /got && python manage.py refresh_schedule --json /var/log/got/vencidas.json. '
+        'Al desplegar las columnas persistidas por primera vez, correr una vez con --backfill.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rutinas por bloque de bulk_update.')
+        parser.add_argument('--json', dest='json_path', help='Archivo donde escribir las rutinas que pasaron a vencidas.')
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Primer relleno de las columnas: no lista vencidas, porque todas las que ya lo '
+                 'estaban aparecerían como vencidas hoy.'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        total, transitions = rollover_schedule(chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - start
+        if options['backfill']:
+            transitions = []
+
+        overdue = [
+            {
+                'code': ruta.code,
+                'name': ruta.name,
+                'asset': ruta.system.asset.abbreviation,
+                'system': ruta.system.name,
+                'next_due_date': ruta.next_due_date.isoformat(),
+                'status': ruta.status,
+            }
+            for ruta in transitions
+        ]
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(overdue, f, ensure_ascii=False, indent=2)
+
+        for item in overdue:
+            self.stdout.write(f"{item['asset']} / {item['system']} / {item['name']} ({item['code']}): vencida desde {item['next_due_date']}")
+
+        logger.info('refresh_schedule: %s rutinas en %.2fs, %s vencidas hoy', total, elapsed, len(overdue))
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} rutinas recalculadas en {elapsed:.2f}s; {len(overdue)} pasaron a vencidas.'
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from got.models import Asset
+from got.synthetic import SYNTHETIC_PREFIX, build_fleet, purge_fleet, require_local_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea una flota sintética reproducible para pruebas de rendimiento en una base local. '
+        'Se niega a correr contra un servidor de base de datos remoto salvo que se use --force.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=10, help='Número de activos.')
+        parser.add_argument('--systems', type=int, default=6, help='Sistemas por activo.')
+        parser.add_argument('--years', type=float, default=2, help='Años de historial de horas.')
+        parser.add_argument('--ots', type=int, default=8, help='Órdenes de trabajo por activo.')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla aleatoria.')
+        parser.add_argument('--purge', action='store_true', help='Borrar la flota sintética anterior antes de crear.')
+        parser.add_argument('--force', action='store_true', help='Permitir la ejecución contra una base remota.')
+
+    def handle(self, *args, **options):
+        require_local_database('seed_fleet', options['force'])
+
+        if options['purge']:
+            purge_fleet()
+        elif Asset.objects.filter(name__startswith=SYNTHETIC_PREFIX).exists():
+            raise CommandError('Ya existe una flota sintética. Use --purge para regenerarla.')
+
+        start = time.monotonic()
+        summary = build_fleet(
+            assets=options['assets'], systems=options['systems'], years=options['years'],
+            ots=options['ots'], seed=options['seed'],
+        )
+        elapsed = time.monotonic() - start
+
+        for name, count in summary.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Flota sintética creada en {elapsed:.1f}s.'))
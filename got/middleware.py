@@ -0,0 +1,143 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.template.base import Template
+
+from .models import RequestMetric
+
+
+logger = logging.getLogger('got.metrics')
+
+_current = ContextVar('got_request_metrics', default=None)
+
+# Listas IN (%s, %s, ...) de cualquier largo comparten huella
+IN_LIST = re.compile(r'\(\s*%s(\s*,\s*%s)*\s*\)')
+
+
+def fingerprint(sql):
+    '''Huella de una consulta: el SQL parametrizado con las listas IN colapsadas.'''
+    return IN_LIST.sub('(...)', sql)
+
+
+class RequestMetrics:
+    '''Acumulador de consultas y tiempo de plantillas de una petición.'''
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, limit=5):
+        return [
+            {'sql': sql[:300], 'count': count}
+            for sql, count in self.fingerprints.most_common(limit) if count > 1
+        ]
+
+
+def _timed_render(render):
+    # Solo se mide la plantilla más externa: extends/include llaman _render anidado
+    def wrapper(self, context):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            return render(self, context)
+        metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics.rendering = False
+    wrapper._got_metrics = True
+    return wrapper
+
+
+def patch_template_render():
+    '''Mide el tiempo de plantillas envolviendo Template._render; solo con las métricas activas.'''
+    if not getattr(Template._render, '_got_metrics', False):
+        Template._render = _timed_render(Template._render)
+
+
+def response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    '''
+    Registra por petición a las vistas de got: número de consultas, tiempo en base de
+    datos, consultas repetidas (N+1), tiempo de plantillas y tamaño de la respuesta.
+    Escribe un log estructurado (logger got.metrics) y guarda las últimas
+    GOT_METRICS_MAX_ROWS mediciones en RequestMetric.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'GOT_METRICS_ENABLED', True)
+        self.sample_rate = getattr(settings, 'GOT_METRICS_SAMPLE_RATE', 0.05)
+        self.max_rows = getattr(settings, 'GOT_METRICS_MAX_ROWS', 5000)
+        if self.enabled:
+            patch_template_render()
+
+    def __call__(self, request):
+        if not self.enabled or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_time = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match is None or match.namespace != 'got':
+            return response
+
+        record = {
+            'url_name': match.view_name,
+            'path': request.path[:255],
+            'method': request.method,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'duplicate_queries': sum(count - 1 for count in metrics.fingerprints.values()),
+            'db_time': round(metrics.db_time * 1000, 2),
+            'template_time': round(metrics.template_time * 1000, 2),
+            'total_time': round(total_time * 1000, 2),
+            'response_size': response_size(response),
+            'duplicates': metrics.duplicates(),
+        }
+        logger.info(json.dumps(record))
+        self.store(record)
+        return response
+
+    def store(self, record):
+        # La medición nunca debe tumbar la petición
+        try:
+            metric = RequestMetric.objects.create(**record)
+            if metric.pk % 100 == 0:
+                RequestMetric.objects.filter(pk__lte=metric.pk - self.max_rows).delete()
+        except DatabaseError:
+            logger.warning('No se pudo guardar la medición de %s', record['path'], exc_info=True)
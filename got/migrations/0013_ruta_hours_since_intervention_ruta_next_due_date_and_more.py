@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0012_remove_control_asset_remove_control_reporter_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ruta',
+            name='hours_since_intervention',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='ruta',
+            name='next_due_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ruta',
+            name='status',
+            field=models.CharField(choices=[('c', 'Completado'), ('p', 'Planeado'), ('e', 'Sin información'), ('v', 'Retrasado')], db_index=True, default='e', editable=False, max_length=1),
+        ),
+    ]
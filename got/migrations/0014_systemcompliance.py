@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0013_ruta_hours_since_intervention_ruta_next_due_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemCompliance',
+            fields=[
+                ('system', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compliance', serialize=False, to='got.system')),
+                ('percentage', models.FloatField(default=0)),
+                ('total_rutas', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:51
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def rebuild_horometros(apps, schema_editor):
+    # Punto de partida exacto para la contabilidad incremental: initial_hours + suma del historial
+    Equipo = apps.get_model('got', 'Equipo')
+    HistoryHour = apps.get_model('got', 'HistoryHour')
+    totals = HistoryHour.objects.filter(component=OuterRef('pk')).order_by().values('component').annotate(
+        total=Sum('hour')
+    ).values('total')
+    Equipo.objects.update(horometro=ExpressionWrapper(
+        Coalesce(Subquery(totals), Value(0), output_field=DecimalField()) + F('initial_hours'),
+        output_field=DecimalField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0014_systemcompliance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='equipo',
+            name='horometro',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=12, null=True),
+        ),
+        migrations.RunPython(rebuild_horometros, migrations.RunPython.noop),
+    ]
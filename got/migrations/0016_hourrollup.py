@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+
+def build_rollups(apps, schema_editor):
+    # Carga inicial de los acumulados semanal y mensual desde el historial existente
+    HistoryHour = apps.get_model('got', 'HistoryHour')
+    HourRollup = apps.get_model('got', 'HourRollup')
+    for period, trunc in (('w', TruncWeek), ('m', TruncMonth)):
+        rows = HistoryHour.objects.annotate(start=trunc('report_date')).values('component', 'start').annotate(
+            total=Sum('hour'), reports=Count('id')
+        ).order_by()
+        HourRollup.objects.bulk_create(
+            [HourRollup(component_id=row['component'], period=period, start=row['start'],
+                        total=row['total'], reports=row['reports']) for row in rows.iterator()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0015_alter_equipo_horometro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('w', 'Semanal'), ('m', 'Mensual')], max_length=1)),
+                ('start', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('reports', models.IntegerField(default=0)),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hour_rollups', to='got.equipo')),
+            ],
+            options={
+                'ordering': ['component', 'period', 'start'],
+                'unique_together': {('component', 'period', 'start')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
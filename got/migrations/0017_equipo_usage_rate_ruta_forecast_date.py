@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0016_hourrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipo',
+            name='usage_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='ruta',
+            name='forecast_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0017_equipo_usage_rate_ruta_forecast_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(db_index=True, max_length=100)),
+                ('path', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('status', models.IntegerField()),
+                ('queries', models.IntegerField(default=0)),
+                ('duplicate_queries', models.IntegerField(default=0)),
+                ('db_time', models.FloatField(default=0)),
+                ('template_time', models.FloatField(default=0)),
+                ('total_time', models.FloatField(default=0)),
+                ('response_size', models.IntegerField(blank=True, null=True)),
+                ('duplicates', models.JSONField(blank=True, default=list)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
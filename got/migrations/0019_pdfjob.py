@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:34
+
+import django.db.models.deletion
+import got.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0018_requestmetric'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(max_length=10)),
+                ('filename', models.CharField(max_length=150)),
+                ('html', models.TextField(blank=True)),
+                ('attachments', models.JSONField(blank=True, default=list)),
+                ('state', models.CharField(choices=[('p', 'Pendiente'), ('r', 'Generando'), ('f', 'Listo'), ('e', 'Error')], db_index=True, default='p', max_length=1)),
+                ('file', models.FileField(blank=True, null=True, upload_to=got.models.get_generated_pdf_path)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0019_pdfjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pdfjob',
+            name='last_used',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfjob',
+            name='size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfjob',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='pdfjob',
+            name='subject',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
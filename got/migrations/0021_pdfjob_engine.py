@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0020_pdfjob_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfjob',
+            name='engine',
+            field=models.CharField(choices=[('html', 'HTML (xhtml2pdf)'), ('reportlab', 'ReportLab')], default='html', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='pdfjob',
+            name='payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0022_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='links_only',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='site_url',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('got', '0023_outboundemail_links'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(db_index=True, max_length=254)),
+                ('kind', models.CharField(max_length=20)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('attachments', models.JSONField(blank=True, default=list)),
+                ('site_url', models.CharField(blank=True, max_length=200)),
+                ('frequency', models.CharField(choices=[('i', 'Inmediata'), ('h', 'Cada hora'), ('d', 'Diaria')], max_length=1)),
+                ('due', models.DateTimeField(db_index=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('queued', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('email', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='got.outboundemail')),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+    ]
@@ -2,7 +2,13 @@ from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
 from datetime import date, timedelta
+from decimal import InvalidOperation
 from django.db.models import Sum
+from django.db.models import (
+    Case, When, Value, F, Func, OuterRef, Subquery, ExpressionWrapper, DateField, DecimalField, FloatField,
+    IntegerField, CharField
+)
+from django.db.models.functions import Cast, Coalesce, NullIf
 from datetime import datetime
 import uuid
 from django.contrib.postgres.fields import ArrayField
@@ -24,6 +30,10 @@ def get_upload_pdfs(instance, filename):
     return filename
 
 
+def get_generated_pdf_path(instance, filename):
+    return f"generados/{instance.key}.pdf"
+
+
 class Item(models.Model):
 
     SECCION = (
@@ -93,6 +103,10 @@ class Asset(models.Model):
 
 
     def ind_mtto(self):
+        # scheduling.load_ind_mtto lo precalcula para una página completa de activos
+        if hasattr(self, 'maintenance_index'):
+            return self.maintenance_index
+
         rutas = self.system_set.all().annotate(total_rutas=Count('rutas')).exclude(total_rutas=0)
         if not rutas:
             return "---"
@@ -154,6 +168,12 @@ class System(models.Model):
     
     @property
     def maintenance_percentage(self):
+        # Valor consolidado en SystemCompliance; se calcula aquí solo si aún no existe
+        try:
+            return self.compliance.percentage
+        except SystemCompliance.DoesNotExist:
+            pass
+
         rutas = self.rutas.all()
         if not rutas:
             return 0
@@ -176,6 +196,17 @@ class System(models.Model):
         return round((total_value / max_possible_value) * 100, 2)
 
 
+class SystemCompliance(models.Model):
+
+    system = models.OneToOneField(System, on_delete=models.CASCADE, primary_key=True, related_name='compliance')
+    percentage = models.FloatField(default=0)
+    total_rutas = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.system}: {self.percentage}%'
+
+
 class Equipo(models.Model):
 
     TIPO = (
@@ -197,8 +228,9 @@ class Equipo(models.Model):
 
     tipo = models.CharField(choices=TIPO, default='nr', max_length=2)
     initial_hours = models.IntegerField(default=0)
-    horometro = models.IntegerField(default=0, null=True, blank=True)
+    horometro = models.DecimalField(max_digits=12, decimal_places=2, default=0, null=True, blank=True)
     prom_hours = models.IntegerField(default=0, null=True, blank=True)
+    usage_rate = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True, editable=False)
     lubricante = models.CharField(max_length=100, null=True, blank=True)
     volumen = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
@@ -253,6 +285,27 @@ class HistoryHour(models.Model):
         unique_together = ('component', 'report_date')
 
 
+class HourRollup(models.Model):
+
+    PERIOD = (
+        ('w', 'Semanal'),
+        ('m', 'Mensual'),
+    )
+
+    component = models.ForeignKey(Equipo, on_delete=models.CASCADE, related_name='hour_rollups')
+    period = models.CharField(max_length=1, choices=PERIOD)
+    start = models.DateField()
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    reports = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '%s %s %s: %s' % (self.component, self.get_period_display(), self.start, self.total)
+
+    class Meta:
+        ordering = ['component', 'period', 'start']
+        unique_together = ('component', 'period', 'start')
+
+
 class Ot(models.Model):
 
     STATUS = (
@@ -296,6 +349,77 @@ class Ot(models.Model):
         ordering = ['-num_ot']
 
 
+class Trunc(Func):
+    # TRUNC numérico de Postgres: igual que int() en Python, trunca hacia cero
+    function = 'TRUNC'
+    output_field = DecimalField()
+
+
+class RutaQuerySet(models.QuerySet):
+
+    def overdue(self, today=None):
+        return self.filter(next_due_date__lt=today or date.today())
+
+    def with_schedule(self, today=None):
+        """
+        Anota hours_period, due_date, days_left, remaining_pct y schedule_status con las mismas
+        reglas de next_date, daysleft, percentage_remaining y maintenance_status, pero en SQL.
+        """
+        today = today or date.today()
+        hours_period = HistoryHour.objects.filter(
+            component=OuterRef('equipo'),
+            report_date__gte=OuterRef('intervention_date'),
+            report_date__lte=today,
+        ).order_by().values('component').annotate(total=Sum('hour')).values('total')[:1]
+
+        hours_left = Case(
+            When(ot__isnull=True, then=ExpressionWrapper(F('frecuency') - F('equipo__horometro'), output_field=DecimalField())),
+            default=ExpressionWrapper(F('frecuency') - F('hours_period'), output_field=DecimalField()),
+            output_field=DecimalField(),
+        )
+        hours_days = Cast(Trunc(Coalesce(hours_left / NullIf(F('equipo__prom_hours'), 0), hours_left)), IntegerField())
+
+        days_remaining = Func(F('due_date'), Value(today), arg_joiner=' - ', template='(%(expressions)s)', output_field=IntegerField())
+        # Frecuencia en cero: porcentaje NULL en vez de "division by zero"
+        days_pct = Cast(days_remaining, FloatField()) / Cast(NullIf(F('frecuency'), 0), FloatField()) * 100
+        hours_pct = ExpressionWrapper(
+            (F('frecuency') - F('hours_period')) / NullIf(F('frecuency'), 0) * 100, output_field=DecimalField()
+            )
+
+        return self.annotate(
+            hours_period=Coalesce(Subquery(hours_period), Value(0), output_field=DecimalField()),
+        ).annotate(
+            due_date=Case(
+                When(control='d', then=ExpressionWrapper(F('intervention_date') + F('frecuency'), output_field=DateField())),
+                When(control='h', then=ExpressionWrapper(Value(today) + hours_days, output_field=DateField())),
+                When(control='k', then=ExpressionWrapper(Value(today) + F('frecuency'), output_field=DateField())),
+                output_field=DateField(),
+            ),
+        ).annotate(
+            days_left=Case(
+                When(control='d', then=days_remaining),
+                default=Cast(Trunc(F('frecuency') - F('hours_period')), IntegerField()),
+                output_field=IntegerField(),
+            ),
+            remaining_pct=Case(
+                When(control='d', then=Cast(Trunc(days_pct, output_field=FloatField()), IntegerField())),
+                default=Cast(Trunc(hours_pct), IntegerField()),
+                output_field=IntegerField(),
+            ),
+        ).annotate(
+            schedule_status=Case(
+                When(ot__isnull=True, then=Value('e')),
+                # Igual que compute_schedule_fields ante ZeroDivisionError
+                When(remaining_pct__isnull=True, then=Value('v')),
+                When(ot__state='x', then=Value('p')),
+                When(remaining_pct__gte=25, remaining_pct__lte=100, then=Value('c')),
+                When(remaining_pct__gte=5, remaining_pct__lte=24, then=Value('p')),
+                default=Value('v'),
+                output_field=CharField(),
+            ),
+        )
+
+
 class Ruta(models.Model):
 
     CONTROL = (
@@ -304,6 +428,13 @@ class Ruta(models.Model):
         ('k', 'Kilómetros')
     )
 
+    STATUS = (
+        ('c', 'Completado'),
+        ('p', 'Planeado'),
+        ('e', 'Sin información'),
+        ('v', 'Retrasado'),
+    )
+
     code = models.AutoField(primary_key=True)
     name = models.CharField(max_length=50)
     control = models.CharField(choices=CONTROL, max_length=1)
@@ -316,6 +447,29 @@ class Ruta(models.Model):
     dependencia = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='dependiente')
     astillero = models.CharField(max_length=50, null=True, blank=True)
 
+    # Estado de programación persistido; lo mantiene scheduling.refresh_schedule
+    next_due_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
+    hours_since_intervention = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    status = models.CharField(choices=STATUS, max_length=1, default='e', editable=False, db_index=True)
+
+    # Fecha proyectada por forecast.forecast_usage para rutinas por horas (se recalcula con refresh_schedule)
+    forecast_date = models.DateField(null=True, blank=True, editable=False)
+
+    objects = RutaQuerySet.as_manager()
+
+    def get_today(self):
+        # Fecha de referencia de la programación; scheduling.load_schedule la fija (schedule_today)
+        # para calcular a otra fecha, como en el barrido diario
+        return getattr(self, 'schedule_today', None) or date.today()
+
+    def get_hours_period(self):
+        # Horas reportadas desde la última intervención; scheduling.load_schedule las precarga por lote
+        if not hasattr(self, 'hours_period'):
+            self.hours_period = self.equipo.hours.filter(
+                report_date__gte=self.intervention_date,
+                report_date__lte=self.get_today()
+            ).aggregate(total_hours=Sum('hour'))['total_hours'] or 0
+        return self.hours_period
 
     @property
     def next_date(self):
@@ -327,39 +481,36 @@ class Ruta(models.Model):
             inv = self.frecuency - self.equipo.horometro
             try:
                 ndays = int(inv/self.equipo.prom_hours)
-            except (ZeroDivisionError, AttributeError):
+            except (ZeroDivisionError, InvalidOperation, AttributeError):
                 ndays = int(inv/1)
         
         elif self.control == 'h':
-            period = self.equipo.hours.filter(report_date__gte=self.intervention_date, report_date__lte=date.today()).aggregate(total_hours=Sum('hour'))['total_hours'] or 0
+            period = self.get_hours_period()
             inv = self.frecuency - period
             try:
                 ndays = int(inv/self.equipo.prom_hours)
-            except (ZeroDivisionError, AttributeError):
+            except (ZeroDivisionError, InvalidOperation, AttributeError):
                 ndays = int(inv/1)
 
         if self.control == 'k':
             ndays = self.frecuency
         
-        return date.today() + timedelta(days=ndays)
+        return self.get_today() + timedelta(days=ndays)
 
     @property
     def daysleft(self):
         if self.control == 'd':
-            return (self.next_date - date.today()).days
+            return (self.next_date - self.get_today()).days
         else:
-            return int(self.frecuency - (self.equipo.hours.filter(report_date__gte=self.intervention_date, report_date__lte=date.today()).aggregate(total_hours=Sum('hour'))['total_hours'] or 0))
+            return int(self.frecuency - self.get_hours_period())
 
     @property
     def percentage_remaining(self):
-        days_remaining = (self.next_date - date.today()).days
+        days_remaining = (self.next_date - self.get_today()).days
         if self.control == 'd':
             percent = int((days_remaining / self.frecuency) * 100)
         else:
-            hours_period = self.equipo.hours.filter(
-                    report_date__gte=self.intervention_date,
-                    report_date__lte=date.today()
-                ).aggregate(total_hours=Sum('hour'))['total_hours'] or 0
+            hours_period = self.get_hours_period()
             inv = self.frecuency - hours_period
             percent = int((inv / self.frecuency) * 100)
         return percent
@@ -653,4 +804,136 @@ class Document(models.Model):
     asset = models.ForeignKey(Asset, related_name='documents', on_delete=models.CASCADE, null=True, blank=True)
     tasks = models.ForeignKey(Task, related_name='documents', on_delete=models.CASCADE, null=True, blank=True)
     file = models.FileField(upload_to=get_upload_pdfs)
-    description = models.CharField(max_length=200)
\ No newline at end of file
+    description = models.CharField(max_length=200)
+
+
+class RequestMetric(models.Model):
+
+    url_name = models.CharField(max_length=100, db_index=True)
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    status = models.IntegerField()
+    queries = models.IntegerField(default=0)
+    duplicate_queries = models.IntegerField(default=0)
+    db_time = models.FloatField(default=0)
+    template_time = models.FloatField(default=0)
+    total_time = models.FloatField(default=0)
+    response_size = models.IntegerField(null=True, blank=True)
+    duplicates = models.JSONField(default=list, blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.url_name} {self.status}: {self.queries} consultas, {self.total_time:.0f} ms'
+
+    class Meta:
+        ordering = ['-created']
+
+
+class PdfJob(models.Model):
+
+    STATE = (
+        ('p', 'Pendiente'),
+        ('r', 'Generando'),
+        ('f', 'Listo'),
+        ('e', 'Error'),
+    )
+
+    ENGINE = (
+        ('html', 'HTML (xhtml2pdf)'),
+        ('reportlab', 'ReportLab'),
+    )
+
+    # Hash del contenido (HTML o datos) y de los adjuntos: el mismo contenido reutiliza el mismo PDF
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10)
+    # Reporte y objeto (p. ej. "ot:12") y huella sin renderizar; las señales marcan stale al cambiar
+    subject = models.CharField(max_length=100, blank=True, db_index=True)
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    stale = models.BooleanField(default=False)
+    filename = models.CharField(max_length=150)
+    engine = models.CharField(max_length=10, choices=ENGINE, default='html')
+    html = models.TextField(blank=True)
+    # Datos del reporte para el motor reportlab (en html van en el HTML)
+    payload = models.JSONField(null=True, blank=True)
+    # PDFs que se anexan al final (html) o imágenes del reporte (reportlab)
+    attachments = models.JSONField(default=list, blank=True)
+    state = models.CharField(max_length=1, choices=STATE, default='p', db_index=True)
+    file = models.FileField(upload_to=get_generated_pdf_path, null=True, blank=True)
+    size = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.get_state_display()})'
+
+    class Meta:
+        ordering = ['created']
+
+
+class OutboundEmail(models.Model):
+
+    STATE = (
+        ('p', 'Pendiente'),
+        ('r', 'Enviando'),
+        ('s', 'Enviado'),
+        ('e', 'Error'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list, blank=True)
+    # Adjuntos por referencia, se leen al enviar: {'filename', 'mimetype', y 'name' (archivo
+    # del almacenamiento) o 'pdf' (argumentos de pdfs.request_pdf, p. ej. ['ot', 12])}
+    attachments = models.JSONField(default=list, blank=True)
+    # Base de los enlaces de descarga de los adjuntos que no caben en el correo
+    site_url = models.CharField(max_length=200, blank=True)
+    # El servidor rechazó el correo por tamaño: se reenvía con todos los adjuntos como enlaces
+    links_only = models.BooleanField(default=False)
+    state = models.CharField(max_length=1, choices=STATE, default='p', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} ({self.get_state_display()})'
+
+    class Meta:
+        ordering = ['created']
+
+
+class Notification(models.Model):
+
+    FREQUENCY = (
+        ('i', 'Inmediata'),
+        ('h', 'Cada hora'),
+        ('d', 'Diaria'),
+    )
+
+    # Un evento (solicitud, reporte de falla) para un destinatario; sale en su próximo resumen
+    recipient = models.EmailField(db_index=True)
+    kind = models.CharField(max_length=20)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    attachments = models.JSONField(default=list, blank=True)
+    site_url = models.CharField(max_length=200, blank=True)
+    frequency = models.CharField(max_length=1, choices=FREQUENCY)
+    due = models.DateTimeField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+    # Resumen (correo de la cola) en que salió; null mientras está pendiente
+    queued = models.DateTimeField(null=True, blank=True, db_index=True)
+    email = models.ForeignKey(OutboundEmail, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+
+    def __str__(self):
+        return f'{self.subject} -> {self.recipient}'
+
+    class Meta:
+        ordering = ['created']
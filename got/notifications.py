@@ -0,0 +1,111 @@
+'''
+Notificaciones agrupadas: cada evento (solicitud de suministros, reporte de falla) se
+guarda por destinatario con la frecuencia de su tipo (GOT_NOTIFICATIONS) y sale en un
+solo correo de resumen por destinatario, armado con una plantilla, por la cola de outbox.
+Los eventos inmediatos (fallas críticas) se encolan en el acto y arrastran los demás
+pendientes de ese destinatario.
+'''
+from collections import Counter
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notification
+from .outbox import queue_email
+
+
+# Tipo de evento -> frecuencia del resumen ('i' inmediata, 'h' cada hora, 'd' diaria).
+# Inmediata por defecto: 'h' y 'd' dependen de que email_worker esté corriendo
+FREQUENCIES = {
+    'solicitud': 'i',
+    'falla': 'i',
+    'falla_critica': 'i',
+}
+# Hora local del resumen diario
+DIGEST_HOUR = 7
+
+KIND_LABELS = {
+    'solicitud': 'solicitudes de suministros',
+    'falla': 'reportes de falla',
+    'falla_critica': 'fallas críticas',
+}
+
+
+def frequency(kind):
+    return {**FREQUENCIES, **getattr(settings, 'GOT_NOTIFICATIONS', {})}.get(kind, 'i')
+
+
+def next_due(frequency, now=None):
+    '''Momento en que sale el resumen: ya, la próxima hora en punto o la próxima DIGEST_HOUR.'''
+    now = now or timezone.now()
+    if frequency == 'i':
+        return now
+    local = timezone.localtime(now)
+    if frequency == 'h':
+        return (local + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+    hour = getattr(settings, 'GOT_DIGEST_HOUR', DIGEST_HOUR)
+    due = local.replace(hour=hour, minute=0, second=0, microsecond=0)
+    return due if due > local else due + timedelta(days=1)
+
+
+def notify(kind, recipients, subject, body, attachments=(), site_url=''):
+    '''
+    Registra un evento para cada destinatario (el cuerpo se arma una sola vez por quien
+    llama). Los de frecuencia inmediata se encolan en esta misma transacción.
+    '''
+    recipients = sorted({recipient for recipient in recipients if recipient})
+    if not recipients:
+        return []
+    now = timezone.now()
+    every = frequency(kind)
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            recipient=recipient, kind=kind, subject=subject, body=body, attachments=list(attachments),
+            site_url=site_url, frequency=every, due=next_due(every, now),
+        )
+        for recipient in recipients
+    ])
+    if every == 'i':
+        queue_digests(now, recipients=recipients)
+    return notifications
+
+
+def digest_subject(notifications):
+    if len(notifications) == 1:
+        return notifications[0].subject
+    counts = Counter(notification.kind for notification in notifications)
+    return 'Resumen GOT: ' + ', '.join(f'{count} {KIND_LABELS.get(kind, kind)}' for kind, count in counts.items())
+
+
+def queue_digests(now=None, recipients=None):
+    '''
+    Encola un resumen por cada destinatario con algún evento vencido, con todos sus eventos
+    pendientes (también los que aún no vencían). SKIP LOCKED permite varios workers.
+    Retorna cuántos correos encoló.
+    '''
+    now = now or timezone.now()
+    queued = 0
+    with transaction.atomic():
+        pending = Notification.objects.select_for_update(skip_locked=True).filter(queued__isnull=True)
+        if recipients is not None:
+            pending = pending.filter(recipient__in=recipients)
+        due = set(pending.filter(due__lte=now).values_list('recipient', flat=True))
+        if not due:
+            return queued
+
+        batch = pending.filter(recipient__in=due).order_by('recipient', 'created')
+        for recipient, group in groupby(batch, key=lambda notification: notification.recipient):
+            group = list(group)
+            body = render_to_string('got/notification_digest.txt', {'notifications': group})
+            email = queue_email(
+                digest_subject(group), body, [recipient],
+                attachments=[attachment for notification in group for attachment in notification.attachments],
+                site_url=next((notification.site_url for notification in group if notification.site_url), ''),
+            )
+            Notification.objects.filter(pk__in=[notification.pk for notification in group]).update(queued=now, email=email)
+            queued += 1
+    return queued
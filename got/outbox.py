@@ -0,0 +1,312 @@
+'''
+Cola persistente de correos salientes. Las vistas y señales encolan con queue_email dentro
+de su transacción (si la acción se revierte, el correo no sale) y el worker
+(manage.py email_worker) los envía por lotes, una conexión SMTP por lote, con reintentos
+y espera exponencial. Los adjuntos se guardan por referencia y se leen al enviar; los que
+no caben en el correo van como enlaces firmados que vencen (ver build_message).
+'''
+import logging
+import os
+import smtplib
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.defaultfilters import filesizeformat
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage, ImageOps
+
+from .models import OutboundEmail
+from .pdfs import fetch_attachment, open_pdf, ready_pdf
+
+
+logger = logging.getLogger(__name__)
+
+# Correos por conexión SMTP
+BATCH_SIZE = 20
+# Espera antes del reintento n: BACKOFF_BASE * 2^(n-1), hasta BACKOFF_MAX
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=2)
+MAX_ATTEMPTS = 8
+# Un correo en 'Enviando' por más de esto quedó huérfano (worker caído) y se reintenta
+SEND_TIMEOUT = timedelta(minutes=10)
+# Tope por defecto de los adjuntos de un correo, ya en base64 (GOT_EMAIL_MAX_BYTES).
+# Gmail rechaza mensajes de más de 25 MB; lo que no cabe va como enlace
+MAX_BYTES = 10 * 1024 * 1024
+# Imágenes adjuntas: lado mayor y calidad JPEG con que se recomprimen
+IMAGE_MAX_SIDE = 1600
+IMAGE_QUALITY = 80
+# Vigencia de los enlaces de descarga de adjuntos
+LINK_MAX_AGE = timedelta(days=7)
+LINK_SALT = 'got.outbox.attachment'
+
+
+def storage_attachment(filename, name, mimetype=None):
+    '''Adjunto que se lee del almacenamiento (local o S3) al enviar.'''
+    return {'filename': filename, 'name': name, 'mimetype': mimetype}
+
+
+def pdf_attachment(filename, kind, *args):
+    '''Adjunto con el PDF de un reporte (pdfs.request_pdf), generado o tomado de la caché al enviar.'''
+    return {'filename': filename, 'pdf': [kind, *args], 'mimetype': 'application/pdf'}
+
+
+def queue_email(subject, body, to, from_email=None, reply_to=(), attachments=(), site_url=''):
+    '''
+    Encola un correo y lo retorna. site_url (p. ej. request.build_absolute_uri('/')) arma los
+    enlaces de los adjuntos grandes; sin él se usa GOT_SITE_URL. Sin GOT_EMAIL_ASYNC se
+    envía en este proceso al confirmarse la transacción; si falla, queda para el worker.
+    '''
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        to=list(to),
+        reply_to=list(reply_to),
+        attachments=list(attachments),
+        site_url=site_url,
+    )
+    if not getattr(settings, 'GOT_EMAIL_ASYNC', False):
+        transaction.on_commit(lambda: send_pending(pks=[email.pk]))
+    return email
+
+
+def read_file(name):
+    content = fetch_attachment(name)
+    if content is None:
+        return None
+    with content:
+        return content.read()
+
+
+def compress_image(content, filename, mimetype):
+    '''
+    Foto reducida a IMAGE_MAX_SIDE y recomprimida en JPEG (decodificada a escala con draft).
+    Retorna (contenido, nombre, tipo); el original si no es una imagen o no se reduce.
+    '''
+    try:
+        with PILImage.open(BytesIO(content)) as picture:
+            landscape = picture.width >= picture.height
+            picture.draft('RGB', (IMAGE_MAX_SIDE, 1) if landscape else (1, IMAGE_MAX_SIDE))
+            picture.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+            reduced = ImageOps.exif_transpose(picture).convert('RGB')
+        buffer = BytesIO()
+        reduced.save(buffer, 'JPEG', quality=IMAGE_QUALITY, optimize=True)
+    except Exception:
+        logger.warning('No se pudo recomprimir la imagen %s', filename, exc_info=True)
+        return content, filename, mimetype
+    if buffer.tell() >= len(content):
+        return content, filename, mimetype
+    return buffer.getvalue(), f'{os.path.splitext(filename)[0]}.jpg', 'image/jpeg'
+
+
+def measure_attachment(attachment):
+    '''
+    Mide un adjunto antes de armar el correo. Retorna (nombre, tipo, tamaño, función que da
+    el contenido), o None si el archivo ya no existe (se envía sin él). Los PDF y archivos
+    se miden sin descargarlos; las imágenes se descargan y se recomprimen.
+    '''
+    filename, mimetype = attachment['filename'], attachment.get('mimetype')
+    if 'pdf' in attachment:
+        job = ready_pdf(*attachment['pdf'])
+
+        def load():
+            with open_pdf(job) as f:
+                return f.read()
+        return filename, mimetype, job.size, load
+
+    name = attachment['name']
+    if mimetype and mimetype.startswith('image/'):
+        content = read_file(name)
+        if content is None:
+            return None
+        content, filename, mimetype = compress_image(content, filename, mimetype)
+        return filename, mimetype, len(content), lambda: content
+
+    try:
+        size = default_storage.size(name)
+    except Exception:
+        logger.warning('No se pudo leer el adjunto %s', name, exc_info=True)
+        return None
+    return filename, mimetype, size, lambda: read_file(name)
+
+
+def encoded_size(size):
+    '''Tamaño de un adjunto dentro del mensaje: base64 ocupa 4 bytes por cada 3.'''
+    return (size + 2) // 3 * 4
+
+
+def attachment_token(attachment):
+    return signing.dumps(attachment, salt=LINK_SALT, compress=True)
+
+
+def attachment_link(site_url, attachment):
+    return urljoin(site_url, reverse('got:email-attachment', args=[attachment_token(attachment)]))
+
+
+def load_attachment_link(token):
+    '''Adjunto de un enlace firmado; signing.SignatureExpired o BadSignature si no es válido.'''
+    return signing.loads(token, salt=LINK_SALT, max_age=LINK_MAX_AGE)
+
+
+def links_text(email, linked):
+    site_url = email.site_url or getattr(settings, 'GOT_SITE_URL', '')
+    expires = timezone.localtime() + LINK_MAX_AGE
+    lines = ['', '', f'Archivos demasiado grandes para adjuntar (enlaces válidos hasta el {expires:%d/%m/%Y}):']
+    for attachment, filename, size in linked:
+        where = attachment_link(site_url, attachment) if site_url else 'disponible en la plataforma'
+        lines.append(f'- {filename} ({filesizeformat(size)}): {where}')
+    return '\n'.join(lines)
+
+
+def build_message(email, connection):
+    '''
+    Arma el correo sin pasar del tope de tamaño (GOT_EMAIL_MAX_BYTES): mide los adjuntos,
+    recomprime las imágenes y adjunta de menor a mayor mientras quepan; los demás se
+    reemplazan por enlaces de descarga firmados que vencen a los LINK_MAX_AGE.
+    '''
+    measured = []
+    for attachment in email.attachments:
+        result = measure_attachment(attachment)
+        if result is not None:
+            measured.append((attachment, *result))
+
+    budget = 0 if email.links_only else getattr(settings, 'GOT_EMAIL_MAX_BYTES', MAX_BYTES)
+    attached = set()
+    for index, (_, _, _, size, _) in sorted(enumerate(measured), key=lambda item: item[1][3]):
+        if encoded_size(size) > budget:
+            break
+        budget -= encoded_size(size)
+        attached.add(index)
+
+    linked = [(attachment, filename, size) for index, (attachment, filename, _, size, _) in enumerate(measured) if index not in attached]
+    body = email.body + links_text(email, linked) if linked else email.body
+    message = EmailMessage(
+        email.subject, body, email.from_email, email.to,
+        reply_to=email.reply_to, connection=connection,
+    )
+    for index, (_, filename, mimetype, _, load) in enumerate(measured):
+        if index in attached:
+            content = load()
+            if content is not None:
+                message.attach(filename, content, mimetype)
+    return message
+
+
+def is_permanent(error):
+    '''Rechazos definitivos del servidor (5xx: tamaño, destinatario inválido): reintentar no sirve.'''
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def too_large(error):
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code == 552
+
+
+def connection_lost(error):
+    return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError))
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def mark_failed(email, error):
+    email.attempts += 1
+    email.error = f'{type(error).__name__}: {error}'
+    if too_large(error) and email.attachments and not email.links_only:
+        # El servidor tiene un tope menor que GOT_EMAIL_MAX_BYTES: se reenvía con solo enlaces
+        email.links_only, email.state, email.next_attempt = True, 'p', timezone.now()
+        logger.warning('"%s" excede el tamaño del servidor; se reintenta con enlaces', email.subject)
+        email.save(update_fields=['attempts', 'error', 'links_only', 'state', 'next_attempt'])
+        return
+    if is_permanent(error) or email.attempts >= MAX_ATTEMPTS:
+        email.state = 'e'
+        logger.error('No se pudo enviar "%s" a %s: %s', email.subject, email.to, email.error)
+    else:
+        email.state = 'p'
+        email.next_attempt = timezone.now() + backoff(email.attempts)
+        logger.warning('Falló el envío de "%s" (intento %s): %s', email.subject, email.attempts, email.error)
+    email.save(update_fields=['attempts', 'error', 'state', 'next_attempt'])
+
+
+def mark_sent(email):
+    email.state, email.sent, email.error = 's', timezone.now(), ''
+    email.attempts += 1
+    email.save(update_fields=['state', 'sent', 'error', 'attempts'])
+
+
+def claim_batch(size=BATCH_SIZE, pks=None):
+    '''
+    Toma hasta size correos listos para enviar (pendientes cuyo turno llegó, o huérfanos)
+    y los marca en 'Enviando'. SKIP LOCKED permite varios workers sobre la misma tabla.
+    '''
+    now = timezone.now()
+    with transaction.atomic():
+        pending = OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+            Q(state='p', next_attempt__lte=now) | Q(state='r', started__lt=now - SEND_TIMEOUT)
+        )
+        if pks is not None:
+            pending = pending.filter(pk__in=pks)
+        batch = list(pending.order_by('next_attempt', 'created')[:size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(state='r', started=now)
+    for email in batch:
+        email.state, email.started = 'r', now
+    return batch
+
+
+def send_batch(batch):
+    '''
+    Envía un lote por una sola conexión. Cada correo registra su propio resultado; si la
+    conexión se cae se abre otra para el resto. Retorna cuántos se enviaron.
+    '''
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            mark_failed(email, e)
+        return 0
+
+    sent = 0
+    try:
+        for email in batch:
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                mark_failed(email, e)
+                if connection_lost(e):
+                    connection.close()
+                    connection.open()
+            else:
+                mark_sent(email)
+                sent += 1
+    except Exception as e:
+        # No se pudo reabrir la conexión: el resto del lote espera su reintento
+        for email in batch:
+            if email.state == 'r':
+                mark_failed(email, e)
+    finally:
+        connection.close()
+    return sent
+
+
+def send_pending(limit=None, pks=None):
+    '''Envía los correos listos, lote por lote, hasta vaciar la cola (o hasta limit). Retorna cuántos envió.'''
+    sent = processed = 0
+    while limit is None or processed < limit:
+        size = BATCH_SIZE if limit is None else min(BATCH_SIZE, limit - processed)
+        batch = claim_batch(size, pks)
+        if not batch:
+            break
+        sent += send_batch(batch)
+        processed += len(batch)
+    return sent
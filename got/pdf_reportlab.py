@@ -0,0 +1,378 @@
+'''
+Reportes PDF armados directamente con flowables de ReportLab, como download_pdf, sin
+pasar por el HTML y el CSS de xhtml2pdf. Cada reporte tiene dos partes: *_payload lee
+la base de datos y deja los datos en un dict serializable (lo que se guarda en el
+PdfJob y se hashea), y render_* arma el PDF a partir de ese dict, sin consultas.
+'''
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from io import BytesIO
+
+from django.contrib.staticfiles import finders
+from django.shortcuts import get_object_or_404
+from django.utils.formats import date_format
+from django.utils.html import escape
+from PIL import Image as PILImage, ImageOps
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import Asset, FailureReport, Ot, Ruta
+from .scheduling import load_schedule
+
+
+logger = logging.getLogger(__name__)
+
+HEADER_CODE = 'CODIGO: FR-SP-MT-97'
+HEADER_VERSION = 'VERSION 004'
+HEADER_UPDATED = 'FECHA DE ACTUALIZACION: 27/01/2023'
+IMAGE_WIDTH = 4.2 * inch
+# Las fotos se reducen a la resolución con que se imprimen antes de embeberlas
+IMAGE_DPI = 150
+IMAGE_QUALITY = 80
+ORIENTATION = 0x0112
+LOGO = 'got/Logo.png'
+LOGO_WIDTH = 1.6 * inch
+
+BLUE = colors.Color(84 / 255, 141 / 255, 212 / 255)
+YELLOW = colors.Color(1, 1, 0)
+
+
+def full_name(user):
+    return f'{user.first_name} {user.last_name}' if user else ''
+
+
+def short_date(value):
+    return value.strftime('%d/%m/%Y') if value else ''
+
+
+def ot_payload(num_ot):
+    '''
+    Datos del reporte de OT (lo mismo que muestra pdf_template.html).
+    Retorna (payload, nombre del archivo, imágenes de las actividades).
+    '''
+    ot = get_object_or_404(Ot.objects.select_related('system__asset', 'super'), num_ot=num_ot)
+    failure = FailureReport.objects.select_related('reporter', 'equipo').filter(related_ot=ot).first()
+    tasks = ot.task_set.select_related('responsible').prefetch_related('images')
+
+    payload = {
+        'num_ot': ot.num_ot,
+        'creation_date': date_format(ot.creation_date),
+        'state': ot.get_state_display(),
+        'supervisor': full_name(ot.super),
+        'area': ot.system.asset.get_area_display(),
+        'asset': str(ot.system.asset),
+        'system': ot.system.name,
+        'description': ot.description,
+        'failure': None,
+        'tasks': [],
+    }
+    if failure:
+        impact = dict(FailureReport.IMPACT)
+        payload['failure'] = {
+            'id': failure.id,
+            'moment': date_format(failure.moment, 'DATETIME_FORMAT'),
+            'reporter': full_name(failure.reporter),
+            'equipo': str(failure.equipo),
+            'description': failure.description,
+            'causas': failure.causas,
+            'suggest_repair': failure.suggest_repair or '',
+            'impact': ' - '.join(impact[code] for code in failure.impact if code in impact),
+        }
+    for task in tasks:
+        payload['tasks'].append({
+            'description': task.description,
+            'responsible': full_name(task.responsible),
+            'start_date': short_date(task.start_date),
+            'final_date': short_date(task.final_date) if task.start_date else '',
+            'men_time': task.men_time,
+            'news': task.news or '',
+            'procedimiento': task.procedimiento or '',
+            'hse': task.hse or '',
+            'images': [image.image.name for image in task.images.all() if image.image],
+        })
+    images = [name for task in payload['tasks'] for name in task['images']]
+    return payload, f'orden_de_trabajo_{num_ot}.pdf', images
+
+
+def asset_payload(asset_id):
+    '''Datos del informe de activo (lo mismo que asset_pdf_template.html). Retorna (payload, nombre del archivo, []).'''
+    asset = get_object_or_404(Asset, pk=asset_id)
+    rutas = load_schedule(Ruta.objects.filter(system__asset=asset).select_related('system').prefetch_related('task_set'))
+
+    systems = {system.pk: {'name': system.name, 'rutas': []} for system in asset.system_set.all()}
+    for ruta in rutas:
+        systems[ruta.system_id]['rutas'].append({
+            'name': ruta.name,
+            'frecuency': ruta.frecuency,
+            'control': ruta.get_control_display(),
+            'intervention_date': date_format(ruta.intervention_date),
+            'next_date': date_format(ruta.next_date) if ruta.next_date else '',
+            'ot_num': ruta.ot_id or 'N/A',
+            'tasks': [
+                {'description': task.description, 'hse': task.hse or '', 'procedimiento': task.procedimiento or ''}
+                for task in ruta.task_set.all()
+            ],
+        })
+    payload = {'name': asset.name, 'systems': list(systems.values())}
+    return payload, f'Asset_{asset.pk}.pdf', []
+
+
+def text(value):
+    '''Texto de usuario para un Paragraph: escapado y con los saltos de línea conservados.'''
+    return escape(str(value)).replace('\n', '<br/>')
+
+
+def styles():
+    sheet = getSampleStyleSheet()
+    body = sheet['BodyText']
+    body.fontSize = 8
+    body.leading = 10
+    title = sheet['Heading1']
+    title.fontSize = 14
+    title.alignment = 1
+    center = sheet['Heading4']
+    center.fontSize = 8
+    center.alignment = 1
+    return body, title, center, sheet['Heading2']
+
+
+@lru_cache(maxsize=1)
+def logo_data():
+    '''
+    Logo desde los estáticos del proyecto (sin descargarlo de S3), reducido una vez por
+    proceso al tamaño que ocupa en el PDF. Retorna (bytes PNG, ancho, alto) o None.
+    '''
+    path = finders.find(LOGO)
+    if not path:
+        return None
+    with PILImage.open(path) as image:
+        image.thumbnail((int(LOGO_WIDTH / inch * IMAGE_DPI), image.height))
+        buffer = BytesIO()
+        image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), image.width, image.height
+
+
+def logo():
+    data = logo_data()
+    if data is None:
+        return None
+    content, width, height = data
+    return Image(BytesIO(content), width=LOGO_WIDTH, height=LOGO_WIDTH * height / width)
+
+
+def header(title_text, width, body, title, center):
+    '''Encabezado del formato: logo, título y código, versión y fecha de actualización.'''
+    inner_width = width - LOGO_WIDTH - 12
+    inner = Table(
+        [
+            [Paragraph(title_text, title), '', ''],
+            [Paragraph(HEADER_CODE, center), Paragraph(HEADER_VERSION, center), Paragraph(HEADER_UPDATED, center)],
+        ],
+        colWidths=[inner_width / 3] * 3,
+    )
+    inner.setStyle(TableStyle([
+        ('SPAN', (0, 0), (-1, 0)),
+        ('LINEABOVE', (0, 1), (-1, 1), 1, colors.black),
+        ('LINEAFTER', (0, 1), (1, 1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    outer = Table([[logo() or '', inner]], colWidths=[LOGO_WIDTH + 12, inner_width])
+    outer.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1, colors.black),
+        ('LINEAFTER', (0, 0), (0, 0), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (1, 0), (1, 0), 0),
+        ('RIGHTPADDING', (1, 0), (1, 0), 0),
+    ]))
+    return outer
+
+
+def reduce_image(name, source):
+    '''
+    Foto reducida a la resolución con que se imprime (IMAGE_DPI a IMAGE_WIDTH) y recomprimida
+    en JPEG: una foto de celular se decodifica a escala (draft) y pesa en el PDF lo que se ve.
+    Retorna (bytes, ancho, alto), o None si el archivo no es una imagen legible.
+    '''
+    target = int(IMAGE_WIDTH / inch * IMAGE_DPI)
+    try:
+        with PILImage.open(source) as picture:
+            # Con rotación EXIF de 90° el ancho impreso es el alto del archivo
+            rotated = picture.getexif().get(ORIENTATION) in (5, 6, 7, 8)
+            bounds = (target * 4, target) if rotated else (target, target * 4)
+            picture.draft('RGB', (1, bounds[1]) if rotated else (bounds[0], 1))
+            picture.thumbnail(bounds, PILImage.Resampling.BILINEAR)
+            reduced = ImageOps.exif_transpose(picture).convert('RGB')
+        buffer = BytesIO()
+        reduced.save(buffer, 'JPEG', quality=IMAGE_QUALITY)
+    except Exception:
+        logger.warning('No se pudo leer la imagen %s', name, exc_info=True)
+        return None
+    return buffer.getvalue(), reduced.width, reduced.height
+
+
+# Builds de este módulo en curso (en cualquier hilo) y valor de useA85 que había antes del primero
+_binary_lock = threading.Lock()
+_binary_builds = 0
+_saved_a85 = None
+
+
+@contextmanager
+def binary_streams():
+    '''
+    Imágenes y contenido en binario durante el build: la codificación ASCII85 por defecto se
+    hace en Python y era la mitad del tiempo de un reporte con fotos. rl_config es global de
+    ReportLab, así que se cambia solo mientras hay builds de este módulo en curso y luego se
+    restaura; los demás PDFs (p. ej. download_pdf) conservan la configuración de siempre.
+    '''
+    global _binary_builds, _saved_a85
+    with _binary_lock:
+        if _binary_builds == 0:
+            _saved_a85 = rl_config.useA85
+            rl_config.useA85 = 0
+        _binary_builds += 1
+    try:
+        yield
+    finally:
+        with _binary_lock:
+            _binary_builds -= 1
+            if _binary_builds == 0:
+                rl_config.useA85 = _saved_a85
+
+
+def image_flowable(data):
+    content, width, height = data
+    return Image(BytesIO(content), width=IMAGE_WIDTH, height=IMAGE_WIDTH * height / width)
+
+
+def render_ot(payload, dest, images=None):
+    '''
+    Escribe en dest el reporte de OT. images: {nombre en el almacenamiento: resultado de
+    reduce_image}; las imágenes que falten se omiten.
+    '''
+    images = images or {}
+    body, title, center, _ = styles()
+    doc = SimpleDocTemplate(dest, pagesize=letter, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
+    width = doc.width
+    bold = lambda label: Paragraph(f'<b>{label}</b>', body)
+
+    elements = [header(f'REPORTE ORDEN DE TRABAJO #{payload["num_ot"]}', width, body, title, center), Spacer(1, 12)]
+
+    info = Table([
+        [bold('FECHA:'), Paragraph(text(payload['creation_date']), body), bold('ESTADO:'), Paragraph(text(payload['state']), body)],
+        [bold('SUPERVISOR:'), Paragraph(text(payload['supervisor']), body), bold('AREA:'), Paragraph(text(payload['area']), body)],
+        [bold('EQUIPO:'), Paragraph(text(payload['asset']), body), bold('SISTEMA:'), Paragraph(text(payload['system']), body)],
+        [bold('DESCRIPCIÓN:'), Paragraph(text(payload['description']), body), '', ''],
+    ], colWidths=[0.14 * width, 0.36 * width, 0.14 * width, 0.36 * width])
+    info.setStyle(TableStyle([('SPAN', (1, 3), (3, 3)), ('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+    elements += [info, Spacer(1, 10)]
+
+    failure = payload['failure']
+    if failure:
+        rows = [
+            [bold(f'REPORTE DE FALLA #{failure["id"]} - {failure["moment"]}'), ''],
+            [bold('Reportado por:'), Paragraph(text(failure['reporter']), body)],
+            [bold('Equipo afectado:'), Paragraph(text(failure['equipo']), body)],
+            [bold('Detalle:'), Paragraph(text(failure['description']), body)],
+            [bold('Posibles causas:'), Paragraph(text(failure['causas']), body)],
+            [bold('Reparación sugerida:'), Paragraph(text(failure['suggest_repair']), body)],
+            [bold('Impacto de falla:'), Paragraph(text(failure['impact']), body)],
+        ]
+        table = Table(rows, colWidths=[0.2 * width, 0.8 * width])
+        table.setStyle(TableStyle([('SPAN', (0, 0), (-1, 0)), ('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+        elements += [table, Spacer(1, 10)]
+
+    # Actividades: una fila por actividad y filas a todo el ancho para novedades, procedimiento, fotos y HSE
+    rows = [
+        [Paragraph('<b>ACTIVIDADES REALIZADAS</b>', center), '', '', '', '', ''],
+        [bold(label) for label in ('#', 'Actividades', 'Responsable', 'Fecha inicio', 'Fecha Finalización', 'Tiempo total(D)')],
+    ]
+    style = [
+        ('SPAN', (0, 0), (-1, 0)),
+        ('BACKGROUND', (0, 0), (-1, 0), BLUE),
+        ('BACKGROUND', (0, 1), (-1, 1), YELLOW),
+        ('BOX', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]
+    for number, task in enumerate(payload['tasks'], start=1):
+        rows.append([
+            str(number), Paragraph(text(task['description']), body), Paragraph(text(task['responsible']), body),
+            task['start_date'], task['final_date'], str(task['men_time']),
+        ])
+        style.append(('LINEBELOW', (0, len(rows) - 1), (-1, len(rows) - 1), 0.5, colors.black))
+        extras = []
+        if task['news']:
+            extras.append(Paragraph(text(task['news']), body))
+        if task['procedimiento']:
+            extras.append(Paragraph(f'<b>Procedimiento:</b><br/>{text(task["procedimiento"])}', body))
+        extras += [image_flowable(images[name]) for name in task['images'] if images.get(name)]
+        if task['hse']:
+            extras.append(Paragraph(f'<b>Precauciones de seguridad:</b> {text(task["hse"])}', body))
+        for extra in extras:
+            rows.append(['', extra, '', '', '', ''])
+            row = len(rows) - 1
+            style += [('SPAN', (1, row), (-1, row)), ('LINEBELOW', (0, row), (-1, row), 0.5, colors.black)]
+            if isinstance(extra, Image):
+                style.append(('ALIGN', (1, row), (-1, row), 'CENTER'))
+
+    tasks = Table(
+        rows, repeatRows=2,
+        colWidths=[0.05 * width, 0.47 * width, 0.16 * width, 0.11 * width, 0.11 * width, 0.1 * width],
+    )
+    tasks.setStyle(TableStyle(style))
+    elements += [tasks, Spacer(1, 16)]
+
+    signatures = Table(
+        [['', ''], [Paragraph('<b>Supervisión:</b>', center), Paragraph('<b>Recibido por:</b>', center)]],
+        colWidths=[width / 2] * 2, rowHeights=[45, 20],
+    )
+    signatures.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black)]))
+    elements.append(signatures)
+
+    with binary_streams():
+        doc.build(elements)
+
+
+def render_asset(payload, dest, images=None):
+    '''Escribe en dest el informe de activo: rutinas por sistema con sus actividades.'''
+    body, title, center, heading = styles()
+    doc = SimpleDocTemplate(dest, pagesize=letter, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=36)
+    width = doc.width
+
+    elements = [header(f'Informe de Activo: {text(payload["name"])}', width, body, title, center)]
+    for system in payload['systems']:
+        elements.append(Paragraph(text(system['name']), heading))
+        rows = [[Paragraph(f'<b>{label}</b>', body) for label in (
+            'Nombre', 'Frecuencia', 'Control', 'Última Intervención', 'Próxima Intervención', 'Número OT'
+        )]]
+        style = [('VALIGN', (0, 0), (-1, -1), 'TOP'), ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black)]
+        for ruta in system['rutas']:
+            rows.append([
+                Paragraph(text(ruta['name']), body), str(ruta['frecuency']), ruta['control'],
+                ruta['intervention_date'], ruta['next_date'], str(ruta['ot_num']),
+            ])
+            for task in ruta['tasks']:
+                rows.append([Paragraph(
+                    f'<b>Actividad:</b> {text(task["description"])}<br/>'
+                    f'<b>HSE:</b> {text(task["hse"])}<br/>'
+                    f'<b>Procedimiento:</b> {text(task["procedimiento"])}', body
+                ), '', '', '', '', ''])
+                style.append(('SPAN', (0, len(rows) - 1), (-1, len(rows) - 1)))
+        table = Table(rows, repeatRows=1, colWidths=[0.27 * width, 0.13 * width, 0.1 * width, 0.17 * width, 0.18 * width, 0.15 * width])
+        table.setStyle(TableStyle(style))
+        elements.append(table)
+
+    with binary_streams():
+        doc.build(elements)
+
+
+# Tipo de reporte -> (función que arma payload, nombre del archivo e imágenes; render) de los reportes que tienen versión ReportLab
+REPORTS = {
+    'ot': (ot_payload, render_ot),
+    'asset': (asset_payload, render_asset),
+}
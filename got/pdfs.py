@@ -0,0 +1,402 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from tempfile import SpooledTemporaryFile
+
+import PyPDF2
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.shortcuts import get_object_or_404
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from . import pdf_reportlab
+from .models import Asset, Ot, PdfJob, Ruta, System
+from .scheduling import load_schedule
+
+
+logger = logging.getLogger(__name__)
+
+# Un trabajo en 'Generando' por más de esto quedó huérfano (worker caído) y se reintenta
+JOB_TIMEOUT = timedelta(minutes=10)
+# Tope por defecto del espacio ocupado por los PDFs generados (GOT_PDF_CACHE_MAX_BYTES)
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+# PDFs intermedios y adjuntos: en memoria hasta este tamaño, luego en disco
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+# Descargas simultáneas de adjuntos (S3)
+FETCH_WORKERS = 4
+
+
+class PdfRenderError(Exception):
+    pass
+
+
+def ot_source(num_ot):
+    ot = get_object_or_404(Ot, num_ot=num_ot)
+    return {'ot': ot}, f'orden_de_trabajo_{num_ot}.pdf', []
+
+
+def asset_source(asset_id):
+    asset = get_object_or_404(Asset, pk=asset_id)
+
+    systems_with_rutas = []
+    for system in asset.system_set.all():
+        rutas = load_schedule(Ruta.objects.filter(system=system).prefetch_related('task_set'))
+        rutas_data = [
+            {'ruta': ruta, 'tasks': ruta.task_set.all(), 'ot_num': ruta.ot.num_ot if ruta.ot else 'N/A'}
+            for ruta in rutas
+        ]
+        systems_with_rutas.append({'system': system, 'rutas_data': rutas_data})
+
+    context = {'asset': asset, 'systems_with_rutas': systems_with_rutas}
+    return context, f'Asset_{asset.pk}.pdf', []
+
+
+def system_source(asset_id, system_id):
+    asset = get_object_or_404(Asset, pk=asset_id)
+    system = get_object_or_404(System, pk=system_id, asset=asset)
+
+    rutas_data = []
+    attachments = []
+    rutas = load_schedule(Ruta.objects.filter(system=system).prefetch_related('task_set__ot'))
+    for ruta in rutas:
+        tasks = ruta.task_set.all()
+        ot_pdfs = [task.ot.info_contratista_pdf for task in tasks if task.ot and task.ot.info_contratista_pdf]
+        rutas_data.append({
+            'ruta': ruta,
+            'tasks': tasks,
+            'ot_num': ruta.ot.num_ot if ruta.ot else 'N/A',
+            'ot_pdfs': ot_pdfs,
+        })
+        attachments.extend(pdf.name for pdf in ot_pdfs)
+
+    context = {'asset': asset, 'system': system, 'rutas_data': rutas_data}
+    filename = f'System_{system_id}_Asset_{asset_id}_with_attachments.pdf'
+    return context, filename, attachments
+
+
+# Tipo de reporte -> (plantilla, función que arma contexto, nombre del archivo y adjuntos)
+SOURCES = {
+    'ot': ('got/pdf_template.html', ot_source),
+    'asset': ('got/asset_pdf_template.html', asset_source),
+    'system': ('got/system_pdf_with_attachments_template.html', system_source),
+}
+
+# Reportes que muestran la programación (días restantes, vencidas): cambian con el día
+DATED_KINDS = {'asset', 'system'}
+
+
+def pdf_engine(kind, engine=None):
+    '''
+    Motor con que se genera el reporte: el pedido (p. ej. ?engine= en la URL), si no el de
+    GOT_PDF_ENGINES, si no 'html'. Los reportes sin versión ReportLab siempre van por html.
+    '''
+    if engine not in dict(PdfJob.ENGINE):
+        engine = getattr(settings, 'GOT_PDF_ENGINES', {}).get(kind, 'html')
+    return engine if kind in pdf_reportlab.REPORTS else 'html'
+
+
+def pdf_subject(kind, *args):
+    return ':'.join([kind, *(str(arg) for arg in args)])
+
+
+def fingerprint(kind, *args, today=None, engine='html'):
+    '''
+    Huella de un reporte sin renderizarlo: plantilla (o módulo de ReportLab) y fecha de
+    modificación de su archivo, objeto y, para los reportes con programación, el día. Los
+    cambios en los datos no entran aquí: las señales de got/signals.py y refresh_schedule
+    marcan stale los trabajos afectados (invalidate_pdfs).
+    '''
+    if engine == 'reportlab':
+        template, origin = 'reportlab', pdf_reportlab.__file__
+    else:
+        template = SOURCES[kind][0]
+        origin = get_template(template).origin.name
+    parts = [template, str(os.path.getmtime(origin)), pdf_subject(kind, *args)]
+    if kind in DATED_KINDS:
+        parts.append((today or date.today()).isoformat())
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def content_key(kind, html, attachments):
+    '''Hash del contenido del reporte: el HTML ya renderizado (o el payload) y los nombres de los adjuntos.'''
+    digest = hashlib.sha256()
+    for part in [kind, html, *attachments]:
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def request_pdf(kind, *args, user=None, engine=None):
+    '''
+    Retorna el PdfJob del reporte. Si hay uno vigente con la misma huella se usa sin
+    consultar ni renderizar nada. Si no, renderiza el HTML (o arma el payload para
+    ReportLab: consultas y plantilla, lo barato) y busca por hash del contenido: el
+    existente si ya se generó, o uno nuevo pendiente. Un trabajo en error, o listo pero
+    sin archivo, se vuelve a encolar.
+    '''
+    engine = pdf_engine(kind, engine)
+    print_key = fingerprint(kind, *args, engine=engine)
+    job = PdfJob.objects.filter(fingerprint=print_key, stale=False).exclude(state='e').first()
+    if job is not None and (job.state != 'f' or job.file):
+        return job
+
+    if engine == 'reportlab':
+        payload, filename, attachments = pdf_reportlab.REPORTS[kind][0](*args)
+        html = ''
+        key = content_key(f'{kind}:{engine}', json.dumps(payload, sort_keys=True), attachments)
+    else:
+        template, source = SOURCES[kind]
+        context, filename, attachments = source(*args)
+        html, payload = get_template(template).render(context), None
+        key = content_key(kind, html, attachments)
+
+    job, created = PdfJob.objects.get_or_create(key=key, defaults={
+        'kind': kind,
+        'subject': pdf_subject(kind, *args),
+        'fingerprint': print_key,
+        'filename': filename,
+        'engine': engine,
+        'html': html,
+        'payload': payload,
+        'attachments': attachments,
+        'requested_by': user if user and user.is_authenticated else None,
+    })
+    if not created:
+        job.subject, job.fingerprint, job.stale = pdf_subject(kind, *args), print_key, False
+        fields = ['subject', 'fingerprint', 'stale']
+        if job.state == 'e' or (job.state == 'f' and not job.file):
+            job.state, job.html, job.payload, job.error, job.started = 'p', html, payload, '', None
+            fields += ['state', 'html', 'payload', 'error', 'started']
+        job.save(update_fields=fields)
+    return job
+
+
+def invalidate_pdfs(ot_ids=(), system_ids=()):
+    '''
+    Marca stale los PDFs que muestran estas OTs y sistemas: el de cada OT, y el del
+    sistema y el del activo de cada sistema. Retorna cuántos trabajos marcó.
+    '''
+    subjects = [pdf_subject('ot', pk) for pk in ot_ids if pk]
+    system_ids = [pk for pk in system_ids if pk]
+    if system_ids:
+        for system_id, asset_id in System.objects.filter(pk__in=system_ids).values_list('pk', 'asset_id'):
+            subjects += [pdf_subject('asset', asset_id), pdf_subject('system', asset_id, system_id)]
+    if not subjects:
+        return 0
+    return PdfJob.objects.filter(subject__in=subjects, stale=False).update(stale=True)
+
+
+def open_pdf(job):
+    '''Abre el archivo de un trabajo listo y registra el uso (orden LRU de evict_pdfs).'''
+    PdfJob.objects.filter(pk=job.pk).update(last_used=timezone.now())
+    return job.file.open('rb')
+
+
+def evict_pdfs(max_bytes=None, keep=None):
+    '''
+    Borra PDFs generados (archivo y trabajo) hasta quedar bajo el tope de espacio:
+    primero los invalidados y luego los de uso más antiguo; nunca el trabajo keep.
+    Retorna cuántos borró.
+    '''
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'GOT_PDF_CACHE_MAX_BYTES', CACHE_MAX_BYTES)
+    done = PdfJob.objects.filter(state='f')
+    total = done.aggregate(total=Sum('size'))['total'] or 0
+    evicted = 0
+    if total <= max_bytes:
+        return evicted
+
+    for job in done.exclude(pk=keep).order_by('-stale', F('last_used').asc(nulls_first=True), 'created').only('file', 'size').iterator():
+        if total <= max_bytes:
+            break
+        job.file.delete(save=False)
+        job.delete()
+        total -= job.size
+        evicted += 1
+    return evicted
+
+
+def fetch_attachment(name):
+    '''
+    Copia un adjunto desde el almacenamiento (local o S3) a un archivo temporal que pasa
+    a disco al superar SPOOL_MAX_SIZE. None si no se pudo leer.
+    '''
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        with default_storage.open(name, 'rb') as source:
+            shutil.copyfileobj(source, spool, CHUNK_SIZE)
+    except Exception:
+        logger.warning('No se pudo leer el adjunto %s', name, exc_info=True)
+        spool.close()
+        return None
+    spool.seek(0)
+    return spool
+
+
+def fetch_attachments(names):
+    '''Descarga los adjuntos en paralelo (la espera es de red o disco) conservando el orden.'''
+    if not names:
+        return []
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(names))) as pool:
+        return list(pool.map(fetch_attachment, names))
+
+
+def link_callback(uri, rel):
+    '''
+    Imágenes del HTML: las de MEDIA_URL se leen del disco cuando el almacenamiento es local;
+    con S3 (sin path) y para el resto de URLs xhtml2pdf las descarga.
+    '''
+    if uri.startswith(settings.MEDIA_URL):
+        try:
+            return default_storage.path(uri[len(settings.MEDIA_URL):])
+        except NotImplementedError:
+            pass
+    return uri
+
+
+def render_pdf(html, attachments=()):
+    '''
+    Convierte el HTML con xhtml2pdf y le anexa los PDFs adjuntos. Retorna un archivo
+    temporal (posicionado al inicio) que el llamador debe cerrar: el PDF principal, los
+    adjuntos y el resultado pasan a disco al crecer, en vez de copiarse en memoria.
+    '''
+    main_pdf = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    pisa_status = pisa.CreatePDF(html, dest=main_pdf, link_callback=link_callback)
+    if pisa_status.err:
+        main_pdf.close()
+        raise PdfRenderError(f'xhtml2pdf reportó {pisa_status.err} errores')
+    main_pdf.seek(0)
+    if not attachments:
+        return main_pdf
+
+    files = [main_pdf] + fetch_attachments(attachments)
+    pdf_merger = PyPDF2.PdfMerger()
+    combined_pdf = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        pdf_merger.append(main_pdf)
+        for name, pdf in zip(attachments, files[1:]):
+            if pdf is None:
+                continue
+            try:
+                pdf_merger.append(pdf)
+            except Exception:
+                logger.warning('No se pudo anexar %s', name, exc_info=True)
+        pdf_merger.write(combined_pdf)
+    except Exception:
+        combined_pdf.close()
+        raise
+    finally:
+        pdf_merger.close()
+        for pdf in files:
+            if pdf is not None:
+                pdf.close()
+    combined_pdf.seek(0)
+    return combined_pdf
+
+
+def fetch_image(name):
+    '''Descarga una imagen y la reduce para el PDF; el original se descarta enseguida.'''
+    source = fetch_attachment(name)
+    if source is None:
+        return None
+    with source:
+        return pdf_reportlab.reduce_image(name, source)
+
+
+def render_reportlab(kind, payload, images=()):
+    '''
+    Arma el reporte con pdf_reportlab a partir del payload. Las imágenes se descargan y
+    reducen en paralelo (Pillow libera el GIL al decodificar y escalar). Retorna un archivo
+    temporal (posicionado al inicio) que el llamador debe cerrar.
+    '''
+    reduced = {}
+    if images:
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(images))) as pool:
+            reduced = dict(zip(images, pool.map(fetch_image, images)))
+
+    pdf = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        pdf_reportlab.REPORTS[kind][1](payload, pdf, reduced)
+    except Exception:
+        pdf.close()
+        raise
+    pdf.seek(0)
+    return pdf
+
+
+def run_job(job):
+    '''Genera el PDF de un trabajo con su motor y lo guarda en el almacenamiento. Retorna el trabajo.'''
+    try:
+        if job.engine == 'reportlab':
+            pdf = render_reportlab(job.kind, job.payload, job.attachments)
+        else:
+            pdf = render_pdf(job.html, job.attachments)
+    except Exception as e:
+        # El worker sigue con los demás trabajos; el error queda en el trabajo
+        logger.exception('Falló la generación de %s', job.filename)
+        job.state, job.error = 'e', str(e)
+    else:
+        with pdf:
+            job.size = pdf.seek(0, os.SEEK_END)
+            pdf.seek(0)
+            job.file.save(f'{job.key}.pdf', File(pdf), save=False)
+        job.state, job.html, job.payload = 'f', '', None
+    job.finished = job.last_used = timezone.now()
+    job.save()
+    evict_pdfs(keep=job.pk)
+    return job
+
+
+def claim_job():
+    '''
+    Toma el trabajo pendiente más antiguo (o uno huérfano) y lo marca en 'Generando'.
+    SKIP LOCKED permite varios workers sobre la misma tabla. None si no hay trabajos.
+    '''
+    stale = timezone.now() - JOB_TIMEOUT
+    with transaction.atomic():
+        job = PdfJob.objects.select_for_update(skip_locked=True).filter(
+            Q(state='p') | Q(state='r', started__lt=stale)
+        ).order_by('created').first()
+        if job is None:
+            return None
+        job.state, job.started = 'r', timezone.now()
+        job.save(update_fields=['state', 'started'])
+    return job
+
+
+def run_pending(limit=None):
+    '''Procesa trabajos pendientes hasta vaciar la cola (o hasta limit). Retorna cuántos procesó.'''
+    done = 0
+    while limit is None or done < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def ready_pdf(kind, *args, engine=None):
+    '''Trabajo listo del reporte, generándolo en línea si aún no existe (p. ej. para un correo).'''
+    job = request_pdf(kind, *args, engine=engine)
+    if job.state != 'f':
+        run_job(job)
+    if job.state != 'f':
+        raise PdfRenderError(job.error)
+    return job
+
+
+def pdf_bytes(kind, *args, engine=None):
+    '''Contenido del PDF, generándolo en línea si aún no existe.'''
+    with open_pdf(ready_pdf(kind, *args, engine=engine)) as f:
+        return f.read()
@@ -0,0 +1,60 @@
+'''
+Grupos del usuario resueltos una sola vez por petición. group_names consulta los grupos
+la primera vez y los guarda en el usuario (request.user vive lo que dura la petición), así
+las plantillas (filtro has_group) y las vistas no repiten la consulta. Con
+GOT_GROUPS_CACHE_TIMEOUT también se guardan en la caché de Django entre peticiones; las
+señales de got/signals.py los invalidan al cambiar la membresía o al renombrar o borrar
+un grupo.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Atributo del usuario donde se guardan sus grupos durante la petición
+USER_ATTR = '_got_group_names'
+CACHE_KEY = 'got:groups:{}'
+
+
+def cache_timeout():
+    return getattr(settings, 'GOT_GROUPS_CACHE_TIMEOUT', 0)
+
+
+def group_names(user):
+    '''Conjunto con los nombres de los grupos del usuario (vacío si es anónimo).'''
+    if not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, USER_ATTR, None)
+    if names is not None:
+        return names
+    timeout = cache_timeout()
+    if timeout:
+        names = cache.get(CACHE_KEY.format(user.pk))
+    if names is None:
+        names = frozenset(user.groups.values_list('name', flat=True))
+        if timeout:
+            cache.set(CACHE_KEY.format(user.pk), names, timeout)
+    setattr(user, USER_ATTR, names)
+    return names
+
+
+def has_group(user, *names):
+    '''True si el usuario pertenece a alguno de los grupos.'''
+    return not group_names(user).isdisjoint(names)
+
+
+def forget_groups(user):
+    '''Descarta los grupos guardados en esta instancia del usuario.'''
+    setattr(user, USER_ATTR, None)
+
+
+def invalidate_groups(user_ids):
+    '''
+    Borra de la caché los grupos de estos usuarios, ya y al confirmarse la transacción
+    (una petición concurrente pudo guardar los grupos anteriores mientras tanto).
+    '''
+    if not cache_timeout():
+        return
+    keys = [CACHE_KEY.format(pk) for pk in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
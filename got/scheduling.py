@@ -0,0 +1,156 @@
+from datetime import date
+from decimal import InvalidOperation
+
+from django.db.models import F, Q, QuerySet, Sum, prefetch_related_objects
+
+from .compliance import asset_ind_mtto, load_fleet_frame, refresh_system_compliance
+from .forecast import forecast_usage
+from .models import Ruta
+
+
+def hours_since_intervention(rutas, today=None):
+    '''
+    Horas reportadas por el equipo de cada rutina desde su intervention_date,
+    calculadas con una sola consulta agrupada. Retorna {ruta.code: horas}.
+    '''
+    today = today or date.today()
+    codes = [ruta.code for ruta in rutas]
+    if not codes:
+        return {}
+
+    totals = Ruta.objects.filter(code__in=codes).values('code').annotate(
+        total_hours=Sum(
+            'equipo__hours__hour',
+            filter=Q(
+                equipo__hours__report_date__gte=F('intervention_date'),
+                equipo__hours__report_date__lte=today,
+            )
+        )
+    ).order_by()
+    return {row['code']: row['total_hours'] or 0 for row in totals}
+
+
+def schedule_at(ruta, today):
+    '''Fija la fecha de referencia de la rutina; las horas precargadas a otra fecha se descartan.'''
+    if ruta.get_today() != today:
+        ruta.__dict__.pop('hours_period', None)
+    ruta.schedule_today = today
+
+
+def load_schedule(rutas, today=None):
+    '''
+    Prepara un lote de rutinas para que next_date, daysleft, percentage_remaining
+    y maintenance_status se evalúen sin consultas adicionales por fila, a la fecha
+    today (por defecto hoy). Acepta un queryset o una lista de instancias y retorna la lista.
+    '''
+    if isinstance(rutas, QuerySet):
+        rutas = list(rutas.select_related('equipo', 'ot'))
+    else:
+        rutas = list(rutas)
+        prefetch_related_objects(rutas, 'equipo', 'ot')
+
+    if today is not None:
+        for ruta in rutas:
+            schedule_at(ruta, today)
+
+    pending = [ruta for ruta in rutas if not hasattr(ruta, 'hours_period')]
+    periods = hours_since_intervention(pending, today)
+    for ruta in pending:
+        ruta.hours_period = periods.get(ruta.code, 0)
+
+    return rutas
+
+
+def load_ind_mtto(assets, today=None):
+    '''
+    Calcula Asset.ind_mtto para un lote de activos con el motor de cumplimiento
+    (una consulta) y lo deja en asset.maintenance_index.
+    '''
+    assets = list(assets)
+    frame = load_fleet_frame(Ruta.objects.filter(system__asset__in=[asset.pk for asset in assets]), today)
+    indexes = asset_ind_mtto(frame)
+
+    for asset in assets:
+        value = indexes.get(asset.pk)
+        asset.maintenance_index = "---" if value is None else f"{value}%"
+    return assets
+
+
+SCHEDULE_FIELDS = ['next_due_date', 'hours_since_intervention', 'status']
+
+
+def compute_schedule_fields(ruta, today=None):
+    '''
+    Copia next_date, horas desde la intervención y maintenance_status, calculados a la
+    fecha today (por defecto hoy), a las columnas persistidas de la rutina. No guarda.
+    '''
+    if today is not None:
+        schedule_at(ruta, today)
+    # intervention_date puede llegar como datetime (timezone.now()) desde las vistas
+    ruta.intervention_date = Ruta._meta.get_field('intervention_date').to_python(ruta.intervention_date)
+    try:
+        ruta.next_due_date = ruta.next_date
+        ruta.hours_since_intervention = ruta.get_hours_period() if ruta.equipo_id else 0
+        ruta.status = ruta.maintenance_status
+    except (AttributeError, TypeError, ZeroDivisionError, InvalidOperation):
+        # Rutina por horas sin equipo o con frecuencia en cero: no hay fecha calculable
+        ruta.next_due_date = None
+        ruta.hours_since_intervention = 0
+        ruta.status = 'e' if not ruta.ot_id else 'v'
+    # La proyección (got/forecast.py) solo aplica a rutinas por horas con equipo
+    if ruta.control != 'h' or not ruta.equipo_id:
+        ruta.forecast_date = None
+    return ruta
+
+
+def refresh_schedule(rutas, today=None, batch_size=500):
+    '''
+    Recalcula y guarda con bulk_update las columnas de programación de un lote de rutinas,
+    y la proyección de uso de los equipos de sus rutinas por horas. bulk_update no dispara
+    las señales de Ruta: aquí se marcan stale los PDFs que muestran la programación.
+    Retorna la lista de rutinas actualizadas.
+    '''
+    # got.pdfs importa este módulo (load_schedule)
+    from .pdfs import invalidate_pdfs
+
+    rutas = load_schedule(rutas, today)
+    for ruta in rutas:
+        compute_schedule_fields(ruta, today)
+    Ruta.objects.bulk_update(rutas, SCHEDULE_FIELDS + ['forecast_date'], batch_size=batch_size)
+    system_ids = {ruta.system_id for ruta in rutas}
+    refresh_system_compliance(system_ids, today)
+    invalidate_pdfs(system_ids=system_ids)
+    equipo_ids = {ruta.equipo_id for ruta in rutas if ruta.control == 'h' and ruta.equipo_id}
+    if equipo_ids:
+        forecast_usage(today, equipo_ids)
+    return rutas
+
+
+def rollover_schedule(today=None, chunk_size=500):
+    '''
+    Barrido diario: recalcula todas las rutinas por bloques y retorna
+    (total de rutinas, rutinas que pasaron a vencidas en este barrido).
+    '''
+    today = today or date.today()
+    transitions = []
+    total = 0
+    last_code = 0
+
+    while True:
+        chunk = list(
+            Ruta.objects.filter(code__gt=last_code).order_by('code')
+            .select_related('equipo', 'ot', 'system__asset')[:chunk_size]
+        )
+        if not chunk:
+            break
+        was_overdue = {ruta.code: ruta.next_due_date is not None and ruta.next_due_date < today for ruta in chunk}
+
+        refresh_schedule(chunk, today, batch_size=chunk_size)
+
+        for ruta in chunk:
+            if ruta.next_due_date is not None and ruta.next_due_date < today and not was_overdue[ruta.code]:
+                transitions.append(ruta)
+        total += len(chunk)
+        last_code = chunk[-1].code
+
+    return total, transitions
@@ -1,31 +1,243 @@
-from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.db.models import Q
 from django.dispatch import receiver
-from .models import HistoryHour
-from django.db.models import Avg
+from .models import Asset, Equipo, FailureReport, HistoryHour, Image, Ot, PdfJob, Ruta, System, Task
+from .scheduling import compute_schedule_fields, refresh_schedule
+from .compliance import refresh_system_compliance
+from .forecast import forecast_usage
+from .hours import apply_hour_delta, apply_rollup_delta, refresh_schedule_on_commit
+from .pdfs import invalidate_pdfs, pdf_subject
+from .permissions import cache_timeout, forget_groups, invalidate_groups
+from .visibility import forget_scope, invalidate_scopes
+
+
+@receiver(pre_save, sender=Equipo)
+def sync_equipo_horometro(sender, instance, **kwargs):
+    # El horómetro se mantiene por deltas: al crear parte de initial_hours y al editar
+    # se conserva el valor de la base (no el de la instancia cargada) más el cambio de initial_hours.
+    # No se edita directamente (los formularios y el admin lo muestran de solo lectura)
+    if instance._state.adding:
+        instance.horometro = instance.initial_hours
+        return
+    stored = Equipo.objects.filter(pk=instance.pk).values_list('horometro', 'initial_hours').first()
+    if stored:
+        horometro, initial_hours = stored
+        if horometro is None:
+            horometro = initial_hours
+        instance.horometro = horometro + (instance.initial_hours - initial_hours)
+
+
+@receiver(pre_save, sender=HistoryHour)
+def remember_previous_hour(sender, instance, **kwargs):
+    # Valor anterior del registro para aplicar solo la diferencia al horómetro y a los acumulados
+    instance._previous_hour = None
+    if instance.pk:
+        instance._previous_hour = HistoryHour.objects.filter(pk=instance.pk).values_list(
+            'component', 'report_date', 'hour'
+        ).first()
 
 
 @receiver(post_save, sender=HistoryHour)
 @receiver(post_delete, sender=HistoryHour)
 def update_equipo_horometro(sender, instance, **kwargs):
-    # Obtener el equipo relacionado con la instancia de HistoryHour
-    equipo = instance.component
+    if deleted_in_cascade(sender, kwargs):
+        return
+    # Contabilidad incremental: se aplica el delta del registro modificado, sin volver a sumar todo el historial
+    hour = HistoryHour._meta.get_field('hour').to_python(instance.hour)
+    report_date = HistoryHour._meta.get_field('report_date').to_python(instance.report_date)
+    equipo_ids = {instance.component_id}
+    if kwargs.get('signal') is post_delete:
+        apply_hour_delta(instance.component_id, -hour)
+        apply_rollup_delta(instance.component_id, report_date, -hour, -1)
+    else:
+        previous = getattr(instance, '_previous_hour', None)
+        if previous:
+            apply_rollup_delta(previous[0], previous[1], -previous[2], -1)
+        apply_rollup_delta(instance.component_id, report_date, hour, 1)
+
+        if previous and previous[0] != instance.component_id:
+            apply_hour_delta(previous[0], -previous[2])
+            equipo_ids.add(previous[0])
+            previous = None
+        apply_hour_delta(instance.component_id, hour - (previous[2] if previous else 0))
+
+    # Las rutinas por horas del equipo dependen del horómetro y del promedio: se recalculan
+    # una vez por transacción, no en cada reporte guardado
+    refresh_schedule_on_commit(equipo_ids)
+
+
+@receiver(pre_save, sender=Ruta)
+def update_ruta_schedule(sender, instance, **kwargs):
+    # Descartar horas precargadas: intervention_date, equipo u ot pudieron cambiar
+    instance.__dict__.pop('hours_period', None)
+    compute_schedule_fields(instance)
+
+
+def deleted_in_cascade(sender, kwargs):
+    # post_delete por el borrado de un padre (equipo, sistema, activo): sus acumulados
+    # se borran en la misma cascada y no deben recalcularse ni volver a crearse
+    origin = kwargs.get('origin')
+    return kwargs.get('signal') is post_delete and origin is not None and getattr(origin, 'model', type(origin)) is not sender
+
+
+@receiver(post_save, sender=Ruta)
+@receiver(post_delete, sender=Ruta)
+def update_system_compliance(sender, instance, **kwargs):
+    if deleted_in_cascade(sender, kwargs):
+        return
+    refresh_system_compliance([instance.system_id])
+
+
+@receiver(post_save, sender=Ruta)
+def update_ruta_forecast(sender, instance, **kwargs):
+    # Frecuencia, equipo o intervención pudieron cambiar la fecha proyectada
+    if instance.control == 'h' and instance.equipo_id:
+        forecast_usage(equipo_ids=[instance.equipo_id])
+
+
+@receiver(post_save, sender=Ot)
+def update_rutas_ot_state(sender, instance, created, **kwargs):
+    if not created:
+        refresh_schedule(instance.ruta_set.all())
+
+
+@receiver(pre_delete, sender=Ot)
+@receiver(pre_delete, sender=Equipo)
+def remember_deleted_rutas(sender, instance, **kwargs):
+    # Borrar la OT o el equipo deja ot/equipo en NULL con un update del queryset, sin
+    # señales de Ruta: se guardan las rutinas afectadas para recalcularlas en post_delete
+    field = 'ot' if sender is Ot else 'equipo'
+    instance._ruta_ids = list(Ruta.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Ot)
+@receiver(post_delete, sender=Equipo)
+def refresh_deleted_rutas(sender, instance, **kwargs):
+    # Las rutinas de un sistema o activo borrado caen en la misma cascada y no quedan en la base
+    ruta_ids = getattr(instance, '_ruta_ids', None)
+    if ruta_ids:
+        refresh_schedule(Ruta.objects.filter(pk__in=ruta_ids))
+
+
+# PDFs en caché: cada cambio marca stale los reportes donde aparece el objeto
+
+@receiver(post_save, sender=Ot)
+@receiver(post_delete, sender=Ot)
+def invalidate_ot_pdfs(sender, instance, **kwargs):
+    system_ids = {instance.system_id}
+    if kwargs.get('signal') is post_save:
+        # El número de OT sale en las rutinas; sus informes de contratista se anexan al del sistema
+        system_ids.update(Ruta.objects.filter(Q(ot=instance) | Q(task__ot=instance)).values_list('system_id', flat=True))
+    invalidate_pdfs([instance.pk], system_ids)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_pdfs(sender, instance, **kwargs):
+    if deleted_in_cascade(sender, kwargs):
+        return
+    system_ids = Ruta.objects.filter(pk=instance.ruta_id).values_list('system_id', flat=True) if instance.ruta_id else []
+    invalidate_pdfs([instance.ot_id], system_ids)
+
+
+@receiver(post_save, sender=Ruta)
+@receiver(post_delete, sender=Ruta)
+def invalidate_ruta_pdfs(sender, instance, **kwargs):
+    if deleted_in_cascade(sender, kwargs):
+        return
+    invalidate_pdfs(system_ids=[instance.system_id])
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def invalidate_image_pdfs(sender, instance, **kwargs):
+    if deleted_in_cascade(sender, kwargs) or not instance.task_id:
+        return
+    task = Task.objects.filter(pk=instance.task_id).values('ot_id', 'ruta__system_id').first()
+    if task:
+        invalidate_pdfs([task['ot_id']], [task['ruta__system_id']])
+
+
+@receiver(post_save, sender=FailureReport)
+@receiver(post_delete, sender=FailureReport)
+def invalidate_failure_pdfs(sender, instance, **kwargs):
+    # El reporte de falla sale en el PDF de su OT
+    if deleted_in_cascade(sender, kwargs):
+        return
+    invalidate_pdfs([instance.related_ot_id])
+
+
+@receiver(post_save, sender=Equipo)
+@receiver(post_delete, sender=Equipo)
+def invalidate_equipo_pdfs(sender, instance, **kwargs):
+    # Los equipos salen en el PDF del sistema y, por sus reportes de falla, en el de las OTs
+    if deleted_in_cascade(sender, kwargs):
+        return
+    ot_ids = FailureReport.objects.filter(equipo=instance).exclude(related_ot=None).values_list('related_ot', flat=True)
+    invalidate_pdfs(ot_ids, [instance.system_id])
+
+
+@receiver(post_save, sender=System)
+def invalidate_system_pdfs(sender, instance, created, **kwargs):
+    # El nombre del sistema sale en su PDF, en el del activo y en el de sus OTs
+    if not created:
+        invalidate_pdfs(Ot.objects.filter(system=instance).values_list('pk', flat=True), [instance.pk])
+
+
+@receiver(post_save, sender=Asset)
+def invalidate_asset_pdfs(sender, instance, created, **kwargs):
+    # Nombre y área del activo: su PDF, el de sus sistemas y el de sus OTs
+    if created:
+        return
+    affected = Q(subject=pdf_subject('asset', instance.pk)) | Q(subject__startswith=pdf_subject('system', instance.pk) + ':')
+    ot_ids = Ot.objects.filter(system__asset=instance).values_list('pk', flat=True)
+    affected |= Q(subject__in=[pdf_subject('ot', pk) for pk in ot_ids])
+    PdfJob.objects.filter(affected, stale=False).update(stale=True)
+
+
+@receiver(post_delete, sender=System)
+@receiver(post_delete, sender=Asset)
+def invalidate_deleted_pdfs(sender, instance, **kwargs):
+    # El sistema o activo ya no existe: invalidate_pdfs no puede resolverlo desde la base
+    if sender is Asset:
+        affected = Q(subject=pdf_subject('asset', instance.pk)) | Q(subject__startswith=pdf_subject('system', instance.pk) + ':')
+    else:
+        affected = Q(subject=pdf_subject('asset', instance.asset_id)) | Q(subject=pdf_subject('system', instance.asset_id, instance.pk))
+    PdfJob.objects.filter(affected, stale=False).update(stale=True)
+
 
-    # Calcular la suma de las horas de todos los HistoryHour relacionados
-    # horas_totales =
-    # HistoryHour.objects.filter(component=equipo)
-    # .aggregate(total_horas=Sum('hour'))['total_horas']
-    # promedio_horas = HistoryHour.objects.filter(component=equipo).aggregate(
-    #     promedio_horas=Avg('hour'))['promedio_horas']
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    # Desde el usuario (user.groups.add) o desde el grupo (group.user_set.add); el alcance
+    # de got/visibility.py depende de los grupos
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        forget_groups(instance)
+        forget_scope(instance)
+        invalidate_groups([instance.pk])
+        invalidate_scopes([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        invalidate_groups(pk_set)
+        invalidate_scopes(pk_set)
+    elif reverse and action == 'pre_clear':
+        members = list(instance.user_set.values_list('pk', flat=True)) if cache_timeout() else []
+        invalidate_groups(members)
+        invalidate_scopes()
 
-    ultimos_30_registros = HistoryHour.objects.filter(
-        component=equipo).order_by('-report_date')[:10]
 
-    # Calcula el promedio de horas de los últimos 30 registros.
-    promedio_horas = ultimos_30_registros.aggregate(
-        promedio_horas=Avg('hour'))['promedio_horas']
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_members(sender, instance, **kwargs):
+    # Renombrar o borrar un grupo cambia los nombres guardados de todos sus miembros
+    if kwargs.get('created'):
+        return
+    if cache_timeout():
+        invalidate_groups(instance.user_set.values_list('pk', flat=True))
+    invalidate_scopes()
 
-    equipo.prom_hours = promedio_horas or 0
 
-    # Actualizar el valor de horometro del equipo con la suma calculada
-    equipo.horometro = equipo.calculate_horometro()
-    equipo.save()
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+def invalidate_asset_scopes(sender, instance, **kwargs):
+    # El supervisor y el área de los activos definen el alcance de maq_members y buzos_members
+    invalidate_scopes()
@@ -0,0 +1,252 @@
+import random
+import string
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
+from .hours import rebuild_hour_rollups, recalculate_horometros
+from .models import (
+    Asset, System, Equipo, Ruta, HistoryHour, Ot, Task, FailureReport, Operation, Solicitud, Suministro, Item
+)
+from .scheduling import rollover_schedule
+
+
+# Prefijo de los nombres de activo sintéticos: purge_fleet solo borra estos
+SYNTHETIC_PREFIX = 'SYN '
+
+# Servidores de base de datos que se consideran locales (vacío o ruta: socket de Unix)
+LOCAL_HOSTS = {'', 'localhost', '127.0.0.1', '::1'}
+
+AREAS = ['a'] * 6 + ['b'] * 2 + ['o', 'v', 'x']
+LOCATIONS = ['Cartagena', 'Santa Marta', 'Guyana']
+
+# (grupo, nombre, equipos rotativos); los grupos 200 y 300 siguen la convención de RutaListView
+SYSTEM_TEMPLATES = [
+    (100, 'Casco y estructura', []),
+    (200, 'Propulsión', ['Motor propulsor estribor', 'Motor propulsor babor']),
+    (300, 'Generación', ['Motor generador 1', 'Motor generador 2']),
+    (400, 'Achique y contraincendio', ['Bomba contraincendio']),
+    (500, 'Navegación y comunicaciones', []),
+    (600, 'Gobierno', ['Bomba hidráulica timón']),
+    (700, 'Refrigeración', ['Compresor']),
+    (800, 'Habitabilidad', []),
+]
+
+# Cadenas de rutinas por horas: cada nivel depende del anterior
+HOUR_CHAINS = [250, 500, 1000, 2000]
+DAY_FREQUENCIES = [7, 30, 90, 180, 365, 730]
+
+
+def asset_codes(count):
+    '''Abreviaturas de 3 caracteres (Z + base 36) para los activos sintéticos.'''
+    alphabet = string.digits + string.ascii_uppercase
+    return [f'Z{alphabet[i // 36]}{alphabet[i % 36]}' for i in range(count)]
+
+
+def require_local_database(command, force=False):
+    '''
+    Aborta el comando (seed_fleet, benchmark) si la base está en un servidor remoto,
+    salvo con force. DEBUG no sirve de resguardo: está en True en la configuración que apunta a producción.
+    '''
+    host = connection.settings_dict.get('HOST') or ''
+    if host not in LOCAL_HOSTS and not host.startswith('/') and not force:
+        raise CommandError(f'{command} solo se ejecuta en bases locales y la base está en {host}. Use --force para omitir.')
+
+
+def purge_fleet():
+    '''Borra los activos sintéticos y todo lo que cuelga de ellos.'''
+    Asset.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+    Item.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+
+
+def build_fleet(assets=10, systems=6, years=2, ots=8, seed=42, today=None, derived=True):
+    '''
+    Crea una flota sintética reproducible (misma semilla, mismos datos): activos,
+    sistemas, equipos, rutinas con cadenas de dependencia, años de HistoryHour,
+    operaciones, OTs con actividades, reportes de falla, solicitudes y suministros.
+    Usa bulk_create, por lo que al final recalcula horómetros, acumulados, programación
+    y proyección (derived=False lo omite). Retorna un resumen con los conteos.
+    '''
+    rng = random.Random(seed)
+    today = today or date.today()
+    history_days = int(365 * years)
+
+    with transaction.atomic():
+        users = []
+        for i in range(max(4, assets // 2)):
+            user, _ = User.objects.get_or_create(username=f'syn_tecnico_{i}', defaults={'first_name': f'Técnico {i}'})
+            users.append(user)
+
+        items = Item.objects.bulk_create([
+            Item(name=f'{SYNTHETIC_PREFIX}item {i}', presentacion='und', seccion=rng.choice('chr'), code=f'SYN-{i}')
+            for i in range(30)
+        ])
+
+        fleet = Asset.objects.bulk_create([
+            Asset(abbreviation=code, name=f'{SYNTHETIC_PREFIX}{i:03d}', area=rng.choice(AREAS), supervisor=rng.choice(users))
+            for i, code in enumerate(asset_codes(assets))
+        ])
+
+        system_rows = []
+        for asset in fleet:
+            templates = SYSTEM_TEMPLATES[:max(systems, 3)] if asset.area == 'a' else rng.sample(SYSTEM_TEMPLATES, min(systems, len(SYSTEM_TEMPLATES)))
+            location = rng.choice(LOCATIONS)
+            for group, name, rotativos in templates:
+                system_rows.append((System(name=name, group=group, location=location, asset=asset), rotativos))
+        System.objects.bulk_create([system for system, _ in system_rows])
+
+        equipos = []
+        for system, rotativos in system_rows:
+            for j, name in enumerate(rotativos):
+                equipos.append(Equipo(
+                    code=f'{system.asset_id}-{system.group}-{j}', name=name, feature='Equipo sintético',
+                    tipo='r', system=system, initial_hours=rng.randint(0, 5000),
+                    marca=rng.choice(['Caterpillar', 'Cummins', 'John Deere']), model='SYN',
+                    lubricante='15W40', volumen=rng.choice([20, 40, 80]),
+                ))
+            for j in range(rng.randint(1, 3)):
+                equipos.append(Equipo(
+                    code=f'{system.asset_id}-{system.group}-nr{j}', name=f'{system.name} {j}',
+                    feature='Equipo sintético', tipo='nr', system=system,
+                ))
+        Equipo.objects.bulk_create(equipos)
+        rotativos = [equipo for equipo in equipos if equipo.tipo == 'r']
+
+        operations = []
+        for asset in fleet:
+            day = today - timedelta(days=history_days)
+            while day < today + timedelta(days=180):
+                day += timedelta(days=rng.randint(10, 60))
+                length = rng.randint(5, 40)
+                operations.append(Operation(
+                    asset=asset, start=day, end=day + timedelta(days=length),
+                    proyecto=f'Proyecto {len(operations)}', requirements='Sintético',
+                ))
+                day += timedelta(days=length)
+        Operation.objects.bulk_create(operations)
+
+        operating_days = {}
+        for operation in operations:
+            days = operating_days.setdefault(operation.asset_id, set())
+            for offset in range((operation.end - operation.start).days + 1):
+                days.add(operation.start + timedelta(days=offset))
+
+        hours = []
+        for equipo in rotativos:
+            asset_id = equipo.system.asset_id
+            base = rng.uniform(2, 8)
+            for offset in range(history_days):
+                day = today - timedelta(days=offset)
+                if rng.random() < 0.85:
+                    rate = base * 2.5 if day in operating_days[asset_id] else base
+                    hour = round(min(24, max(0, rng.gauss(rate, 2))), 1)
+                    hours.append(HistoryHour(component=equipo, report_date=day, hour=hour, reporter=rng.choice(users)))
+        HistoryHour.objects.bulk_create(hours, batch_size=5000)
+
+        orders = []
+        for asset in fleet:
+            asset_systems = [system for system, _ in system_rows if system.asset_id == asset.pk]
+            for _ in range(ots):
+                orders.append(Ot(
+                    system=rng.choice(asset_systems), description='OT sintética', super=asset.supervisor,
+                    state=rng.choice('aaxxxffc'), tipo_mtto=rng.choice('ppcm'),
+                ))
+        Ot.objects.bulk_create(orders)
+
+        tasks = []
+        for ot in orders:
+            for _ in range(rng.randint(2, 5)):
+                finished = ot.state == 'f' or rng.random() < 0.3
+                tasks.append(Task(
+                    ot=ot, responsible=rng.choice(users), description='Actividad sintética',
+                    start_date=today - timedelta(days=rng.randint(-10, 60)), men_time=rng.randint(1, 10),
+                    finished=finished,
+                ))
+        Task.objects.bulk_create(tasks)
+
+        # Rutinas: una cadena por horas por equipo rotativo y rutinas por días por sistema
+        ots_by_system = {}
+        for ot in orders:
+            ots_by_system.setdefault(ot.system_id, []).append(ot)
+        rutas = []
+        previous = {}
+        for frecuency in HOUR_CHAINS:
+            batch = []
+            for equipo in rotativos:
+                ot = rng.choice(ots_by_system.get(equipo.system_id, [None]))
+                batch.append(Ruta(
+                    name=f'Mantenimiento {frecuency} horas', control='h', frecuency=frecuency,
+                    intervention_date=today - timedelta(days=rng.randint(0, 400)), system=equipo.system,
+                    equipo=equipo, ot=ot if rng.random() < 0.6 else None, dependencia=previous.get(equipo.code),
+                ))
+            Ruta.objects.bulk_create(batch)
+            previous = {ruta.equipo_id: ruta for ruta in batch}
+            rutas.extend(batch)
+
+        batch = []
+        for system, _ in system_rows:
+            for frecuency in rng.sample(DAY_FREQUENCIES, 3):
+                ot = rng.choice(ots_by_system.get(system.pk, [None]))
+                batch.append(Ruta(
+                    name=f'Inspección {frecuency} días', control='d', frecuency=frecuency,
+                    intervention_date=today - timedelta(days=rng.randint(0, frecuency * 2)), system=system,
+                    ot=ot if rng.random() < 0.6 else None,
+                ))
+            if system.group == 100 and system.asset.area == 'a':
+                batch.append(Ruta(
+                    name='DIQUE', control='d', frecuency=900, astillero='Astillero sintético',
+                    intervention_date=today - timedelta(days=rng.randint(0, 900)), system=system,
+                ))
+        Ruta.objects.bulk_create(batch)
+        rutas.extend(batch)
+
+        failures = []
+        for asset in fleet:
+            asset_equipos = [equipo for equipo in equipos if equipo.system.asset_id == asset.pk]
+            for _ in range(rng.randint(0, 4)):
+                failures.append(FailureReport(
+                    reporter=rng.choice(users), equipo=rng.choice(asset_equipos), description='Falla sintética',
+                    causas='Desgaste', critico=rng.random() < 0.3, closed=rng.random() < 0.5,
+                    impact=rng.sample('smio', rng.randint(0, 2)),
+                ))
+        FailureReport.objects.bulk_create(failures)
+
+        solicitudes = []
+        for asset in fleet:
+            for ot in [ot for ot in orders if ot.system.asset_id == asset.pk][:3]:
+                solicitudes.append(Solicitud(
+                    solicitante=rng.choice(users), ot=ot, asset=asset, suministros='Repuestos sintéticos',
+                    approved=rng.random() < 0.5,
+                ))
+        Solicitud.objects.bulk_create(solicitudes)
+
+        suministros = [
+            Suministro(item=rng.choice(items), cantidad=rng.randint(1, 20), equipo=equipo)
+            for equipo in rotativos
+        ] + [
+            Suministro(item=rng.choice(items), cantidad=rng.randint(1, 5), Solicitud=solicitud)
+            for solicitud in solicitudes
+        ]
+        Suministro.objects.bulk_create(suministros)
+
+    if derived:
+        codes = [equipo.code for equipo in equipos]
+        recalculate_horometros(codes)
+        rebuild_hour_rollups(codes)
+        rollover_schedule(today)
+
+    return {
+        'assets': len(fleet),
+        'systems': len(system_rows),
+        'equipos': len(equipos),
+        'rutas': len(rutas),
+        'history_hours': len(hours),
+        'operations': len(operations),
+        'ots': len(orders),
+        'tasks': len(tasks),
+        'failures': len(failures),
+        'solicitudes': len(solicitudes),
+        'suministros': len(suministros),
+    }
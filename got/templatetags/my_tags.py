@@ -1,6 +1,6 @@
 from django import template
 from got.models import Asset, FailureReport, System
-from django.contrib.auth.models import Group
+from got.permissions import has_group as in_group
 from simple_history.models import HistoricalRecords
 
 
@@ -11,10 +11,8 @@ register = template.Library()
 def obtener_asset_del_supervisor(context):
     request = context['request']
     user = request.user
-    target_groups = ['maq_members', 'serport_members']
-    user_groups = user.groups.filter(name__in=target_groups).values_list('name', flat=True)
 
-    if user_groups:
+    if in_group(user, 'maq_members', 'serport_members'):
         try:
             return Asset.objects.get(supervisor=user)
         except Asset.DoesNotExist:
@@ -30,8 +28,8 @@ def obtener_asset_del_supervisor(context):
 
 @register.filter(name='has_group')
 def has_group(user, group_name):
-    group = Group.objects.get(name=group_name)
-    return True if group in user.groups.all() else False
+    # Los grupos se consultan una vez por petición (got/permissions.py)
+    return in_group(user, group_name)
 
 
 @register.filter(name='get_impact_display')
@@ -1,3 +1,1374 @@
-from django.test import TestCase
+import csv
+import re
+import smtplib
+import threading
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import PyPDF2
+from PIL import Image as PILImage
+from reportlab import rl_config
+
+from . import outbox, pdfs, urls
+from .benchmark import QueryCounter
+from .middleware import RequestMetrics
+from .compliance import asset_ind_mtto, load_fleet_frame, ruta_status_matrix, system_maintenance_percentage
+from .hours import hours_grid, import_hours, parse_hour_rows, recalculate_horometros
+from .models import (
+    Asset, System, SystemCompliance, Equipo, HistoryHour, HourRollup, Ot, Task, Ruta, FailureReport, Operation, Location,
+    Solicitud, Megger, Estator, Excitatriz, RotorMain, RotorAux, RodamientosEscudos, OutboundEmail, Notification, PdfJob,
+    Image, RequestMetric
+)
+from .notifications import next_due, notify, queue_digests
+from .outbox import attachment_token, pdf_attachment, queue_email, send_pending, storage_attachment
+from .pdfs import JOB_TIMEOUT, PdfRenderError, claim_job, evict_pdfs, render_pdf, request_pdf, run_job, run_pending
+from .scheduling import compute_schedule_fields, load_schedule, rollover_schedule
+from .permissions import group_names
+from .synthetic import build_fleet
+from .visibility import user_scope
+
+
+# Máximo de consultas por vista: url_name -> (presupuesto, objetos que van en la URL).
+# Toda ruta de got/urls.py debe estar aquí; None marca las vistas que no atienden GET.
+# Un tercer valor fija el código de respuesta del GET cuando no es 200 (redirecciones, vistas solo POST).
+# Los presupuestos no dependen del tamaño de la flota: una N+1 nueva los rompe en la flota grande.
+QUERY_BUDGETS = {
+    'my-tasks': (12, []),
+    'asset-list': (12, []),
+    'asset-detail': (21, ['asset']),
+    'schedule': (31, ['asset']),
+    'sys-detail': (20, ['system']),
+    'sys-detail-view': (23, ['system', 'equipo']),
+    'sys-update': (9, ['system']),
+    'sys-delete': (17, ['system']),
+    'equipo-update': (9, ['equipo']),
+    'equipo-delete': (9, ['equipo']),
+    'equipo-create': (8, ['system']),
+    'ot-list': (14, []),
+    'ot-detail': (35, ['ot']),
+    'ot-create': (16, ['asset']),
+    'ot-update': (19, ['ot']),
+    'ot-delete': (9, ['ot']),
+    'task-detail': (15, ['task']),
+    'task-create': (9, ['ot']),
+    'task-update': (12, ['task']),
+    'task-delete': (9, ['task']),
+    'reschedule-task': (11, ['task']),
+    'finish-task': (11, ['task']),
+    'finish-task-ot': (11, ['task']),
+    'update-task': (10, ['task']),
+    'delete-task': (9, ['task']),
+    'ruta-list': (16, []),
+    'ruta-create': (35, ['system']),
+    'ruta-update': (34, ['ruta']),
+    'ruta-delete': (11, ['ruta']),
+    'crear_ot_desde_ruta': (22, ['ruta'], 302),
+    'report': (24, ['ot']),
+    'pdf-job': (9, ['pdf_job']),
+    'pdf-download': (6, ['pdf_job']),
+    'email-attachment': (6, ['email_link']),
+    'dashboard': (16, []),
+    'request-metrics': (10, []),
+    'horas-importar': (7, [], 405),
+    'horas': (41, ['equipo']),
+    'horas-asset': (13, ['asset']),
+    'failure-report-list': (11, []),
+    'failure-report-detail': (14, ['failure']),
+    'failure-report-create': (11, ['asset']),
+    'failure-report-update': (18, ['failure']),
+    'failure-report-crear-ot': (12, ['failure'], 302),
+    'operation-list': (12, []),
+    'operation-update': (10, ['operation']),
+    'operation-delete': (10, ['operation']),
+    'generate_asset_pdf': (26, ['asset']),
+    'add-location': (8, []),
+    'view-location': (6, ['location']),
+    'add-document': (9, ['asset']),
+    'rq-list': (13, []),
+    'edit-solicitud': (7, ['solicitud'], 405),
+    'approve-solicitud': (10, ['solicitud'], 302),
+    'update-sc': (7, ['solicitud'], 302),
+    'generate-system-pdf': (19, ['asset', 'system']),
+    'create-solicitud': (10, ['asset']),
+    'create-solicitud-ot': (11, ['asset', 'ot']),
+    'meg-detail': (23, ['megger']),
+    'create_megger': (None, ['ot']),
+    'supply': (13, ['equipo']),
+    'buceomtto': (10, []),
+    'download_pdf': (6, []),
+    'asset-suministros': (10, ['asset']),
+}
+
+GROUPS = [
+    'super_members', 'serport_members', 'maq_members', 'buzos_members', 'gerencia',
+    'santamarta_station', 'ctg_station', 'guyana_station',
+]
+
+
+class QueryBudgetTableTests(SimpleTestCase):
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(sorted(names - QUERY_BUDGETS.keys()), [], 'Vistas sin presupuesto de consultas')
+        self.assertEqual(sorted(QUERY_BUDGETS.keys() - names), [], 'Presupuestos de vistas que ya no existen')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    GOT_METRICS_ENABLED=False,
+    GOT_PDF_ASYNC=False,
+)
+class QueryBudgetTests(TestCase):
+    '''Cada vista de got, con un supervisor, contra una flota sintética de `assets` activos.'''
+
+    assets = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        build_fleet(assets=cls.assets, systems=4, years=0.1, ots=3, seed=7)
+
+        cls.user = User.objects.create_superuser('presupuesto', 'presupuesto@example.com', 'x')
+        for name in GROUPS:
+            group = Group.objects.create(name=name)
+            if name == 'super_members':
+                cls.user.groups.add(group)
+
+        asset = Asset.objects.filter(area='a').order_by('abbreviation').first()
+        system = System.objects.filter(asset=asset, group=200).first()
+        equipo = Equipo.objects.filter(system=system, tipo='r').order_by('code').first()
+        ot = Ot.objects.filter(system__asset=asset).order_by('num_ot').first()
+        megger = Megger.objects.create(ot=ot, equipo=equipo)
+        for model in (Estator, Excitatriz, RotorMain, RotorAux, RodamientosEscudos):
+            model.objects.create(megger=megger)
+
+        cls.objects = {
+            'asset': asset.pk,
+            'system': system.pk,
+            'equipo': equipo.pk,
+            'ot': ot.pk,
+            'task': Task.objects.filter(ot=ot).order_by('id').first().pk,
+            'ruta': Ruta.objects.filter(system=system).order_by('code').first().pk,
+            'failure': FailureReport.objects.order_by('id').first().pk,
+            'operation': Operation.objects.filter(asset=asset).order_by('id').first().pk,
+            'location': Location.objects.create(name='Base', direccion='Muelle').pk,
+            'solicitud': Solicitud.objects.order_by('id').first().pk,
+            'megger': megger.pk,
+            'pdf_job': run_job(request_pdf('ot', ot.pk)).key,
+            'email_link': attachment_token(pdf_attachment('OT.pdf', 'ot', ot.pk)),
+        }
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        # Algunas vistas modifican datos en el GET: cada petición se revierte
+        counter = QueryCounter()
+        with transaction.atomic():
+            with connection.execute_wrapper(counter):
+                response = self.client.get(url)
+            transaction.set_rollback(True)
+        return response, counter.count
+
+    def test_query_budgets(self):
+        for name, (budget, args, *status) in QUERY_BUDGETS.items():
+            if budget is None:
+                continue
+            with self.subTest(view=name):
+                url = reverse(f'got:{name}', args=[self.objects[key] for key in args])
+                response, queries = self.count_queries(url)
+                self.assertEqual(response.status_code, status[0] if status else 200)
+                self.assertLessEqual(queries, budget, f'{name}: {queries} consultas (presupuesto {budget})')
+
+
+class LargeFleetQueryBudgetTests(QueryBudgetTests):
+
+    assets = 100
+
+
+class SeedFleetTests(SimpleTestCase):
+
+    def test_refuses_a_remote_database(self):
+        remote = mock.Mock(settings_dict={'HOST': 'db.example.us-east-1.rds.amazonaws.com'})
+        with mock.patch('got.synthetic.connection', remote), \
+                mock.patch('got.management.commands.seed_fleet.build_fleet') as build:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('seed_fleet', stdout=StringIO())
+        build.assert_not_called()
+
+    def test_benchmark_refuses_a_remote_database(self):
+        remote = mock.Mock(settings_dict={'HOST': 'db.example.us-east-1.rds.amazonaws.com'})
+        with mock.patch('got.synthetic.connection', remote), \
+                mock.patch('got.management.commands.benchmark.run_benchmark') as run:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('benchmark', stdout=StringIO())
+        run.assert_not_called()
+
+
+@override_settings(GOT_METRICS_ENABLED=True, GOT_METRICS_SAMPLE_RATE=1)
+class RequestMetricsTests(TestCase):
+    '''Medición por petición de las vistas de got (got/middleware.py).'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('medidor', 'medidor@example.com', 'x')
+        for abbreviation in ('MA', 'MB'):
+            Asset.objects.create(abbreviation=abbreviation, name=f'Barco {abbreviation}', area='a')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sampled_request_is_stored(self):
+        response = self.client.get(reverse('got:asset-list'))
+        metric = RequestMetric.objects.get()
+        self.assertEqual((metric.url_name, metric.path, metric.method), ('got:asset-list', reverse('got:asset-list'), 'GET'))
+        self.assertEqual(metric.status, 200)
+        self.assertEqual(metric.response_size, len(response.content))
+        self.assertGreater(metric.queries, 0)
+        self.assertGreater(metric.total_time, 0)
+        self.assertGreaterEqual(metric.duplicate_queries, sum(item['count'] - 1 for item in metric.duplicates))
+
+    def test_repeated_queries_share_a_fingerprint(self):
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            for abbreviation in ('MA', 'MB'):
+                Asset.objects.filter(abbreviation=abbreviation).exists()
+            # Listas IN de distinto largo son la misma consulta
+            list(Asset.objects.filter(abbreviation__in=['MA']).values_list('pk'))
+            list(Asset.objects.filter(abbreviation__in=['MA', 'MB', 'MC']).values_list('pk'))
+        self.assertEqual(metrics.queries, 4)
+        self.assertEqual(sorted(item['count'] for item in metrics.duplicates()), [2, 2])
+        self.assertTrue(any('IN (...)' in item['sql'] for item in metrics.duplicates()))
+
+    @override_settings(GOT_METRICS_SAMPLE_RATE=0.1)
+    def test_unsampled_requests_write_nothing(self):
+        with mock.patch('got.middleware.random.random', return_value=0.5):
+            self.assertEqual(self.client.get(reverse('got:asset-list')).status_code, 200)
+        self.assertFalse(RequestMetric.objects.exists())
+
+        with mock.patch('got.middleware.random.random', return_value=0.05):
+            self.client.get(reverse('got:asset-list'))
+        self.assertEqual(RequestMetric.objects.count(), 1)
+
+
+class CountingBackend(LocmemBackend):
+    '''locmem que cuenta las conexiones abiertas.'''
+
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class DisconnectingBackend(BaseEmailBackend):
+    '''Servidor que corta la conexión en cada envío (error transitorio).'''
+
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPServerDisconnected('Conexión cerrada')
+
+
+class SizeLimitedBackend(LocmemBackend):
+    '''Servidor con un tope menor que GOT_EMAIL_MAX_BYTES: rechaza todo mensaje con adjuntos.'''
+
+    def send_messages(self, email_messages):
+        if any(message.attachments for message in email_messages):
+            raise smtplib.SMTPSenderRefused(552, b'Message size exceeds fixed limit', 'auxiliarmto@serport.co')
+        return super().send_messages(email_messages)
+
+
+class RefusingBackend(BaseEmailBackend):
+    '''Servidor que rechaza el mensaje por tamaño (error definitivo).'''
+
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPSenderRefused(552, b'Message size exceeds fixed limit', 'auxiliarmto@serport.co')
+
+
+@override_settings(
+    EMAIL_BACKEND='got.tests.CountingBackend',
+    GOT_EMAIL_ASYNC=True,
+    GOT_PDF_ASYNC=False,
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class OutboxTests(TestCase):
+    '''Cola de correos salientes, drenada con backends locales en vez de SMTP.'''
+
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def due(self):
+        OutboundEmail.objects.update(next_attempt=timezone.now())
+
+    def test_queued_emails_wait_for_the_worker(self):
+        for number in range(3):
+            queue_email(f'Correo {number}', 'Cuerpo', ['destino@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_pending(), 3)
+        self.assertEqual([message.subject for message in mail.outbox], ['Correo 0', 'Correo 1', 'Correo 2'])
+        self.assertEqual(CountingBackend.opened, 1, 'Una conexión por lote')
+        self.assertFalse(OutboundEmail.objects.exclude(state='s').exists())
+        self.assertEqual(send_pending(), 0)
+
+    def test_attachments_are_read_when_sending(self):
+        name = default_storage.save('pdfs/contratista.pdf', ContentFile(b'%PDF-1.4 contratista'))
+        queue_email('Con adjuntos', 'Cuerpo', ['destino@example.com'], attachments=[
+            storage_attachment('Contratista.pdf', name, 'application/pdf'),
+            storage_attachment('Borrado.pdf', 'pdfs/no-existe.pdf', 'application/pdf'),
+        ])
+        with self.assertLogs('got.outbox', 'WARNING'):
+            send_pending()
+        self.assertEqual(mail.outbox[0].attachments, [('Contratista.pdf', b'%PDF-1.4 contratista', 'application/pdf')])
+
+    @override_settings(EMAIL_BACKEND='got.tests.DisconnectingBackend')
+    def test_transient_errors_retry_with_backoff(self):
+        email = queue_email('Reintento', 'Cuerpo', ['destino@example.com'])
+        with self.assertLogs('got.outbox', 'WARNING'):
+            self.assertEqual(send_pending(), 0)
+        email.refresh_from_db()
+        self.assertEqual((email.state, email.attempts), ('p', 1))
+        self.assertGreater(email.next_attempt, timezone.now() + outbox.BACKOFF_BASE - timedelta(seconds=5))
+        self.assertIn('SMTPServerDisconnected', email.error)
+
+        # Antes de su turno no se reintenta; la espera se duplica en cada fallo
+        send_pending()
+        self.assertEqual(OutboundEmail.objects.get().attempts, 1)
+        self.due()
+        with self.assertLogs('got.outbox', 'WARNING'):
+            send_pending()
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertGreater(email.next_attempt, timezone.now() + 2 * outbox.BACKOFF_BASE - timedelta(seconds=5))
+
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            self.due()
+            self.assertEqual(send_pending(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.state, email.attempts, email.error), ('s', 3, ''))
+
+    @override_settings(EMAIL_BACKEND='got.tests.DisconnectingBackend')
+    def test_gives_up_after_max_attempts(self):
+        queue_email('Sin servidor', 'Cuerpo', ['destino@example.com'])
+        with self.assertLogs('got.outbox', 'WARNING') as logs:
+            for _ in range(outbox.MAX_ATTEMPTS):
+                self.due()
+                send_pending()
+        self.assertTrue(logs.output[-1].startswith('ERROR'))
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.state, email.attempts), ('e', outbox.MAX_ATTEMPTS))
+
+    @override_settings(EMAIL_BACKEND='got.tests.RefusingBackend')
+    def test_permanent_errors_are_not_retried(self):
+        queue_email('Muy grande', 'Cuerpo', ['destino@example.com'])
+        with self.assertLogs('got.outbox', 'ERROR'):
+            send_pending()
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.state, email.attempts), ('e', 1))
+        self.assertIn('552', email.error)
+
+    @override_settings(GOT_EMAIL_ASYNC=False)
+    def test_sync_mode_sends_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_email('En línea', 'Cuerpo', ['destino@example.com'])
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.get().state, 's')
+
+    def test_finishing_an_ot_queues_the_report(self):
+        supervisor = User.objects.create_user('supervisor', 'supervisor@example.com', 'x')
+        asset = Asset.objects.create(abbreviation='OBX', name='Outbox', supervisor=supervisor)
+        system = System.objects.create(name='Propulsión', group=200, asset=asset)
+        ot = Ot.objects.create(system=system, description='Cambio de aceite', super=supervisor, tipo_mtto='p')
+        Task.objects.create(ot=ot, responsible=supervisor, description='Drenar aceite', finished=True)
+        self.client.force_login(supervisor)
+
+        response = self.client.post(reverse('got:ot-detail', args=[ot.pk]), {'finish_ot': 'true'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, ['supervisor@example.com'])
+        self.assertEqual(email.attachments, [pdf_attachment(f'OT_{ot.pk}_Detalle.pdf', 'ot', ot.pk)])
+
+        send_pending()
+        filename, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual((filename, mimetype), (f'OT_{ot.pk}_Detalle.pdf', 'application/pdf'))
+        self.assertTrue(content.startswith(b'%PDF'))
+
+
+    def link_path(self, body):
+        return re.search(r'https://got\.example\.com(/\S+)', body).group(1)
+
+    @override_settings(GOT_EMAIL_MAX_BYTES=1000)
+    def test_attachments_over_the_limit_become_signed_links(self):
+        small = default_storage.save('pdfs/acta.pdf', ContentFile(b'%PDF' + b'a' * 300))
+        large = default_storage.save('pdfs/contratista.pdf', ContentFile(b'%PDF' + b'b' * 5000))
+        queue_email('Grande', 'Cuerpo', ['destino@example.com'], site_url='https://got.example.com/', attachments=[
+            storage_attachment('Contratista.pdf', large, 'application/pdf'),
+            storage_attachment('Acta.pdf', small, 'application/pdf'),
+        ])
+        send_pending()
+
+        message = mail.outbox[0]
+        self.assertEqual([name for name, _, _ in message.attachments], ['Acta.pdf'])
+        self.assertIn('- Contratista.pdf (', message.body)
+
+        response = self.client.get(self.link_path(message.body))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF' + b'b' * 5000)
+        self.assertIn('Contratista.pdf', response['Content-Disposition'])
+
+    def test_links_expire_and_reject_tampering(self):
+        name = default_storage.save('pdfs/contratista.pdf', ContentFile(b'%PDF'))
+        path = reverse('got:email-attachment', args=[attachment_token(storage_attachment('C.pdf', name))])
+        self.assertEqual(self.client.get(path[:-3] + 'x/').status_code, 404)
+        with mock.patch.object(outbox, 'LINK_MAX_AGE', timedelta(seconds=-1)):
+            self.assertEqual(self.client.get(path).status_code, 410)
+
+    def test_images_are_downsampled(self):
+        buffer = BytesIO()
+        PILImage.linear_gradient('L').resize((4000, 3000)).convert('RGB').save(buffer, 'PNG')
+        name = default_storage.save('media/evidencia.png', ContentFile(buffer.getvalue()))
+        queue_email('Foto', 'Cuerpo', ['destino@example.com'], attachments=[
+            storage_attachment('Evidencia.png', name, 'image/png'),
+        ])
+        send_pending()
+
+        filename, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual((filename, mimetype), ('Evidencia.jpg', 'image/jpeg'))
+        self.assertLess(len(content), len(buffer.getvalue()))
+        self.assertEqual(PILImage.open(BytesIO(content)).size, (1600, 1200))
+
+    @override_settings(EMAIL_BACKEND='got.tests.SizeLimitedBackend')
+    def test_size_rejection_is_resent_with_links(self):
+        name = default_storage.save('pdfs/contratista.pdf', ContentFile(b'%PDF'))
+        queue_email('Rechazado', 'Cuerpo', ['destino@example.com'], site_url='https://got.example.com/', attachments=[
+            storage_attachment('Contratista.pdf', name, 'application/pdf'),
+        ])
+        with self.assertLogs('got.outbox', 'WARNING'):
+            self.assertEqual(send_pending(), 1)
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.state, email.links_only, email.attempts), ('s', True, 2))
+        self.assertEqual(mail.outbox[0].attachments, [])
+        self.assertEqual(self.client.get(self.link_path(mail.outbox[0].body)).status_code, 200)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    GOT_EMAIL_ASYNC=True,
+    GOT_NOTIFICATIONS={'solicitud': 'd', 'falla': 'h', 'falla_critica': 'i'},
+    GOT_DIGEST_HOUR=7,
+)
+class NotificationTests(TestCase):
+    '''Resúmenes de notificaciones: un correo por destinatario en vez de uno por evento.'''
+
+    def test_due_follows_the_frequency(self):
+        now = timezone.make_aware(datetime(2026, 10, 18, 10, 20))
+        self.assertEqual(next_due('i', now), now)
+        self.assertEqual(next_due('h', now), timezone.make_aware(datetime(2026, 10, 18, 11, 0)))
+        self.assertEqual(next_due('d', now), timezone.make_aware(datetime(2026, 10, 19, 7, 0)))
+        self.assertEqual(next_due('d', now.replace(hour=6)), timezone.make_aware(datetime(2026, 10, 18, 7, 0)))
+
+    def test_events_are_grouped_per_recipient(self):
+        notify('solicitud', ['a@example.com', 'b@example.com'], 'Solicitud 1', 'Detalle 1')
+        notify('solicitud', ['a@example.com'], 'Solicitud 2', 'Detalle 2')
+        self.assertEqual(queue_digests(), 0)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+        self.assertEqual(queue_digests(timezone.now() + timedelta(days=1)), 2)
+        self.assertFalse(Notification.objects.filter(queued__isnull=True).exists())
+        send_pending()
+        emails = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(emails['a@example.com'].subject, 'Resumen GOT: 2 solicitudes de suministros')
+        self.assertIn('Detalle 1', emails['a@example.com'].body)
+        self.assertIn('Detalle 2', emails['a@example.com'].body)
+        self.assertEqual((emails['b@example.com'].subject, emails['b@example.com'].body.strip()), ('Solicitud 1', 'Detalle 1'))
+
+    def test_digest_is_plain_text(self):
+        notify('solicitud', ['a@example.com'], 'Solicitud 1', 'Filtro "Racor" & O\'ring <2">')
+        notify('solicitud', ['a@example.com'], 'Solicitud 2', 'Aceite 15W-40 & grasa')
+        queue_digests(timezone.now() + timedelta(days=1))
+        send_pending()
+        body = mail.outbox[0].body
+        self.assertIn('Filtro "Racor" & O\'ring <2">', body)
+        self.assertIn('Aceite 15W-40 & grasa', body)
+        self.assertNotIn('&amp;', body)
+
+    def test_critical_events_go_out_at_once_with_pending_ones(self):
+        notify('falla', ['a@example.com'], 'Falla menor', 'Detalle menor')
+        notify('falla_critica', ['a@example.com', 'b@example.com'], 'Falla crítica', 'Detalle crítico')
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+        send_pending()
+        emails = {message.to[0]: message for message in mail.outbox}
+        self.assertIn('Detalle menor', emails['a@example.com'].body)
+        self.assertEqual(emails['b@example.com'].subject, 'Falla crítica')
+        self.assertEqual(queue_digests(timezone.now() + timedelta(days=1)), 0)
+
+    def test_new_solicitud_waits_for_the_daily_digest(self):
+        user = User.objects.create_user('solicitante', 'solicitante@example.com', 'x')
+        Solicitud.objects.create(solicitante=user, suministros='Filtros de aceite')
+        notification = Notification.objects.get()
+        self.assertEqual((notification.kind, notification.frequency), ('solicitud', 'd'))
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_worker_survives_errors(self):
+        worker = 'got.management.commands.email_worker'
+        with mock.patch(f'{worker}.queue_digests'), \
+                mock.patch(f'{worker}.send_pending', side_effect=[smtplib.SMTPServerDisconnected('caída'), 0]) as send, \
+                mock.patch(f'{worker}.time.sleep', side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs(worker, 'ERROR'):
+            call_command('email_worker', stdout=StringIO())
+        self.assertEqual(send.call_count, 2)
+
+
+@override_settings(GOT_METRICS_ENABLED=False)
+class GroupCacheTests(TestCase):
+    '''Grupos del usuario: una consulta por petición y, con caché, ninguna en las siguientes.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('supervisor', 'supervisor@example.com', 'x')
+        cls.groups = {name: Group.objects.create(name=name) for name in GROUPS}
+        cls.user.groups.add(cls.groups['super_members'])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sum('auth_user_groups' in query['sql'] for query in context.captured_queries)
+
+    def test_one_group_query_per_page(self):
+        self.assertEqual(self.group_queries(reverse('got:asset-list')), 1)
+
+    @override_settings(GOT_GROUPS_CACHE_TIMEOUT=60)
+    def test_cached_groups_are_invalidated_on_change(self):
+        url = reverse('got:asset-list')
+        self.assertEqual(self.group_queries(url), 1)
+        self.assertEqual(self.group_queries(url), 0)
+
+        self.groups['gerencia'].user_set.add(self.user)
+        self.assertEqual(self.group_queries(url), 1)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(group_names(user), {'super_members', 'gerencia'})
+
+        self.user.groups.remove(self.groups['gerencia'])
+        self.assertEqual(group_names(self.user), {'super_members'})
+        self.groups['super_members'].name = 'supervisores'
+        self.groups['super_members'].save()
+        self.assertEqual(group_names(User.objects.get(pk=self.user.pk)), {'supervisores'})
+
+
+@override_settings(GOT_METRICS_ENABLED=False)
+class ScopeTests(TestCase):
+    '''Alcance por rol: cada vista conserva las reglas de visibilidad que tenía (VIEW_RULES).'''
+
+    @classmethod
+    def setUpTestData(cls):
+        groups = {name: Group.objects.create(name=name) for name in GROUPS}
+        roles = {
+            'super': ['super_members'],
+            'maq': ['maq_members'],
+            'buzo_ctg': ['buzos_members', 'ctg_station'],
+            'buzo': ['buzos_members'],
+            'serport': ['serport_members'],
+            'nobody': [],
+            'super_maq': ['super_members', 'maq_members'],
+        }
+        cls.users = {}
+        for name, group_names in roles.items():
+            cls.users[name] = User.objects.create_user(name, f'{name}@example.com', 'x')
+            cls.users[name].groups.add(*[groups[group] for group in group_names])
+        cls.maq = cls.users['maq']
+
+        cls.ship = Asset.objects.create(abbreviation='BAR', name='Barco', area='a', supervisor=cls.maq)
+        other = Asset.objects.create(abbreviation='OTR', name='Otro barco', area='a', supervisor=cls.users['super_maq'])
+        cls.diving = Asset.objects.create(abbreviation='BUC', name='Buceo', area='b')
+        cls.ots, cls.tasks, cls.failures, cls.solicitudes = {}, {}, {}, {}
+        places = (
+            ('BAR', cls.ship, 'Cartagena'), ('OTR', other, 'Cartagena'),
+            ('BUC-C', cls.diving, 'Cartagena'), ('BUC-G', cls.diving, 'Guyana'),
+        )
+        for key, asset, location in places:
+            system = System.objects.create(name=f'Sistema {location}', group=100, location=location, asset=asset)
+            equipo = Equipo.objects.create(code=f'{key}-1', name='Compresor', system=system, tipo='r', feature='')
+            cls.ots[key] = ot = Ot.objects.create(system=system, description='Mantenimiento')
+            responsible = cls.users['serport'] if key == 'OTR' else cls.maq
+            cls.tasks[key] = Task.objects.create(
+                ot=ot, responsible=responsible, description='Revisión', finished=False, start_date=date(2026, 10, 1),
+            )
+            cls.failures[key] = FailureReport.objects.create(
+                reporter=cls.maq, equipo=equipo, description='Falla', causas='Desgaste', critico=False,
+            )
+        for asset in (cls.ship, other, cls.diving):
+            cls.solicitudes[asset.pk] = Solicitud.objects.create(solicitante=cls.maq, asset=asset, suministros='Filtros')
+
+    def visible(self, user, url, key='object_list'):
+        self.client.force_login(self.users[user])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {obj.pk for obj in response.context[key]}
+
+    def expect(self, objects, keys):
+        return {objects[key].pk for key in keys}
+
+    def test_every_role_in_every_view(self):
+        everything = ['BAR', 'OTR', 'BUC-C', 'BUC-G']
+        diving = ['BUC-C', 'BUC-G']
+        visible = {
+            # rol: (actividades, OTs y fallas, activos (lista y filtro de OTs), solicitudes)
+            'super': (everything, everything, ['BAR', 'OTR', 'BUC'], ['BAR', 'OTR', 'BUC']),
+            'maq': (['BAR'], ['BAR'], ['BAR', 'OTR', 'BUC'], ['BAR']),
+            'buzo_ctg': (['BUC-C'], diving, ['BUC'], ['BAR', 'OTR', 'BUC']),
+            'buzo': (diving, diving, ['BUC'], ['BAR', 'OTR', 'BUC']),
+            'serport': (['OTR'], everything, ['BAR', 'OTR', 'BUC'], ['BAR', 'OTR', 'BUC']),
+            'nobody': ([], everything, ['BAR', 'OTR', 'BUC'], ['BAR', 'OTR', 'BUC']),
+            # Supervisor que también es super: todas las actividades, pero OTs, fallas y solicitudes de sus activos
+            'super_maq': (everything, ['OTR'], ['BAR', 'OTR', 'BUC'], ['OTR']),
+        }
+        for user, (tasks, ots, assets, solicitudes) in visible.items():
+            with self.subTest(user=user):
+                self.assertEqual(self.visible(user, reverse('got:my-tasks')), self.expect(self.tasks, tasks))
+                self.assertEqual(self.visible(user, reverse('got:ot-list')), self.expect(self.ots, ots))
+                self.assertEqual(self.visible(user, reverse('got:ot-list'), 'asset'), set(assets))
+                self.assertEqual(self.visible(user, reverse('got:failure-report-list')), self.expect(self.failures, ots))
+                self.assertEqual(self.visible(user, reverse('got:asset-list')), set(assets))
+                self.assertEqual(self.visible(user, reverse('got:rq-list')), self.expect(self.solicitudes, solicitudes))
+
+                # La búsqueda por palabra clave y el detalle de activo no filtran por rol
+                search = self.visible(user, reverse('got:ot-list') + '?keyword=Mantenimiento')
+                self.assertEqual(search, self.expect(self.ots, everything))
+                self.assertEqual(len(self.visible(user, reverse('got:asset-detail', args=['BUC']), 'add_sys')), 2)
+
+    @override_settings(GOT_SCOPE_CACHE_TIMEOUT=60, GOT_GROUPS_CACHE_TIMEOUT=60)
+    def test_cached_scope_follows_supervisor_changes(self):
+        self.assertEqual(user_scope(User.objects.get(pk=self.maq.pk)).restrictions['maq_members'][0], ('BAR',))
+        user = User.objects.get(pk=self.maq.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user_scope(user).restrictions['maq_members'][0], ('BAR',))
+
+        self.diving.supervisor = self.maq
+        self.diving.save()
+        self.assertEqual(sorted(user_scope(User.objects.get(pk=self.maq.pk)).restrictions['maq_members'][0]), ['BAR', 'BUC'])
+
+        self.maq.groups.clear()
+        self.assertFalse(user_scope(User.objects.get(pk=self.maq.pk)).roles)
+
+
+class ScheduleTests(TestCase):
+    '''Programación de rutinas: cálculo en Python, anotaciones SQL y columnas persistidas.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        cls.user = User.objects.create_user('tecnico', 'tecnico@example.com', 'x')
+        asset = Asset.objects.create(abbreviation='PRG', name='Programado')
+        cls.system = System.objects.create(name='Propulsión', group=200, asset=asset)
+        cls.equipo = Equipo.objects.create(
+            code='PRG-M1', name='Motor propulsor estribor', system=cls.system, tipo='r', feature='', prom_hours=10,
+        )
+        done = Ot.objects.create(system=cls.system, description='Mantenimiento', state='f', tipo_mtto='p')
+        running = Ot.objects.create(system=cls.system, description='En curso', state='x', tipo_mtto='p')
+        for days in range(1, 61):
+            HistoryHour.objects.create(
+                component=cls.equipo, report_date=cls.today - timedelta(days=days), hour=10, reporter=cls.user,
+            )
+
+        rutas = [
+            ('Diaria al día', 'd', 30, 5, done, None),
+            ('Diaria vencida', 'd', 30, 45, done, None),
+            ('Diaria en ejecución', 'd', 30, 28, running, None),
+            ('Horas con OT', 'h', 500, 40, done, cls.equipo),
+            ('Horas por vencer', 'h', 420, 40, done, cls.equipo),
+            ('Horas sin OT', 'h', 1000, 40, None, cls.equipo),
+            ('Kilómetros', 'k', 90, 10, done, None),
+        ]
+        cls.rutas = {
+            name: Ruta.objects.create(
+                name=name, control=control, frecuency=frecuency, intervention_date=cls.today - timedelta(days=days),
+                system=cls.system, ot=ot, equipo=equipo,
+            )
+            for name, control, frecuency, days, ot, equipo in rutas
+        }
+
+    def test_sql_schedule_matches_python(self):
+        for today in (self.today, self.today - timedelta(days=10)):
+            python = {ruta.pk: ruta for ruta in load_schedule(Ruta.objects.filter(system=self.system), today)}
+            for ruta in Ruta.objects.filter(system=self.system).with_schedule(today):
+                expected = python[ruta.pk]
+                with self.subTest(ruta=ruta.name, today=today):
+                    self.assertEqual(ruta.due_date, expected.next_date)
+                    self.assertEqual(ruta.days_left, expected.daysleft)
+                    self.assertEqual(ruta.remaining_pct, expected.percentage_remaining)
+                    self.assertEqual(ruta.schedule_status, expected.maintenance_status)
+
+    def test_sql_schedule_with_zero_frequency(self):
+        done, running = self.rutas['Horas con OT'].ot, self.rutas['Diaria en ejecución'].ot
+        rutas = [
+            Ruta.objects.create(
+                name=name, control=control, frecuency=0, intervention_date=self.today - timedelta(days=5),
+                system=self.system, ot=ot, equipo=equipo,
+            )
+            for name, control, ot, equipo in [
+                ('Diaria cero', 'd', done, None),
+                ('Diaria cero en ejecución', 'd', running, None),
+                ('Diaria cero sin OT', 'd', None, None),
+                ('Horas cero', 'h', done, self.equipo),
+            ]
+        ]
+        python = {ruta.pk: compute_schedule_fields(ruta, self.today) for ruta in load_schedule(rutas)}
+        for ruta in Ruta.objects.filter(pk__in=python).with_schedule(self.today):
+            with self.subTest(ruta=ruta.name):
+                self.assertIsNone(ruta.remaining_pct)
+                self.assertEqual(ruta.schedule_status, python[ruta.pk].status)
+        # La consolidación por sistema tampoco debe fallar
+        self.assertEqual(len(load_fleet_frame(Ruta.objects.filter(system=self.system), self.today)), 11)
+
+    def test_rollover_uses_the_given_date(self):
+        past = self.today - timedelta(days=10)
+        rollover_schedule(past)
+        ruta = Ruta.objects.get(pk=self.rutas['Horas con OT'].pk)
+        # 31 días de reportes de 10 h desde la intervención hasta la fecha del barrido, inclusive
+        self.assertEqual(ruta.hours_since_intervention, 310)
+        self.assertEqual(ruta.next_due_date, past + timedelta(days=19))
+
+        expected = load_schedule(Ruta.objects.filter(system=self.system), past)
+        for ruta in expected:
+            with self.subTest(ruta=ruta.name):
+                self.assertEqual(Ruta.objects.get(pk=ruta.pk).status, ruta.maintenance_status)
+
+    def test_backfill_does_not_report_old_overdue_rutas(self):
+        # Columnas recién agregadas por la migración, como antes del primer barrido
+        Ruta.objects.update(next_due_date=None, hours_since_intervention=0, status='e')
+        out = StringIO()
+        call_command('refresh_schedule', '--backfill', stdout=out)
+        self.assertNotIn('vencida desde', out.getvalue())
+        self.assertIn('0 pasaron a vencidas', out.getvalue())
+        ruta = Ruta.objects.get(pk=self.rutas['Diaria vencida'].pk)
+        self.assertEqual(ruta.next_due_date, self.today - timedelta(days=15))
+
+        Ruta.objects.update(next_due_date=None)
+        out = StringIO()
+        call_command('refresh_schedule', stdout=out)
+        self.assertIn('Diaria vencida', out.getvalue())
+
+    def assertScheduleIsFresh(self):
+        expected_rutas = {ruta.pk: compute_schedule_fields(ruta) for ruta in load_schedule(Ruta.objects.filter(system=self.system))}
+        for ruta in Ruta.objects.filter(system=self.system):
+            expected = expected_rutas[ruta.pk]
+            with self.subTest(ruta=ruta.name):
+                self.assertEqual(
+                    (ruta.next_due_date, ruta.hours_since_intervention, ruta.status),
+                    (expected.next_due_date, expected.hours_since_intervention, expected.status),
+                )
+        percentage = system_maintenance_percentage(load_fleet_frame(Ruta.objects.filter(system=self.system)))
+        self.assertEqual(SystemCompliance.objects.get(system=self.system).percentage, percentage[self.system.pk])
+
+    def test_deleting_ot_or_equipo_refreshes_its_rutas(self):
+        # Parte de columnas al día (los reportes de horas de setUpTestData no pasan por on_commit)
+        rollover_schedule()
+        self.assertScheduleIsFresh()
+        ruta = self.rutas['Diaria en ejecución']
+        self.assertEqual(Ruta.objects.get(pk=ruta.pk).status, 'p')
+        ruta.ot.delete()
+        self.assertEqual(Ruta.objects.get(pk=ruta.pk).status, 'e')
+        self.assertScheduleIsFresh()
+
+        self.equipo.delete()
+        self.assertFalse(Ruta.objects.filter(system=self.system, equipo__isnull=False).exists())
+        self.assertScheduleIsFresh()
+
+
+class ComplianceTests(TestCase):
+    '''El motor vectorizado de cumplimiento da lo mismo que los métodos por objeto de los modelos.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        build_fleet(assets=6, systems=4, years=0.2, ots=4, seed=11)
+
+    def test_asset_ind_mtto_matches_the_model(self):
+        indexes = asset_ind_mtto(load_fleet_frame())
+        self.assertGreater(len(indexes), 1)
+        for asset in Asset.objects.all():
+            with self.subTest(asset=asset.pk):
+                expected = asset.ind_mtto()
+                if expected == '---':
+                    self.assertNotIn(asset.pk, indexes)
+                else:
+                    self.assertAlmostEqual(indexes[asset.pk], float(expected.rstrip('%')), delta=0.01)
+
+    def test_ruta_status_matrix_matches_the_model(self):
+        frequencies = sorted(set(Ruta.objects.values_list('frecuency', flat=True)))[:5]
+        matrix = ruta_status_matrix(load_fleet_frame(), frequencies)
+        self.assertIn('Requiere', matrix.to_numpy())
+        for asset in Asset.objects.filter(pk__in=matrix.index):
+            for frecuency in frequencies:
+                with self.subTest(asset=asset.pk, frecuency=frecuency):
+                    self.assertEqual(matrix.loc[asset.pk, frecuency], asset.check_ruta_status(frecuency))
+
+    def test_system_compliance_matches_the_model(self):
+        stored = dict(SystemCompliance.objects.values_list('system_id', 'percentage'))
+        percentages = system_maintenance_percentage(load_fleet_frame())
+        self.assertGreater(percentages.nunique(), 1)
+        SystemCompliance.objects.all().delete()
+        for system in System.objects.filter(rutas__isnull=False).distinct():
+            with self.subTest(system=system.pk):
+                # Sin fila en SystemCompliance la propiedad vuelve al cálculo por rutina
+                self.assertAlmostEqual(percentages[system.pk], system.maintenance_percentage, delta=0.01)
+                self.assertAlmostEqual(stored[system.pk], system.maintenance_percentage, delta=0.01)
+
+
+class HoursTests(TestCase):
+    '''Horómetro, acumulados e importación de reportes de horas.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reportero', 'reportero@example.com', 'x')
+        cls.asset = asset = Asset.objects.create(abbreviation='HRS', name='Horas')
+        system = System.objects.create(name='Generación', group=300, asset=asset)
+        cls.equipo = Equipo.objects.create(code='HRS-G1', name='Motor generador 1', system=system, tipo='r', feature='', initial_hours=100)
+        cls.other = Equipo.objects.create(code='HRS-G2', name='Motor generador 2', system=system, tipo='r', feature='')
+
+    def horometro(self, equipo=None):
+        return Equipo.objects.get(pk=(equipo or self.equipo).pk).horometro
+
+    def report(self, day, hour, equipo=None):
+        return HistoryHour.objects.create(component=equipo or self.equipo, report_date=day, hour=hour, reporter=self.user)
+
+    def test_horometro_follows_each_reading(self):
+        self.assertEqual(self.horometro(), 100)
+        reading = self.report(date(2026, 10, 1), 8)
+        self.report(date(2026, 10, 2), 12)
+        self.assertEqual(self.horometro(), 120)
+
+        reading.hour = 10
+        reading.save()
+        self.assertEqual(self.horometro(), 122)
+
+        reading.component = self.other
+        reading.save()
+        self.assertEqual((self.horometro(), self.horometro(self.other)), (112, 10))
+
+        reading.delete()
+        self.assertEqual((self.horometro(), self.horometro(self.other)), (112, 0))
+
+    def test_equipo_edits_keep_the_stored_horometro(self):
+        stale = Equipo.objects.get(pk=self.equipo.pk)
+        self.report(date(2026, 10, 1), 8)
+        stale.initial_hours = 150
+        stale.save()
+        self.assertEqual(self.horometro(), 158)
+
+        # Un horómetro guardado en 0 no se confunde con uno vacío
+        Equipo.objects.filter(pk=self.other.pk).update(horometro=0, initial_hours=40)
+        other = Equipo.objects.get(pk=self.other.pk)
+        other.name = 'Motor generador babor'
+        other.save()
+        self.assertEqual(self.horometro(self.other), 0)
+
+    def rollups(self, equipo=None):
+        return {
+            (rollup.period, rollup.start): (rollup.total, rollup.reports)
+            for rollup in HourRollup.objects.filter(component=equipo or self.equipo)
+        }
+
+    def test_rollups_follow_edits_and_moves(self):
+        # 2026-09-30 es miércoles: misma semana que el 1 de octubre, otro mes
+        reading = self.report(date(2026, 9, 30), 8)
+        self.report(date(2026, 10, 1), 6)
+        self.assertEqual(self.rollups(), {
+            ('w', date(2026, 9, 28)): (14, 2),
+            ('m', date(2026, 9, 1)): (8, 1),
+            ('m', date(2026, 10, 1)): (6, 1),
+        })
+
+        reading.hour = 10
+        reading.save()
+        self.assertEqual(self.rollups()[('w', date(2026, 9, 28))], (16, 2))
+
+        reading.report_date = date(2026, 10, 5)
+        reading.save()
+        self.assertEqual(self.rollups(), {
+            ('w', date(2026, 9, 28)): (6, 1),
+            ('w', date(2026, 10, 5)): (10, 1),
+            ('m', date(2026, 10, 1)): (16, 2),
+        })
+
+        reading.component = self.other
+        reading.save()
+        self.assertEqual(self.rollups(), {
+            ('w', date(2026, 9, 28)): (6, 1),
+            ('m', date(2026, 10, 1)): (6, 1),
+        })
+        self.assertEqual(self.rollups(self.other), {
+            ('w', date(2026, 10, 5)): (10, 1),
+            ('m', date(2026, 10, 1)): (10, 1),
+        })
+
+    def test_schedule_is_refreshed_once_per_transaction(self):
+        with mock.patch('got.hours.refresh_schedule') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for day in range(1, 11):
+                    self.report(date(2026, 10, day), 8)
+                self.report(date(2026, 10, 1), 4, equipo=self.other)
+                refresh.assert_not_called()
+        self.assertEqual(refresh.call_count, 1)
+        # El horómetro sí se actualiza en cada reporte
+        self.assertEqual(self.horometro(), 180)
+
+    def test_hours_grid_covers_the_whole_window(self):
+        end = date(2026, 10, 31)
+        dates = [end - timedelta(days=x) for x in range(30)]
+        start = dates[-1]
+        for day, hour in ((start - timedelta(days=1), 24), (start, 5), (date(2026, 10, 15), 7.5), (end, 8), (end + timedelta(days=1), 24)):
+            self.report(day, hour)
+
+        grid = hours_grid([self.other, self.equipo], dates)
+        self.assertEqual(list(grid.index), [self.other.code, self.equipo.code])
+        self.assertEqual(list(grid.columns), dates)
+        row = dict(zip(dates, grid.loc[self.equipo.code]))
+        # Los extremos entran; el día anterior y el siguiente no; los días sin reporte van en 0
+        self.assertEqual((row[start], row[date(2026, 10, 15)], row[end]), (5, 7.5, 8))
+        self.assertEqual(sum(row.values()), 20.5)
+        self.assertEqual(sum(1 for value in row.values() if value == 0), 27)
+        self.assertEqual(list(grid.loc[self.other.code]), [0] * 30)
+
+    @override_settings(GOT_METRICS_ENABLED=False)
+    def test_hours_grid_csv_export(self):
+        today = date.today()
+        self.report(today, 8)
+        self.report(today - timedelta(days=29), 6)
+        self.report(today - timedelta(days=30), 24)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('got:horas-asset', args=[self.asset.pk]), {'format': 'csv', 'days': 30})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="horas_HRS_30d.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(response.content.decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['Componente', 'Horometro', today.strftime('%d/%m/%Y')])
+        self.assertEqual(rows[0][-1], (today - timedelta(days=29)).strftime('%d/%m/%Y'))
+        self.assertEqual(len(rows[0]), 32)
+
+        exported = {row[0]: row[1:] for row in rows[1:]}
+        self.assertEqual(set(exported), {'Motor generador 1', 'Motor generador 2'})
+        horometro, *hours = exported['Motor generador 1']
+        self.assertEqual(float(horometro), 138)
+        self.assertEqual([float(hour) for hour in hours], [8] + [0] * 28 + [6])
+        self.assertEqual([float(hour) for hour in exported['Motor generador 2'][1:]], [0] * 30)
+
+    def test_import_hours_upserts_and_reports_bad_rows(self):
+        self.report(date(2026, 10, 1), 8)
+        rows = parse_hour_rows(
+            'component,report_date,hour\n'
+            'HRS-G1,2026-10-01,10\n'
+            'HRS-G1,2026-10-02,6\n'
+            'NOPE,2026-10-02,6\n'
+            'HRS-G1,2026-10-03,30\n'
+            'HRS-G1,ayer,5\n'
+        )
+        saved, errors = import_hours(rows, reporter=self.user)
+
+        self.assertEqual(saved, 2)
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith('Fila 3:'))
+        self.assertTrue(errors[1].startswith('Fila 4:'))
+        self.assertTrue(errors[2].startswith('Fila 5:'))
+        self.assertEqual(
+            dict(HistoryHour.objects.filter(component=self.equipo).values_list('report_date', 'hour')),
+            {date(2026, 10, 1): 10, date(2026, 10, 2): 6},
+        )
+        self.assertEqual(self.horometro(), 116)
+
+    def test_parse_hour_rows_requires_the_columns(self):
+        with self.assertRaises(ValueError):
+            parse_hour_rows('equipo,fecha,horas\nHRS-G1,2026-10-01,8\n')
+
+    @override_settings(GOT_METRICS_ENABLED=False)
+    def test_import_view_only_redirects_to_this_site(self):
+        self.client.force_login(self.user)
+        for next_url, expected in (
+            ('https://evil.example/', reverse('got:asset-list')),
+            ('//evil.example/', reverse('got:asset-list')),
+            ('', reverse('got:asset-list')),
+            ('/got/asset/HRS/', '/got/asset/HRS/'),
+        ):
+            upload = ContentFile(b'component,report_date,hour\nHRS-G1,2026-10-01,8\n', name='horas.csv')
+            response = self.client.post(reverse('got:horas-importar'), {'archivo': upload, 'next': next_url})
+            with self.subTest(next=next_url):
+                self.assertRedirects(response, expected, fetch_redirect_response=False)
+
+
+class ForecastTests(TestCase):
+    '''Proyección de uso con un historial conocido (182 días, got/forecast.py).'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pronostico', 'pronostico@example.com', 'x')
+        cls.today = date.today()
+        cls.asset = Asset.objects.create(abbreviation='FCS', name='Pronóstico')
+        system = System.objects.create(name='Propulsión', group=200, asset=cls.asset)
+        cls.equipo = Equipo.objects.create(code='FCS-M1', name='Motor principal', system=system, tipo='r', feature='')
+        cls.system = system
+
+    def history(self, hours_by_age):
+        HistoryHour.objects.bulk_create([
+            HistoryHour(component=self.equipo, report_date=self.today - timedelta(days=age), hour=hour, reporter=self.user)
+            for age, hour in enumerate(hours_by_age)
+        ])
+        recalculate_horometros([self.equipo.code])
+
+    def ruta(self, frecuency):
+        return Ruta.objects.create(
+            name='Overhaul', control='h', frecuency=frecuency, intervention_date=self.today - timedelta(days=400),
+            system=self.system, equipo=self.equipo,
+        )
+
+    def test_constant_usage(self):
+        self.history([10] * 182)
+        ruta = self.ruta(1820 + 400)
+
+        ruta.refresh_from_db()
+        self.equipo.refresh_from_db()
+        self.assertEqual(self.equipo.usage_rate, 10)
+        self.assertEqual(ruta.forecast_date, self.today + timedelta(days=40))
+
+    def test_new_reading_updates_the_forecast(self):
+        self.history([10] * 182)
+        ruta = self.ruta(1820 + 400)
+
+        # Hoy 20 h en vez de 10: horómetro 1830 y tasa suavizada de 10,5 h/día (38 días para 390 h)
+        reading = HistoryHour.objects.get(component=self.equipo, report_date=self.today)
+        reading.hour = 20
+        with self.captureOnCommitCallbacks(execute=True):
+            reading.save()
+
+        ruta.refresh_from_db()
+        self.assertEqual(ruta.forecast_date, self.today + timedelta(days=38))
+
+    def test_operation_calendar(self):
+        # 10 días en operación a 20 h y el resto a 2 h; la operación sigue 5 días más
+        self.history([20] * 10 + [2] * 172)
+        Operation.objects.create(
+            asset=self.asset, proyecto='Campaña', requirements='',
+            start=self.today - timedelta(days=9), end=self.today + timedelta(days=5),
+        )
+        ruta = self.ruta(200 + 344 + 160)
+
+        # 160 h restantes: 5 días a 20 h y 30 a 2 h
+        ruta.refresh_from_db()
+        self.assertEqual(ruta.forecast_date, self.today + timedelta(days=35))
+
+    def test_only_hour_rutas_keep_a_forecast(self):
+        self.history([10] * 182)
+        ruta = self.ruta(1820 + 400)
+        ruta.control = 'd'
+        ruta.frecuency = 90
+        ruta.save()
+
+        ruta.refresh_from_db()
+        self.assertIsNone(ruta.forecast_date)
+
+
+@override_settings(GOT_PDF_ASYNC=False)
+class PdfCacheTests(TestCase):
+    '''PDFs en caché: un cambio en los datos del reporte produce un PDF nuevo.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('inspector', 'inspector@example.com', 'x')
+        cls.asset = Asset.objects.create(abbreviation='PDF', name='Remolcador')
+        cls.system = System.objects.create(name='Propulsión', group=200, asset=cls.asset)
+        cls.equipo = Equipo.objects.create(code='PDF-M1', name='Motor principal', system=cls.system, tipo='r', feature='')
+        cls.ot = Ot.objects.create(system=cls.system, description='Cambio de sellos', tipo_mtto='c')
+        cls.failure = FailureReport.objects.create(
+            reporter=cls.user, equipo=cls.equipo, description='Fuga en el sello', causas='Desgaste',
+            critico=False, related_ot=cls.ot,
+        )
+        Ruta.objects.create(
+            name='Overhaul', control='h', frecuency=500, intervention_date=date.today() - timedelta(days=30),
+            system=cls.system, equipo=cls.equipo,
+        )
+
+    def pdf(self, kind, *args):
+        return run_job(request_pdf(kind, *args, engine='html'))
+
+    def assertNewPdf(self, kind, *args, change):
+        before = self.pdf(kind, *args)
+        self.assertEqual(request_pdf(kind, *args, engine='html').pk, before.pk)
+        change()
+        after = self.pdf(kind, *args)
+        self.assertNotEqual(after.key, before.key)
+        self.assertEqual(after.state, 'f')
+        self.assertTrue(PdfJob.objects.get(pk=before.pk).stale)
+
+    def test_failure_report_edit(self):
+        def change():
+            self.failure.description = 'Fuga en el sello del eje'
+            self.failure.save()
+        self.assertNewPdf('ot', self.ot.pk, change=change)
+
+    def test_equipo_edit(self):
+        def change():
+            self.equipo.name = 'Motor principal babor'
+            self.equipo.save()
+        self.assertNewPdf('system', self.asset.pk, self.system.pk, change=change)
+
+    def test_asset_and_system_edit(self):
+        def rename_asset():
+            self.asset.name = 'Remolcador Orión'
+            self.asset.save()
+        self.assertNewPdf('ot', self.ot.pk, change=rename_asset)
+
+        def rename_system():
+            self.system.name = 'Propulsión principal'
+            self.system.save()
+        self.assertNewPdf('asset', self.asset.pk, change=rename_system)
+
+    def test_hour_report_moves_the_schedule(self):
+        # Sin OT la rutina por horas vence según el horómetro: un reporte cambia su próxima fecha
+        def change():
+            with self.captureOnCommitCallbacks(execute=True):
+                HistoryHour.objects.create(component=self.equipo, report_date=date.today(), hour=20, reporter=self.user)
+        self.assertNewPdf('asset', self.asset.pk, change=change)
+
+
+def pending_job(key, **fields):
+    return PdfJob.objects.create(key=key, kind='ot', filename=f'{key}.pdf', html=f'<p>{key}</p>', **fields)
+
+
+@override_settings(GOT_METRICS_ENABLED=False)
+class PdfJobTests(TestCase):
+    '''Cola de PDFs: la petición encola, el worker toma los trabajos y los errores se reintentan.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('inspector', 'inspector@example.com', 'x')
+        asset = Asset.objects.create(abbreviation='COL', name='Remolcador')
+        system = System.objects.create(name='Propulsión', group=200, asset=asset)
+        cls.ot = Ot.objects.create(system=system, description='Cambio de sellos', tipo_mtto='c')
+
+    @override_settings(GOT_PDF_ASYNC=True)
+    def test_async_request_waits_for_the_worker(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('got:report', args=[self.ot.pk]), {'engine': 'html'})
+        job = PdfJob.objects.get()
+        self.assertRedirects(response, reverse('got:pdf-job', args=[job.key]), fetch_redirect_response=False)
+        status = self.client.get(reverse('got:pdf-job', args=[job.key]), {'format': 'json'}).json()
+        self.assertEqual((status['state'], status['download']), ('p', None))
+
+        self.assertEqual(run_pending(), 1)
+        status = self.client.get(reverse('got:pdf-job', args=[job.key]), {'format': 'json'}).json()
+        self.assertEqual(status['download'], reverse('got:pdf-download', args=[job.key]))
+        response = self.client.get(status['download'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_job_pages_require_login(self):
+        job = run_job(request_pdf('ot', self.ot.pk, engine='html'))
+        for name in ('pdf-job', 'pdf-download'):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(f'got:{name}', args=[job.key]))
+                self.assertEqual(response.status_code, 302)
+                self.assertIn('login', response.url)
+
+    def test_claim_takes_the_oldest_and_orphaned_jobs(self):
+        now = timezone.now()
+        orphan = pending_job('huerfano', state='r', started=now - JOB_TIMEOUT - timedelta(minutes=1))
+        first, second = pending_job('primero'), pending_job('segundo')
+        pending_job('generando', state='r', started=now)
+        for minutes, job in enumerate([orphan, first, second]):
+            PdfJob.objects.filter(pk=job.pk).update(created=now - timedelta(minutes=10 - minutes))
+
+        claimed = [claim_job() for _ in range(4)]
+        self.assertEqual([job and job.pk for job in claimed], [orphan.pk, first.pk, second.pk, None])
+        self.assertEqual(PdfJob.objects.get(pk=first.pk).state, 'r')
+
+    def test_failed_jobs_keep_the_error_and_are_retried(self):
+        with mock.patch.object(pdfs, 'render_pdf', side_effect=PdfRenderError('xhtml2pdf reportó 1 errores')):
+            job = run_job(request_pdf('ot', self.ot.pk, engine='html'))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.error), ('e', 'xhtml2pdf reportó 1 errores'))
+
+        retry = request_pdf('ot', self.ot.pk, engine='html')
+        self.assertEqual((retry.pk, retry.state, retry.error), (job.pk, 'p', ''))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(PdfJob.objects.get(pk=job.pk).state, 'f')
+
+
+class PdfEvictionTests(TestCase):
+    '''Tope de espacio de los PDFs generados: se borran los invalidados y luego los de uso más antiguo.'''
+
+    def done_job(self, key, size=100, **fields):
+        job = PdfJob(key=key, kind='ot', filename=f'{key}.pdf', state='f', size=size, **fields)
+        job.file.save(f'{key}.pdf', ContentFile(b'x' * size), save=False)
+        job.save()
+        self.addCleanup(default_storage.delete, job.file.name)
+        return job
+
+    def test_stale_and_least_recently_used_go_first(self):
+        now = timezone.now()
+        jobs = {
+            'reciente': self.done_job('reciente', last_used=now - timedelta(days=1)),
+            'viejo': self.done_job('viejo', last_used=now - timedelta(days=3)),
+            'sin_uso': self.done_job('sin_uso', last_used=None),
+            'invalidado': self.done_job('invalidado', last_used=now, stale=True),
+            'en_curso': self.done_job('en_curso', last_used=now - timedelta(days=5)),
+        }
+        pending_job('pendiente')
+
+        # 500 bytes con tope de 250: salen el invalidado, el nunca usado y el más viejo; el que se
+        # acaba de generar (keep) se conserva aunque sea el de uso más antiguo
+        self.assertEqual(evict_pdfs(max_bytes=250, keep=jobs['en_curso'].pk), 3)
+        remaining = set(PdfJob.objects.values_list('key', flat=True))
+        self.assertEqual(remaining, {'reciente', 'en_curso', 'pendiente'})
+        for key, job in jobs.items():
+            with self.subTest(job=key):
+                self.assertEqual(default_storage.exists(job.file.name), key in remaining)
+
+    def test_nothing_is_evicted_under_the_limit(self):
+        self.done_job('uno')
+        self.done_job('dos')
+        self.assertEqual(evict_pdfs(max_bytes=200), 0)
+        self.assertEqual(PdfJob.objects.count(), 2)
+
+    @override_settings(GOT_PDF_CACHE_MAX_BYTES=150)
+    def test_default_limit_comes_from_the_settings(self):
+        self.done_job('uno', last_used=timezone.now() - timedelta(days=1))
+        self.done_job('dos', last_used=timezone.now())
+        self.assertEqual(evict_pdfs(), 1)
+        self.assertEqual(list(PdfJob.objects.values_list('key', flat=True)), ['dos'])
+
+
+class PdfWorkerLockTests(TransactionTestCase):
+    '''Varios workers: un trabajo bloqueado por otro se salta (SKIP LOCKED) en vez de esperar.'''
+
+    def test_workers_skip_locked_jobs(self):
+        first, second = pending_job('primero'), pending_job('segundo')
+        claimed = []
+
+        def worker():
+            try:
+                claimed.append(claim_job())
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            PdfJob.objects.select_for_update().get(pk=first.pk)
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join(timeout=10)
+
+        self.assertEqual(claimed[0].pk, second.pk)
+        self.assertEqual(PdfJob.objects.get(pk=first.pk).state, 'p')
+
+
+class PdfRenderTests(SimpleTestCase):
+    '''Generación de PDFs: unión de adjuntos por archivos temporales.'''
+
+    def blank_pdf(self, pages):
+        writer = PyPDF2.PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=612, height=792)
+        content = BytesIO()
+        writer.write(content)
+        name = default_storage.save('pdfs/anexo.pdf', ContentFile(content.getvalue()))
+        self.addCleanup(default_storage.delete, name)
+        return name
+
+    def test_attachments_are_merged_in_order(self):
+        two, three = self.blank_pdf(2), self.blank_pdf(3)
+        broken = default_storage.save('pdfs/roto.pdf', ContentFile(b'no es un pdf'))
+        self.addCleanup(default_storage.delete, broken)
+
+        # Tope de memoria mínimo: el PDF principal, los adjuntos y el resultado pasan a disco
+        with mock.patch.object(pdfs, 'SPOOL_MAX_SIZE', 1024):
+            with render_pdf('<p>Informe</p>', [two, 'pdfs/no-existe.pdf', broken, three]) as merged:
+                self.assertTrue(merged._rolled)
+                reader = PyPDF2.PdfReader(merged)
+                self.assertEqual(len(reader.pages), 1 + 2 + 3)
+                self.assertIn('Informe', reader.pages[0].extract_text())
+
+
+class ReportLabPdfTests(TestCase):
+    '''Reportes con el motor ReportLab (got/pdf_reportlab.py).'''
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('tecnico', 'tecnico@example.com', 'x', first_name='Ana', last_name='Pérez')
+        cls.asset = Asset.objects.create(abbreviation='RLB', name='Barcaza')
+        system = System.objects.create(name='Achique', group=300, asset=cls.asset)
+        equipo = Equipo.objects.create(code='RLB-B1', name='Bomba de achique', system=system, tipo='b', feature='')
+        cls.ot = Ot.objects.create(system=system, description='Cambio de impulsor & sellos', super=user, tipo_mtto='c')
+        FailureReport.objects.create(
+            reporter=user, equipo=equipo, description='Baja presión <2 bar>', causas='Impulsor gastado',
+            critico=True, impact=['i', 'o'], related_ot=cls.ot,
+        )
+        ruta = Ruta.objects.create(name='Inspección', control='d', frecuency=90, intervention_date=date(2026, 9, 1), system=system)
+        task = Task.objects.create(
+            ot=cls.ot, ruta=ruta, responsible=user, description='Desmontar la bomba', men_time=2, finished=False,
+            start_date=date(2026, 10, 1),
+        )
+        buffer = BytesIO()
+        PILImage.linear_gradient('L').resize((2400, 1800)).convert('RGB').save(buffer, 'PNG')
+        image = Image(task=task)
+        image.image.save('impulsor.png', ContentFile(buffer.getvalue()))
+        cls.image_name = image.image.name
+        cls.addClassCleanup(default_storage.delete, cls.image_name)
+
+    def read(self, job):
+        self.assertEqual((job.engine, job.state), ('reportlab', 'f'))
+        with job.file.open('rb') as f:
+            content = f.read()
+        job.file.delete(save=False)
+        self.assertTrue(content.startswith(b'%PDF'))
+        return PyPDF2.PdfReader(BytesIO(content))
+
+    def test_ot_report(self):
+        job = run_job(request_pdf('ot', self.ot.pk, engine='reportlab'))
+        self.assertEqual(job.attachments, [self.image_name])
+        reader = self.read(job)
+        text = ''.join(page.extract_text() for page in reader.pages)
+        self.assertIn(f'ORDEN DE TRABAJO #{self.ot.pk}', text)
+        self.assertIn('Cambio de impulsor & sellos', text)
+        self.assertIn('Baja presión <2 bar>', text)
+        self.assertIn('Ana Pérez', text)
+        # El logo y la foto de la actividad
+        self.assertEqual(sum(len(page['/Resources'].get('/XObject', {})) for page in reader.pages), 2)
+
+    def test_asset_report(self):
+        reader = self.read(run_job(request_pdf('asset', self.asset.pk, engine='reportlab')))
+        text = ''.join(page.extract_text() for page in reader.pages)
+        self.assertIn('Achique', text)
+        self.assertIn('Inspección', text)
+
+    def test_binary_streams_only_during_the_build(self):
+        self.assertEqual(rl_config.useA85, 1)
+        job = run_job(request_pdf('ot', self.ot.pk, engine='reportlab'))
+        with job.file.open('rb') as f:
+            content = f.read()
+        job.file.delete(save=False)
+        self.assertNotIn(b'ASCII85Decode', content)
+        # La configuración global de ReportLab (download_pdf y demás) queda como estaba
+        self.assertEqual(rl_config.useA85, 1)
+
+    def test_html_is_the_default_engine(self):
+        self.assertEqual(request_pdf('ot', self.ot.pk).engine, 'html')
+        with override_settings(GOT_PDF_ENGINES={'ot': 'reportlab'}):
+            self.assertEqual(request_pdf('ot', self.ot.pk).engine, 'reportlab')
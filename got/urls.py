@@ -44,8 +44,13 @@ urlpatterns = [
     path('ruta/<int:ruta_id>/crear_ot/',views.crear_ot_desde_ruta,name='crear_ot_desde_ruta'),
 
     path("report_pdf/<int:num_ot>/", views.report_pdf, name='report'),
+    path("pdf/<str:key>/", views.pdf_job_status, name='pdf-job'),
+    path("pdf/<str:key>/descargar/", views.pdf_job_download, name='pdf-download'),
+    path("correo/adjunto/<str:token>/", views.email_attachment, name='email-attachment'),
     path("dash/", views.indicadores, name='dashboard'),
+    path("metricas/", views.request_metrics, name='request-metrics'),
 
+    path("reportehoras/importar/", views.import_hours_view, name='horas-importar'),
     path("reportehoras/<str:component>/", views.reporthours, name='horas'),
     path("reportehorasasset/<str:asset_id>/",views.reportHoursAsset,name='horas-asset'),
 
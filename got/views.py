@@ -1,25 +1,37 @@
-from django.db.models import Count, Q, Min, OuterRef, Subquery, F, ExpressionWrapper, DateField, Prefetch
+from django.db.models import Count, Q, Min, Max, Avg, OuterRef, Subquery, F, ExpressionWrapper, DateField, Prefetch, prefetch_related_objects
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import permission_required, login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import Group, User
-from django.core.mail import EmailMessage, send_mail
+from django.core import signing
+from django.core.files.storage import default_storage
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.template.loader import get_template, render_to_string
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import generic, View
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from .models import (
     Asset, System, Ot, Task, Equipo, Ruta, HistoryHour, FailureReport, Image, Operation, Location, Document,
-    Megger, Estator, Excitatriz, RotorMain, RotorAux, RodamientosEscudos, Solicitud, Suministro, Item, TransaccionSuministro
+    Megger, Estator, Excitatriz, RotorMain, RotorAux, RodamientosEscudos, Solicitud, Suministro, Item, TransaccionSuministro,
+    RequestMetric, PdfJob
 )
+from .scheduling import load_schedule, load_ind_mtto
+from .pdfs import PdfRenderError, request_pdf, ready_pdf, run_job, open_pdf
+from .permissions import has_group
+from .visibility import user_scope
+from .outbox import queue_email, storage_attachment, pdf_attachment, load_attachment_link
+from .notifications import notify
+from .hours import parse_hour_rows, import_hours, hours_grid, hour_trend, HOURS_GRID_WINDOWS
+from .compliance import load_fleet_frame, fleet_compliance, ruta_status_matrix, refresh_system_compliance
 from .forms import (
     RescheduleTaskForm, OtForm, ActForm, FinishTask, SysForm, EquipoForm, FinishOtForm, RutaForm, RutActForm, ReportHours,
     ReportHoursAsset, failureForm,EquipoFormUpdate, OtFormNoSup, ActFormNoSup, UploadImages, OperationForm, LocationForm,
@@ -29,11 +41,8 @@ from .forms import (
 
 from datetime import timedelta, date, datetime
 from collections import defaultdict
-from xhtml2pdf import pisa
-from io import BytesIO
+import csv
 import itertools
-import PyPDF2
-import smtplib
 import logging
 
 from reportlab.lib import colors
@@ -50,7 +59,7 @@ class AssignedTaskByUserListView(LoginRequiredMixin, generic.ListView):
 
     def dispatch(self, request, *args, **kwargs):
         current_user = request.user
-        if current_user.groups.filter(name='gerencia').exists():
+        if has_group(current_user, 'gerencia'):
             return redirect('got:asset-list')
         return super().dispatch(request, *args, **kwargs)
 
@@ -70,10 +79,10 @@ class AssignedTaskByUserListView(LoginRequiredMixin, generic.ListView):
             context['worker'] = f'{worker.first_name} {worker.last_name}'
             context['worker_id'] = worker_id
 
-        if current_user.groups.filter(name='super_members').exists():
+        if has_group(current_user, 'super_members'):
             all_users = User.objects.all()
 
-        elif current_user.groups.filter(name__in=['maq_members', 'buzos_members']).exists():
+        elif has_group(current_user, 'maq_members', 'buzos_members'):
             talleres = Group.objects.get(name='serport_members')
             taller_list = list(talleres.user_set.all())
             taller_list.append(current_user)
@@ -86,7 +95,7 @@ class AssignedTaskByUserListView(LoginRequiredMixin, generic.ListView):
 
     def get_queryset(self):
 
-        queryset = Task.objects.filter(ot__isnull=False, start_date__isnull=False, finished=False).order_by('start_date')
+        queryset = Task.objects.filter(ot__isnull=False, start_date__isnull=False, finished=False).select_related('ot__system__asset', 'responsible').order_by('start_date')
         current_user = self.request.user
 
         asset_id = self.request.GET.get('asset_id')
@@ -97,27 +106,12 @@ class AssignedTaskByUserListView(LoginRequiredMixin, generic.ListView):
         if responsable_id:
             queryset = queryset.filter(responsible=responsable_id)
 
-        if current_user.groups.filter(name='super_members').exists():
-            return queryset
-
-        if current_user.groups.filter(name='serport_members').exists():
+        scope = user_scope(current_user)
+        if scope.own_tasks:
             return queryset.filter(responsible=current_user)
-
-        if current_user.groups.filter(name='maq_members').exists():
-            return queryset.filter(ot__system__asset__supervisor=current_user)
-
-        if current_user.groups.filter(name='buzos_members').exists():
-            location_filters = {
-                'santamarta_station': 'Santa Marta',
-                'ctg_station': 'Cartagena',
-                'guyana_station': 'Guyana'
-            }
-            locations = [loc for group, loc in location_filters.items() if current_user.groups.filter(name=group).exists()]
-            if locations:
-                return queryset.filter(ot__system__asset__area='b', ot__system__location__in=locations)
-            return queryset.filter(ot__system__asset__area='b')
-
-        return queryset.none() 
+        if not scope.roles:
+            return queryset.none()
+        return scope.filter(queryset, 'ot__system__asset', 'ot__system__location', view='tasks')
     
 
 def asset_suministros_report(request, abbreviation):
@@ -164,17 +158,14 @@ class SolicitudesListView(LoginRequiredMixin, generic.ListView):
         return context
 
     def get_queryset(self):
-        queryset = Solicitud.objects.all()
+        queryset = Solicitud.objects.select_related('ot', 'asset', 'solicitante').prefetch_related('suministro_set__item')
         state = self.request.GET.get('state')
         asset_filter = self.request.GET.get('asset')
 
         if asset_filter:
             queryset = queryset.filter(asset__abbreviation=asset_filter)
 
-        if self.request.user.groups.filter(name='maq_members').exists():
-            supervised_assets = Asset.objects.filter(
-                supervisor=self.request.user)
-            queryset = queryset.filter(asset__in=supervised_assets)
+        queryset = user_scope(self.request.user).filter(queryset, 'asset', view='solicitudes')
 
         keyword = self.request.GET.get('keyword')
         if keyword:
@@ -203,7 +194,7 @@ def download_pdf(request):
     asset_filter = request.GET.get('asset', '')
     keyword = request.GET.get('keyword', '')
 
-    queryset = Solicitud.objects.all()
+    queryset = Solicitud.objects.select_related('ot', 'asset', 'solicitante')
 
     # Aplicamos filtros similares a los de la vista de lista
     if asset_filter:
@@ -355,7 +346,7 @@ def send_email_on_new_solicitud(sender, instance, created, **kwargs):
 
         '''
         recipient_list = ['c.mantenimiento@serport.co']
-        send_mail(subject, message, settings.EMAIL_HOST_USER, recipient_list)
+        notify('solicitud', recipient_list, subject, message)
     
 
 @login_required
@@ -374,12 +365,14 @@ class AssetsListView(LoginRequiredMixin, generic.ListView):
     model = Asset
     paginate_by = 20
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        load_ind_mtto(context['asset_list'])
+        return context
+
     def get_queryset(self):
-        queryset = Asset.objects.all()
+        queryset = user_scope(self.request.user).filter(Asset.objects.select_related('supervisor'), 'pk', view='assets')
         area = self.request.GET.get('area')
-        user_groups = self.request.user.groups.values_list('name', flat=True)
-        if 'buzos_members' in user_groups:
-            queryset = queryset.filter(area='b')
         if area:
             queryset = queryset.filter(area=area)
 
@@ -390,10 +383,13 @@ class AssetDetailView(LoginRequiredMixin, generic.DetailView):
 
     model = Asset
 
+    def get_queryset(self):
+        return user_scope(self.request.user).filter(super().get_queryset(), 'pk', view='asset_detail')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        asset = self.get_object()
-        sys = asset.system_set.all()
+        asset = self.object
+        sys = user_scope(self.request.user).filter(asset.system_set.all(), 'asset', 'location', view='asset_detail')
 
         equipos = Equipo.objects.filter(system__asset=asset).prefetch_related('suministros__item')
 
@@ -434,17 +430,6 @@ class AssetDetailView(LoginRequiredMixin, generic.DetailView):
         context['items_by_subsystem'] = items_by_subsystem
 
 
-        if self.request.user.groups.filter(name='buzos_members').exists():
-            location_filters = {
-                'santamarta_station': 'Santa Marta',
-                'ctg_station': 'Cartagena',
-                'guyana_station': 'Guyana',
-            }
-            locations = [loc for group, loc in location_filters.items() if self.request.user.groups.filter(name=group).exists()]
-            if locations:
-                return asset.system_set.filter(area='b', location__in=locations)
-            return asset.system_set.all()
-
         other_asset_systems = System.objects.filter(location=asset.name).exclude(asset=asset)
         combined_systems = (sys.union(other_asset_systems)).order_by('group')
         
@@ -468,16 +453,27 @@ class AssetDetailView(LoginRequiredMixin, generic.DetailView):
         current_month_name_en = datetime.now().strftime("%B")
         current_month_name_es = month_names_es[current_month_name_en]
 
-        filtered_rutas = []
-        for ruta in Ruta.objects.filter(system__in=sys).exclude(system__state__in=['x', 's']):
-            if (ruta.next_date.month <= current_month and ruta.next_date.year <= current_year) or (ruta.intervention_date.month == current_month and ruta.intervention_date.year == current_year) or (ruta.ot and ruta.ot.state == 'x'):
-                filtered_rutas.append(ruta)
-
-        filtered_rutas.sort(key=lambda t: t.next_date)
+        filtered_rutas = load_schedule(
+            Ruta.objects.filter(system__in=sys).exclude(system__state__in=['x', 's']).with_schedule().filter(
+                Q(due_date__month__lte=current_month, due_date__year__lte=current_year) |
+                Q(intervention_date__month=current_month, intervention_date__year=current_year) |
+                Q(ot__state='x')
+            ).select_related('system').order_by(F('due_date').asc(nulls_last=True))
+        )
         paginator = Paginator(combined_systems, 10)
         page_number = self.request.GET.get('page')
         page_obj = paginator.get_page(page_number)
 
+        # Porcentajes de mantenimiento desde la tabla consolidada SystemCompliance
+        page_systems = list(page_obj)
+        prefetch_related_objects(page_systems, 'compliance')
+        missing = [system.id for system in page_systems if not hasattr(system, 'compliance')]
+        if missing:
+            refresh_system_compliance(missing)
+            for system in page_systems:
+                system._state.fields_cache.pop('compliance', None)
+            prefetch_related_objects(page_systems, 'compliance')
+
         if asset.area == 'b':
             context['locations'] = System.objects.filter(asset=asset).values_list('location', flat=True).distinct()
 
@@ -535,14 +531,22 @@ class SysDetailView(LoginRequiredMixin, generic.DetailView):
 
         context['orders'] = orders
 
+        rutas_prefetch = Prefetch('equipos', queryset=Ruta.objects.select_related('ot', 'dependencia').prefetch_related('task_set'))
         try:
             equipment = Equipo.objects.get(code=view_type)
             context['equipo'] = equipment
             context['suministros'] = Suministro.objects.filter(equipo=equipment)
+            context['rutas'] = load_schedule(equipment.equipos.select_related('dependencia').prefetch_related('task_set'))
         except Equipo.DoesNotExist:
-            equipments = Equipo.objects.filter(system=system, subsystem=view_type)
+            equipments = Equipo.objects.filter(system=system, subsystem=view_type).prefetch_related(rutas_prefetch)
+            load_schedule(ruta for equipo in equipments for ruta in equipo.equipos.all())
             context['equipos'] = equipments
 
+        if view_type == 'sys':
+            context['rutas'] = load_schedule(
+                system.rutas.select_related('system', 'dependencia').prefetch_related('task_set__responsible')
+                )
+
         subsystems = Equipo.objects.filter(system=system).exclude(subsystem__isnull=True).exclude(subsystem__exact='').values_list('subsystem', flat=True)
 
         # Usar set para eliminar duplicados, si el distinct no está funcionando como se espera
@@ -567,7 +571,8 @@ def add_supply_to_equipment(request, code):
     else:
         form = SuministrosEquipoForm()
         items = Item.objects.all()  # Asegúrate de filtrar o ajustar esto según tus necesidades
-    return render(request, 'got/equipment_detail.html', {'form': form, 'equipo': equipo, 'items': items})
+    rutas = load_schedule(equipo.equipos.select_related('dependencia').prefetch_related('task_set'))
+    return render(request, 'got/equipment_detail.html', {'form': form, 'equipo': equipo, 'system': equipo.system, 'items': items, 'rutas': rutas})
 
 
 
@@ -632,20 +637,11 @@ class FailureListView(LoginRequiredMixin, generic.ListView):
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-
-        if self.request.user.groups.filter(name='maq_members').exists():
-            supervised_assets = Asset.objects.filter(
-                supervisor=self.request.user)
-
-            queryset = queryset.filter(
-                equipo__system__asset__in=supervised_assets)
-        elif self.request.user.groups.filter(name='buzos_members').exists():
-            supervised_assets = Asset.objects.filter(area='b')
+        queryset = super().get_queryset().select_related('equipo__system__asset', 'reporter')
 
-            queryset = queryset.filter(equipo__system__asset__in=supervised_assets)
-
-        return queryset
+        return user_scope(self.request.user).filter(
+            queryset, 'equipo__system__asset', 'equipo__system__location', view='failures'
+        )
 
 
 class FailureReportForm(LoginRequiredMixin, CreateView):
@@ -654,29 +650,26 @@ class FailureReportForm(LoginRequiredMixin, CreateView):
     http_method_names = ['get', 'post']
 
     def send_email(self, context):
-        """Sends an email compiled from the given context."""
-        subject = 'Nuevo Reporte de Falla'
+        """Notifies supervisors with a message compiled from the given context."""
+        subject = f'Nuevo Reporte de Falla: {context["equipo"]}'
         email_template_name = 'got/failure_report_email.txt'
         
         email_body_html = render_to_string(email_template_name, context)
         
-        email = EmailMessage(
+        attachments = []
+        if self.object.evidence:
+            ext = self.object.evidence.name.split(".")[-1]
+            attachments.append(storage_attachment('Evidencia.' + ext, self.object.evidence.name, f'image/{ext}'))
+        
+        # Las críticas salen en el acto; las demás en el resumen de los supervisores
+        notify(
+            'falla_critica' if self.object.critico else 'falla',
+            [user.email for user in Group.objects.get(name='super_members').user_set.all()],
             subject,
             email_body_html,
-            settings.EMAIL_HOST_USER,
-            [user.email for user in Group.objects.get(name='super_members').user_set.all()],
-            reply_to=[settings.EMAIL_HOST_USER]
+            attachments=attachments,
+            site_url=self.request.build_absolute_uri('/'),
         )
-        
-        if self.object.evidence:
-            mimetype = f'image/{self.object.evidence.name.split(".")[-1]}'
-            email.attach(
-                'Evidencia.' + self.object.evidence.name.split(".")[-1],
-                self.object.evidence.read(),
-                mimetype
-            )
-        
-        email.send()
 
     def get_email_context(self):
         """Builds the context dictionary for the email."""
@@ -783,11 +776,7 @@ class OtListView(LoginRequiredMixin, generic.ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        if self.request.user.groups.filter(name='buzos_members').exists():
-            info_filter = Asset.objects.filter(area='b')
-        else:
-            info_filter = Asset.objects.all()
-        context['asset'] = info_filter
+        context['asset'] = user_scope(self.request.user).filter(Asset.objects.all(), 'pk', view='ot_assets')
 
         super_group = Group.objects.get(name='super_members')
         users_in_group = super_group.user_set.all()
@@ -796,30 +785,22 @@ class OtListView(LoginRequiredMixin, generic.ListView):
         return context
 
     def get_queryset(self):
-        queryset = Ot.objects.all()
+        queryset = Ot.objects.select_related('system__asset', 'super').prefetch_related('task_set')
         state = self.request.GET.get('state')
         asset_id = self.request.GET.get('asset_id')
         responsable_id = self.request.GET.get('responsable')
 
-        if self.request.user.groups.filter(name='maq_members').exists():
-            # Obtén el/los asset(s) supervisado(s) por el usuario
-            supervised_assets = Asset.objects.filter(
-                supervisor=self.request.user)
-            queryset = queryset.filter(system__asset__in=supervised_assets)
-        elif self.request.user.groups.filter(name='buzos_members').exists():
-            # Obtén el/los asset(s) supervisado(s) por el usuario
-            supervised_assets = Asset.objects.filter(
-                area='b')
-
-            queryset = queryset.filter(system__asset__in=supervised_assets)
+        scope = user_scope(self.request.user)
+        queryset = scope.filter(queryset, 'system__asset', 'system__location', view='ots')
 
         if state:
             queryset = queryset.filter(state=state)
 
         keyword = self.request.GET.get('keyword')
         if keyword:
-            queryset = Ot.objects.filter(description__icontains=keyword)
-            return queryset
+            return scope.filter(
+                Ot.objects.filter(description__icontains=keyword), 'system__asset', 'system__location', view='ot_search'
+            )
 
         if asset_id:
             queryset = queryset.filter(system__asset_id=asset_id)
@@ -835,7 +816,7 @@ class OtDetailView(LoginRequiredMixin, generic.DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.groups.filter(name='super_members').exists():
+        if has_group(self.request.user, 'super_members'):
             context['task_form'] = ActForm()
         else:
             context['task_form'] = ActFormNoSup()
@@ -887,7 +868,7 @@ class OtDetailView(LoginRequiredMixin, generic.DetailView):
             task.delete()
             return redirect(ot.get_absolute_url()) 
     
-        task_form_class = ActForm if request.user.groups.filter(name='super_members').exists() else ActFormNoSup
+        task_form_class = ActForm if has_group(request.user, 'super_members') else ActFormNoSup
         task_form = task_form_class(request.POST, request.FILES)
         image_form = UploadImages(request.POST, request.FILES)
 
@@ -919,44 +900,21 @@ class OtDetailView(LoginRequiredMixin, generic.DetailView):
 
             supervisor = ot.system.asset.supervisor
             if supervisor and supervisor.email:
-                supervisor_email = supervisor.email
-
-                # Enviar correo electrónico al finalizar la OT
+                # Correo al finalizar la OT: el worker genera el PDF y lee los adjuntos al enviarlo
                 subject = f'Orden de Trabajo {ot.num_ot} Finalizada'
                 message = render_to_string('got/ot_finished_email.txt', {'ot': ot})
-                from_email = settings.EMAIL_HOST_USER
-                to_email = supervisor_email
-
-                email = EmailMessage(
-                    subject, message, from_email, [to_email]
-                    )
-
-                # Adjuntar el PDF al correo
-                pdf_content_dynamic = self.generate_pdf_content(ot)
-                pdf_filename_dynamic = f'OT_{ot.num_ot}_Detalle.pdf'
-                email.attach(
-                    pdf_filename_dynamic,
-                    pdf_content_dynamic,
-                    'application/pdf'
-                    )
+                attachments = [pdf_attachment(f'OT_{ot.num_ot}_Detalle.pdf', 'ot', ot.num_ot)]
 
                 # Adjuntar el PDF almacenado en el campo info_contratista_pdf
                 if ot.info_contratista_pdf:
-                    pdf_filename_stored = f'OT_{ot.num_ot}_Contratista.pdf'
-                    email.attach(
-                        pdf_filename_stored,
-                        ot.info_contratista_pdf.read(),
-                        'application/pdf'
-                        )
-
-                try:
-                    # Preparar y enviar el correo electrónico
-                    email.send()
-                except smtplib.SMTPSenderRefused as e:
-                    # Manejar adecuadamente el error
-                    logger.error(f"Error al enviar correo: {str(e)}")
-                    messages.error(request, "No se pudo enviar el correo. El tamaño del mensaje excede el límite permitido.")
-                    return redirect(ot.get_absolute_url())
+                    attachments.append(storage_attachment(
+                        f'OT_{ot.num_ot}_Contratista.pdf', ot.info_contratista_pdf.name, 'application/pdf'
+                    ))
+
+                queue_email(
+                    subject, message, [supervisor.email], attachments=attachments,
+                    site_url=request.build_absolute_uri('/'),
+                )
 
             return redirect(ot.get_absolute_url())
 
@@ -972,20 +930,6 @@ class OtDetailView(LoginRequiredMixin, generic.DetailView):
 
         return render(request, self.template_name, context)
 
-    def generate_pdf_content(self, ot):
-        '''
-        Función para generar el contenido del PDF
-        '''
-        template_path = 'got/pdf_template.html'
-        context = {'ot': ot}
-        template = get_template(template_path)
-        html = template.render(context)
-        pdf_content = BytesIO()
-
-        pisa.CreatePDF(html, dest=pdf_content)
-
-        return pdf_content.getvalue()
-
 
 class OtCreate(CreateView):
 
@@ -993,7 +937,7 @@ class OtCreate(CreateView):
     http_method_names = ['get', 'post']
 
     def get_form_class(self):
-        if self.request.user.groups.filter(name='super_members').exists():
+        if has_group(self.request.user, 'super_members'):
             return OtForm
         else:
             return OtFormNoSup
@@ -1019,7 +963,7 @@ class OtUpdate(UpdateView):
     http_method_names = ['get', 'post']
 
     def get_form_class(self):
-        if self.request.user.groups.filter(name='super_members').exists():
+        if has_group(self.request.user, 'super_members'):
             return OtForm
         else:
             return OtFormNoSup
@@ -1212,19 +1156,28 @@ class TaskDeleterut(DeleteView):
 @login_required
 def RutaListView(request):
 
-    suministro_prefetch = Prefetch('suministros', queryset=Suministro.objects.all(), to_attr='all_suministros')
+    suministro_prefetch = Prefetch('suministros', queryset=Suministro.objects.select_related('item'), to_attr='all_suministros')
     equipo_prefetch = Prefetch('equipos', queryset=Equipo.objects.prefetch_related(suministro_prefetch).annotate(num_suministros=Count('suministros')).filter(num_suministros__gt=0), to_attr='all_equipos')
     system_prefetch = Prefetch('system_set', queryset=System.objects.prefetch_related(equipo_prefetch).annotate(num_equipos_with_suministros=Count('equipos__suministros')).filter(num_equipos_with_suministros__gt=0), to_attr='all_systems')
     assets = Asset.objects.filter(area='a').prefetch_related(system_prefetch).annotate(num_systems_with_equipos=Count('system__equipos__suministros')).filter(num_systems_with_equipos__gt=0)
 
-    diques = Ruta.objects.filter(name__icontains='DIQUE')
-    barcos = Asset.objects.filter(area='a')
+    diques = Ruta.objects.filter(name__icontains='DIQUE').select_related('system__asset')
+    # Propulsión (200) y generación (300) con sus equipos y la fecha del último reporte, en dos consultas
+    motor_prefetch = Prefetch('equipos', queryset=Equipo.objects.annotate(last_report=Max('hours__report_date')), to_attr='motores')
+    barcos = Asset.objects.filter(area='a').prefetch_related(
+        Prefetch('system_set', queryset=System.objects.filter(group__in=[200, 300]).order_by('group', 'id').prefetch_related(motor_prefetch), to_attr='sistemas_motores')
+    )
 
+    def first_named(sistema, *names):
+        # Equivale a sistema.equipos.filter(name__icontains=...).first() sobre lo precargado
+        if sistema is None:
+            return None
+        return next((equipo for equipo in sistema.motores if any(name.lower() in equipo.name.lower() for name in names)), None)
 
     motores_data = []
     for barco in barcos:
-        sistema = barco.system_set.filter(group=200).first()
-        sistema2 = barco.system_set.filter(group=300).first()
+        sistema = next((s for s in barco.sistemas_motores if s.group == 200), None)
+        sistema2 = next((s for s in barco.sistemas_motores if s.group == 300), None)
         motores_info = {
             'name': barco.name,
             'estribor': {
@@ -1241,10 +1194,10 @@ def RutaListView(request):
         }
 
         if sistema:
-            motor_estribor = sistema.equipos.filter(name__icontains='Motor propulsor estribor').first()
-            motor_babor = sistema.equipos.filter(name__icontains='Motor propulsor babor').first()
-            motor_generador1 = sistema2.equipos.filter(Q(name__icontains='Motor generador estribor') | Q(name__icontains='Motor generador 1')).first()
-            motor_generador2 = sistema2.equipos.filter(Q(name__icontains='Motor generador babor') | Q(name__icontains='Motor generador 2')).first()
+            motor_estribor = first_named(sistema, 'Motor propulsor estribor')
+            motor_babor = first_named(sistema, 'Motor propulsor babor')
+            motor_generador1 = first_named(sistema2, 'Motor generador estribor', 'Motor generador 1')
+            motor_generador2 = first_named(sistema2, 'Motor generador babor', 'Motor generador 2')
             
             if motor_estribor:
                 motores_info['estribor'] = {
@@ -1253,7 +1206,7 @@ def RutaListView(request):
                     'lubricante': motor_estribor.lubricante,
                     'capacidad': motor_estribor.volumen,
                     'horometro': motor_estribor.horometro,
-                    'fecha': motor_estribor.last_hour_report_date(),
+                    'fecha': motor_estribor.last_report,
                     }
             if motor_babor:
                 motores_info['babor'] = {
@@ -1262,7 +1215,7 @@ def RutaListView(request):
                     'lubricante': motor_babor.lubricante,
                     'capacidad': motor_babor.volumen,
                     'horometro': motor_babor.horometro,
-                    'fecha': motor_babor.last_hour_report_date()
+                    'fecha': motor_babor.last_report
                     }
             if motor_generador1:
                 motores_info['generador1'] = {
@@ -1271,7 +1224,7 @@ def RutaListView(request):
                     'lubricante': motor_generador1.lubricante,
                     'capacidad': motor_generador1.volumen,
                     'horometro': motor_generador1.horometro,
-                    'fecha': motor_generador1.last_hour_report_date()
+                    'fecha': motor_generador1.last_report
                     }
             if motor_generador2:
                 motores_info['generador2'] = {
@@ -1280,7 +1233,7 @@ def RutaListView(request):
                     'lubricante': motor_generador2.lubricante,
                     'capacidad': motor_generador2.volumen,
                     'horometro': motor_generador2.horometro,
-                    'fecha': motor_generador2.last_hour_report_date()
+                    'fecha': motor_generador2.last_report
                     }
 
         motores_data.append(motores_info)
@@ -1379,23 +1332,68 @@ def crear_ot_desde_ruta(request, ruta_id):
 
 
 def report_pdf(request, num_ot):
+    job = request_pdf('ot', num_ot, user=request.user, engine=request.GET.get('engine'))
+    return pdf_response(request, job)
 
-    ot_info = Ot.objects.get(num_ot=num_ot)
-    context = {'ot': ot_info}
-    template_path = 'got/pdf_template.html'
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="orden_de_trabajo_{num_ot}.pdf"'
-    
-    template = get_template(template_path)
-    html = template.render(context)
-    
-    # Crear el PDF y enviarlo directamente a la respuesta HTTP
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    
-    if pisa_status.err:
-        return HttpResponse('We had some errors <pre>' + html + '</pre>')
-    return response
+
+def pdf_response(request, job):
+    '''
+    Descarga inmediata si el PDF de ese contenido ya existe. Si no, con GOT_PDF_ASYNC lo deja
+    al worker (manage.py pdf_worker) y envía a la página de espera; sin él, lo genera en línea.
+    '''
+    if job.state != 'f' and not getattr(settings, 'GOT_PDF_ASYNC', False):
+        job = run_job(job)
+    if job.state == 'f':
+        return FileResponse(open_pdf(job), as_attachment=True, filename=job.filename, content_type='application/pdf')
+    return redirect('got:pdf-job', key=job.key)
+
+
+@login_required
+def pdf_job_status(request, key):
+    job = get_object_or_404(PdfJob, key=key)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'state': job.state,
+            'state_display': job.get_state_display(),
+            'download': reverse('got:pdf-download', args=[job.key]) if job.state == 'f' else None,
+            'error': job.error,
+        })
+    return render(request, 'got/pdf_job.html', {'job': job})
+
+
+@login_required
+def pdf_job_download(request, key):
+    job = get_object_or_404(PdfJob, key=key)
+    if job.state != 'f':
+        return redirect('got:pdf-job', key=job.key)
+    return FileResponse(open_pdf(job), as_attachment=True, filename=job.filename, content_type='application/pdf')
+
+
+def email_attachment(request, token):
+    '''
+    Adjunto que no cupo en un correo (outbox.build_message). El enlace firmado es la
+    credencial, sin sesión, y vence a los outbox.LINK_MAX_AGE.
+    '''
+    try:
+        attachment = load_attachment_link(token)
+    except signing.SignatureExpired:
+        return HttpResponse('El enlace de descarga venció.', status=410)
+    except signing.BadSignature:
+        raise Http404
+
+    if 'pdf' in attachment:
+        # Sin sesión no se puede esperar en la página del trabajo: el PDF se genera en línea
+        try:
+            job = ready_pdf(*attachment['pdf'])
+        except PdfRenderError:
+            return HttpResponse('No se pudo generar el PDF.', status=500)
+        return FileResponse(open_pdf(job), as_attachment=True, filename=job.filename, content_type='application/pdf')
+    if not default_storage.exists(attachment['name']):
+        raise Http404
+    return FileResponse(
+        default_storage.open(attachment['name'], 'rb'), as_attachment=True,
+        filename=attachment['filename'], content_type=attachment.get('mimetype') or None,
+    )
 
 
 @login_required
@@ -1432,7 +1430,10 @@ def indicadores(request):
     if area_filter:
         bar = bar.filter(system__asset__area=area_filter)
 
-    barcos = bar.filter(system__asset__area='a')
+    barcos = bar.filter(system__asset__area='a').select_related('system__asset')
+
+    rutas = Ruta.objects.filter(system__asset__area=area_filter) if area_filter else Ruta.objects.all()
+    ind_mtto = fleet_compliance(load_fleet_frame(rutas))
 
     if area_filter:
         ots = len(Ot.objects.filter(creation_date__month=m, creation_date__year=2024, system__asset__area=area_filter))
@@ -1492,7 +1493,8 @@ def indicadores(request):
         'ots_asset': ots_per_asset,
         'asset_labels': asset_labels,
         'ots_finished': ot_finish,
-        'barcos': barcos
+        'barcos': barcos,
+        'ind_mtto': ind_mtto,
     }
     return render(request, 'got/indicadores.html', context)
 
@@ -1530,8 +1532,26 @@ def reportHoursAsset(request, asset_id):
 
     asset = get_object_or_404(Asset, pk=asset_id)
     today = date.today()
-    dates = [today - timedelta(days=x) for x in range(30)]
-    equipos_rotativos = Equipo.objects.filter(system__asset=asset, tipo='r')
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in HOURS_GRID_WINDOWS:
+        days = 30
+    dates = [today - timedelta(days=x) for x in range(days)]
+    equipos_rotativos = list(Equipo.objects.filter(system__asset=asset, tipo='r'))
+
+    # Matriz equipo x fecha en una sola consulta agrupada
+    grid = hours_grid(equipos_rotativos, dates)
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="horas_{asset.abbreviation}_{days}d.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['Componente', 'Horometro'] + [d.strftime('%d/%m/%Y') for d in dates])
+        for equipo in equipos_rotativos:
+            writer.writerow([equipo.name, equipo.horometro] + list(grid.loc[equipo.code]))
+        return response
 
     if request.method == 'POST':
         # Si se envió el formulario, procesarlo
@@ -1547,17 +1567,17 @@ def reportHoursAsset(request, asset_id):
 
     hours = HistoryHour.objects.filter(component__system__asset=asset)[:30]
 
-    equipos_data = []
-    for equipo in equipos_rotativos:
-        horas_reportadas = {date: 0 for date in dates}
-        for hour in equipo.hours.filter(report_date__range=(dates[-1], today)):
-            if hour.report_date in horas_reportadas:
-                horas_reportadas[hour.report_date] += hour.hour
+    equipos_data = [
+        {'equipo': equipo, 'horas': list(grid.loc[equipo.code])}
+        for equipo in equipos_rotativos
+    ]
 
-        equipos_data.append({
-            'equipo': equipo,
-            'horas': [horas_reportadas[date] for date in dates]
-        })
+    # Tendencia de uso de los últimos 24 meses desde los acumulados mensuales
+    trend = hour_trend(equipos_rotativos, 'm', 24, today)
+    trend_data = [
+        {'equipo': equipo, 'horas': list(trend.loc[equipo.code])}
+        for equipo in equipos_rotativos
+    ]
 
     context = { 
         'form': form,
@@ -1565,12 +1585,53 @@ def reportHoursAsset(request, asset_id):
         'asset': asset,
         'equipos_data': equipos_data,
         'equipos_rotativos': equipos_rotativos,
-        'dates': dates
+        'dates': dates,
+        'days': days,
+        'windows': HOURS_GRID_WINDOWS,
+        'trend_months': list(trend.columns),
+        'trend_data': trend_data,
     }
 
     return render(request, 'got/hours_asset.html', context)
 
 
+@login_required
+def import_hours_view(request):
+    '''
+    Carga masiva de reportes de horas. Recibe un archivo CSV/JSON en "archivo" (formulario
+    del reporte por activo) o el lote directamente en el cuerpo (text/csv o application/json).
+    '''
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    upload = request.FILES.get('archivo')
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = 'got:asset-list'
+    if upload:
+        content, fmt = upload.read(), 'json' if upload.name.lower().endswith('.json') else 'csv'
+    else:
+        content, fmt = request.body, 'json' if request.content_type == 'application/json' else 'csv'
+
+    try:
+        rows = parse_hour_rows(content, fmt)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        error = f'No se pudo leer el archivo: {e}'
+        if upload:
+            messages.error(request, error)
+            return redirect(next_url)
+        return JsonResponse({'error': error}, status=400)
+
+    saved, errors = import_hours(rows, reporter=request.user)
+
+    if upload:
+        messages.success(request, f'{saved} reportes de horas guardados.')
+        for error in errors[:20]:
+            messages.warning(request, error)
+        return redirect(next_url)
+    return JsonResponse({'guardados': saved, 'errores': errors}, status=400 if errors and not saved else 200)
+
+
 def truncate_text(text, length=45):
     if len(text) > length:
         return text[:length] + '...'
@@ -1649,17 +1710,18 @@ def schedule(request, pk):
 
 def OperationListView(request):
 
-    assets = Asset.objects.filter(area='a')
-    operations = Operation.objects.order_by('start')
+    assets = Asset.objects.filter(area='a').prefetch_related('operation_set')
+    operations = Operation.objects.select_related('asset').order_by('start')
 
     operations_data = []
     for asset in assets:
-        asset_operations = asset.operation_set.all().values(
-            'start', 'end', 'proyecto', 'requirements'
-        )
+        asset_operations = [
+            {'start': op.start, 'end': op.end, 'proyecto': op.proyecto, 'requirements': op.requirements}
+            for op in asset.operation_set.all()
+        ]
         operations_data.append({
             'asset': asset,
-            'operations': list(asset_operations)
+            'operations': asset_operations
         })
 
     form = OperationForm(request.POST or None)
@@ -1702,96 +1764,13 @@ class OperationUpdate(UpdateView):
 
 
 def generate_asset_pdf(request, asset_id):
-    asset = get_object_or_404(Asset, pk=asset_id)
-    systems = asset.system_set.all()
-
-    systems_with_rutas = []
-    for system in systems:
-        rutas_data = []
-        rutas = Ruta.objects.filter(system=system).prefetch_related('task_set')
-        for ruta in rutas:
-            # Recoger las tareas para cada ruta
-            tasks = ruta.task_set.all()
-            rutas_data.append({
-                'ruta': ruta,
-                'tasks': tasks,
-                'ot_num': ruta.ot.num_ot if ruta.ot else 'N/A'  # Asegúrate que ruta.ot es accesible y no nulo
-            })
-        systems_with_rutas.append({
-            'system': system,
-            'rutas_data': rutas_data
-        })
-
-    context = {
-        'asset': asset,
-        'systems_with_rutas': systems_with_rutas
-    }
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="Asset_{}.pdf"'.format(asset.pk)
-    template = get_template('got/asset_pdf_template.html')
-    html = template.render(context)
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse('We had some errors <pre>' + html + '</pre>')
-    return response
+    job = request_pdf('asset', asset_id, user=request.user, engine=request.GET.get('engine'))
+    return pdf_response(request, job)
 
 
 def generate_system_pdf_with_attachments(request, asset_id, system_id):
-    asset = get_object_or_404(Asset, pk=asset_id)
-    system = get_object_or_404(System, pk=system_id, asset=asset)
-
-    rutas_data = []
-    rutas = Ruta.objects.filter(system=system).prefetch_related('task_set')
-    for ruta in rutas:
-        tasks = ruta.task_set.all()
-        ot_pdfs = [task.ot.info_contratista_pdf for task in tasks if task.ot and task.ot.info_contratista_pdf]
-        rutas_data.append({
-            'ruta': ruta,
-            'tasks': tasks,
-            'ot_num': ruta.ot.num_ot if ruta.ot else 'N/A',
-            'ot_pdfs': ot_pdfs  # Lista de PDFs asociados
-        })
-
-    context = {
-        'asset': asset,
-        'system': system,
-        'rutas_data': rutas_data
-    }
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="System_{system_id}_Asset_{asset_id}_with_attachments.pdf"'
-    template = get_template('got/system_pdf_with_attachments_template.html')
-    html = template.render(context)
-    main_pdf = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=main_pdf)
-    
-    if pisa_status.err:
-        return HttpResponse('We had some errors creating the main PDF <pre>' + html + '</pre>')
-
-    # Comenzar la combinación de PDFs
-    pdf_merger = PyPDF2.PdfMerger()
-    main_pdf.seek(0)
-    pdf_merger.append(main_pdf)
-
-    # Adjuntar cada PDF relacionado
-    for ruta in rutas_data:
-        for pdf in ruta['ot_pdfs']:
-            if pdf:  # Asegurarse de que el archivo exista y no esté vacío
-                pdf_path = pdf.path  # Asumiendo que estás usando el modelo FileField o similar
-                try:
-                    pdf_merger.append(open(pdf_path, 'rb'))
-                except Exception as e:
-                    print(f"Failed to append PDF {pdf_path}: {str(e)}")
-
-    # Generar el PDF combinado
-    combined_pdf = BytesIO()
-    pdf_merger.write(combined_pdf)
-    pdf_merger.close()
-
-    # Establecer el PDF combinado como la respuesta
-    response.write(combined_pdf.getvalue())
-    return response
+    job = request_pdf('system', asset_id, system_id, user=request.user)
+    return pdf_response(request, job)
 
 
 class DocumentCreateView(generic.View):
@@ -1925,24 +1904,37 @@ def view_location(request, pk):
     return render(request, 'got/view_location.html', {'location': location})
 
 
+BUCEO_FRECUENCIAS = (
+    ('Mensual', 30),
+    ('Trimestral', 90),
+    ('Semestral', 180),
+    ('Anual', 365),
+    ('Bianual', 730),
+)
+
+
 def buceomtto(request):
 
     location_filter = request.GET.get('location', None)
     buceo = Asset.objects.filter(area='b')
 
+    # Una sola pasada por (activo, frecuencia, ubicación) en lugar de check_ruta_status por celda
+    frecuencias = [frecuency for _, frecuency in BUCEO_FRECUENCIAS]
+    frame = load_fleet_frame(Ruta.objects.filter(system__asset__area='b'))
+    matrix = ruta_status_matrix(frame, frecuencias, location_filter)
+
     buceo_rowspan = len(buceo) + 1
     total_oks = 0
     total_non_dashes = 0
 
     buceo_data = []
     for asset in buceo:
-        mensual = asset.check_ruta_status(30, location_filter)
-        trimestral = asset.check_ruta_status(90, location_filter)
-        semestral = asset.check_ruta_status(180, location_filter)
-        anual = asset.check_ruta_status(365, location_filter)
-        bianual = asset.check_ruta_status(730, location_filter)
+        if asset.pk in matrix.index:
+            statuses = list(matrix.loc[asset.pk])
+        else:
+            statuses = ["---"] * len(frecuencias)
 
-        for status in [mensual, trimestral, semestral, anual, bianual]:
+        for status in statuses:
             if status == "Ok":
                 total_oks += 1
             if status != "---":
@@ -1950,19 +1942,43 @@ def buceomtto(request):
 
         buceo_data.append({
             'asset': asset,
-            'mensual': mensual,
-            'trimestral': trimestral,
-            'semestral': semestral,
-            'anual': anual,
-            'bianual': bianual,
-            'buceo': buceo_data,
+            'statuses': statuses,
         })
     
-    ind_mtto = round((total_oks*100)/total_non_dashes, 2)
+    ind_mtto = round((total_oks*100)/total_non_dashes, 2) if total_non_dashes else 0
 
     context = {
         'buceo': buceo_data,
         'ind_mtto': ind_mtto,
         'buceo_rowspan': buceo_rowspan,
+        'frecuencias': BUCEO_FRECUENCIAS,
+    }
+    return render(request, 'got/buceomtto.html', context)
+
+
+@staff_member_required
+def request_metrics(request):
+    '''Resumen por vista de las mediciones de RequestMetricsMiddleware (solo personal administrador).'''
+    metrics = RequestMetric.objects.all()
+    url_name = request.GET.get('vista')
+    if url_name:
+        metrics = metrics.filter(url_name=url_name)
+
+    resumen = metrics.values('url_name').annotate(
+        peticiones=Count('id'),
+        consultas=Avg('queries'),
+        max_consultas=Max('queries'),
+        repetidas=Avg('duplicate_queries'),
+        db_ms=Avg('db_time'),
+        plantilla_ms=Avg('template_time'),
+        total_ms=Avg('total_time'),
+        max_total_ms=Max('total_time'),
+        bytes=Avg('response_size'),
+    ).order_by('-consultas')
+
+    context = {
+        'resumen': resumen,
+        'recientes': metrics.filter(duplicate_queries__gt=0).order_by('-duplicate_queries', '-created')[:20],
+        'vista': url_name,
     }
-    return render(request, 'got/buceomtto.html', context)
\ No newline at end of file
+    return render(request, 'got/request_metrics.html', context)
@@ -0,0 +1,173 @@
+'''
+Alcance de cada usuario según su rol: qué activos, áreas y ubicaciones puede ver. Se
+resuelve una vez (user_scope) y las vistas lo aplican con Scope.filter, un filtro por
+lista de activos ya resuelta en vez de una subconsulta por vista.
+
+- super_members: todo.
+- maq_members: los activos que supervisa.
+- buzos_members: los activos del área de buceo y, si pertenece a una estación
+  (STATION_LOCATIONS), solo los sistemas de esas ubicaciones.
+- serport_members: en actividades, solo las suyas.
+- Sin rol: sin restricción en las listas, sin actividades asignadas.
+
+Cada vista aplica ese alcance según VIEW_RULES, las reglas que tenía cada una antes de
+compartir este módulo (p. ej. la lista de activos solo se limita a los buzos), incluido el
+orden en que revisaba los roles cuando el usuario tiene varios.
+
+El alcance se guarda en el usuario durante la petición y, con GOT_SCOPE_CACHE_TIMEOUT, en
+la caché de Django; se invalida al cambiar los grupos del usuario o los activos
+(supervisor, área) desde got/signals.py.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Asset
+from .permissions import group_names
+
+
+# Grupo de estación -> ubicación de sus sistemas
+STATION_LOCATIONS = {
+    'santamarta_station': 'Santa Marta',
+    'ctg_station': 'Cartagena',
+    'guyana_station': 'Guyana',
+}
+ROLES = ('super_members', 'serport_members', 'maq_members', 'buzos_members')
+DIVING_AREA = 'b'
+
+# Vista -> (roles que la restringen, en el orden en que la vista los revisaba: manda el
+# primero que tenga el usuario y super_members no restringe; si filtra por la ubicación de
+# la estación). Un usuario con varios roles ve en cada vista lo mismo que veía antes
+VIEW_RULES = {
+    'tasks': (('super_members', 'maq_members', 'buzos_members'), True),
+    'solicitudes': (('maq_members',), False),
+    'assets': (('buzos_members',), False),
+    'asset_detail': ((), False),
+    'failures': (('maq_members', 'buzos_members'), False),
+    'ots': (('maq_members', 'buzos_members'), False),
+    'ot_assets': (('buzos_members',), False),
+    'ot_search': ((), False),
+}
+# Orden del alcance completo (Scope.filter sin vista)
+FULL_SCOPE = ('super_members', 'maq_members', 'buzos_members')
+
+USER_ATTR = '_got_scope'
+CACHE_KEY = 'got:scope:{}:{}'
+# Cambiar un activo invalida todos los alcances: se sube la versión de las claves
+VERSION_KEY = 'got:scope:version'
+
+
+class Scope:
+    '''
+    Alcance resuelto de un usuario: sus roles y, por cada rol que restringe (maq_members,
+    buzos_members), la tupla (activos, ubicaciones) que ve; ubicaciones en None: sin restricción.
+    '''
+
+    def __init__(self, roles=frozenset(), restrictions=None):
+        self.roles = roles
+        self.restrictions = restrictions or {}
+        self._filters = {}
+
+    @property
+    def own_tasks(self):
+        '''Operarios (serport): solo ven las actividades de las que son responsables.'''
+        return 'serport_members' in self.roles and 'super_members' not in self.roles
+
+    def role(self, view=None):
+        '''Rol que define lo que el usuario ve en la vista (None: sin restricción).'''
+        roles = FULL_SCOPE if view is None else VIEW_RULES[view][0]
+        for role in roles:
+            if role in self.roles:
+                return role if role in self.restrictions else None
+        return None
+
+    def q(self, role, asset, location=None):
+        '''Filtro del rol para el camino al activo (p. ej. 'system__asset') y a la ubicación del sistema.'''
+        key = (role, asset, location)
+        if key not in self._filters:
+            assets, locations = self.restrictions[role]
+            condition = Q(**{f'{asset}__in': assets})
+            if locations is not None and location:
+                condition &= Q(**{f'{location}__in': locations})
+            self._filters[key] = condition
+        return self._filters[key]
+
+    def filter(self, queryset, asset, location=None, view=None):
+        '''Aplica el alcance al queryset; con view, según la regla de esa vista en VIEW_RULES.'''
+        role = self.role(view)
+        if role is None:
+            return queryset
+        if view is not None and not VIEW_RULES[view][1]:
+            location = None
+        return queryset.filter(self.q(role, asset, location))
+
+    def state(self):
+        return (self.roles, self.restrictions)
+
+
+def resolve_scope(user):
+    names = group_names(user)
+    roles = frozenset(names.intersection(ROLES))
+    restrictions = {}
+    if 'maq_members' in roles:
+        assets = Asset.objects.filter(supervisor=user).values_list('pk', flat=True)
+        restrictions['maq_members'] = (tuple(assets), None)
+    if 'buzos_members' in roles:
+        assets = Asset.objects.filter(area=DIVING_AREA).values_list('pk', flat=True)
+        locations = tuple(location for group, location in STATION_LOCATIONS.items() if group in names)
+        restrictions['buzos_members'] = (tuple(assets), locations or None)
+    return Scope(roles, restrictions)
+
+
+def cache_timeout():
+    return getattr(settings, 'GOT_SCOPE_CACHE_TIMEOUT', 0)
+
+
+def cache_key(user_id):
+    return CACHE_KEY.format(cache.get_or_set(VERSION_KEY, 0, None), user_id)
+
+
+def user_scope(user):
+    '''Alcance del usuario, resuelto una vez por petición (o tomado de la caché).'''
+    scope = getattr(user, USER_ATTR, None)
+    if scope is not None:
+        return scope
+    if not user.is_authenticated:
+        scope = Scope()
+    else:
+        timeout = cache_timeout()
+        state = cache.get(cache_key(user.pk)) if timeout else None
+        if state is not None:
+            scope = Scope(*state)
+        else:
+            scope = resolve_scope(user)
+            if timeout:
+                cache.set(cache_key(user.pk), scope.state(), timeout)
+    setattr(user, USER_ATTR, scope)
+    return scope
+
+
+def forget_scope(user):
+    setattr(user, USER_ATTR, None)
+
+
+def invalidate_scopes(user_ids=None):
+    '''
+    Borra de la caché el alcance de estos usuarios, o el de todos (None) subiendo la
+    versión de las claves. Se repite al confirmarse la transacción, como en permissions.
+    '''
+    if not cache_timeout():
+        return
+
+    def invalidate():
+        if user_ids is None:
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.set(VERSION_KEY, 1, None)
+        else:
+            cache.delete_many([cache_key(pk) for pk in user_ids])
+    user_ids = None if user_ids is None else list(user_ids)
+    invalidate()
+    transaction.on_commit(invalidate)